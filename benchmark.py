@@ -0,0 +1,497 @@
+##############################################################################
+# benchmark.py
+##############################################################################
+# Micro-benchmarks for choosing engine options per machine.  Run with the
+# names of the benchmarks to run, or with none to run them all:
+#     python benchmark.py atlas
+##############################################################################
+
+import os
+import sys
+import time
+from timeit import default_timer
+
+# benchmarks draw offscreen unless a real video driver is asked for
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from lib.engine.pygameview import PygameView
+from lib.engine.systemevents import DrawRequestEvent
+from lib.graphics.assets import Assets, blit
+
+##############################################################################
+# HELPERS
+##############################################################################
+
+SCREEN_SIZE = (576, 512)
+NATIVE_SIZE = (288, 256)
+
+def setup_display(size=SCREEN_SIZE):
+    pygame.init()
+    return pygame.display.set_mode(size)
+
+def rate(func, min_time=0.5):
+    """
+    Calls func repeatedly for at least min_time seconds and returns the
+    number of calls per second.
+    """
+    calls = 0
+    start = default_timer()
+    elapsed = 0.
+    while elapsed < min_time:
+        func()
+        calls += 1
+        elapsed = default_timer() - start
+    return calls / elapsed
+
+def report(benchmark, variant, **results):
+    fields = ['%s=%s' % (key, format_value(results[key]))
+              for key in sorted(results.keys())]
+    print('%-10s %-12s %s' % (benchmark, variant, '  '.join(fields)))
+
+def cpu_time():
+    return time.process_time() if hasattr(time, 'process_time') else time.clock()
+
+def format_value(value):
+    if isinstance(value, float):
+        return '%.1f' % value
+    return str(value)
+
+##############################################################################
+# BENCHMARKS
+##############################################################################
+
+def bench_atlas():
+    """
+    Per-image surfaces against areas of a single scaled atlas: pixel memory,
+    number of surfaces held, and sprite blits per second.
+    """
+    screen = setup_display()
+    names = sorted(Assets.rect_dict.keys())
+
+    for use_atlas in (False, True):
+        Assets.use_atlas = use_atlas
+        Assets.load()
+        Assets.preload()
+        images = [Assets.sprite(name) for name in names]
+        positions = [((i * 37) % SCREEN_SIZE[0], (i * 53) % SCREEN_SIZE[1])
+                     for i in range(len(images))]
+
+        def draw_all():
+            for image, pos in zip(images, positions):
+                blit(screen, image, pos)
+
+        surfaces = len(Assets.variants) + (1 if Assets.atlas is not None else 0)
+        report('atlas', 'atlas' if use_atlas else 'per-image',
+               bytes=sum(Assets.memory_usage().values()),
+               surfaces=surfaces,
+               blits_per_s=rate(draw_all) * len(images))
+
+    Assets.use_atlas = False
+
+def bench_render():
+    """
+    Frames per second drawing and presenting the game screen, at window size
+    against at sprite sheet size upscaled into the window.
+    """
+    from lib.gamestate import GameState
+
+    pygame.init()
+    variants = [('window', None, 'scale2x', (('scale2x',),)),
+                ('native-2x', NATIVE_SIZE, 'scale2x', ()),
+                ('native-scale', NATIVE_SIZE, 'scale', ())]
+    for variant, render_size, scaler, base_chain in variants:
+        view = PygameView('benchmark', SCREEN_SIZE, (0, 0, 0), render_size,
+                          scaler)
+        Assets.base_chain = base_chain
+        Assets.load()
+        Assets.preload()
+        state = GameState(None, view.screen.get_size())
+        event = DrawRequestEvent(state.game_objects)
+        report('render', variant, fps=rate(lambda: view.notify(event)))
+
+    Assets.base_chain = (('scale2x',),)
+
+def bench_pacing(frames=180, fps=60):
+    """
+    Frame interval jitter pacing with pygame's Clock against the FramePacer,
+    with and without its spin, and the share of CPU each spends waiting.
+    """
+    from lib.engine.pacing import FramePacer
+
+    pygame.init()
+    clock = pygame.time.Clock()
+    clock_pacer = FramePacer(fps) # only used to record the intervals
+    variants = [('clock', clock_pacer, lambda: clock.tick(fps)),
+                ('sleep-only', FramePacer(fps, 0.), None),
+                ('sleep-spin', FramePacer(fps), None)]
+    for variant, pacer, wait in variants:
+        wait = wait or pacer.wait
+        cpu_start = cpu_time()
+        for i in range(frames): # @UnusedVariable
+            wait()
+            if pacer is clock_pacer:
+                pacer.mark()
+        cpu = cpu_time() - cpu_start
+        stats = pacer.get_stats()
+        report('pacing', variant,
+               mean_ms=stats['mean_jitter'] * 1000,
+               stddev_ms=stats['stddev_jitter'] * 1000,
+               p99_ms=stats['p99_jitter'] * 1000,
+               cpu_pct=cpu * 100. / (frames / float(fps)))
+
+def bench_env(steps=200000):
+    """
+    Environment steps per second and objects left allocated per step, at
+    each frameskip, under a policy flapping whenever the player drops below
+    the next gap.
+    """
+    import gc
+    from lib.environment import FlappyEnv, FLAP, NOOP
+
+    for frameskip in (1, 4):
+        env = FlappyEnv(frameskip)
+        env.reset(0)
+
+        def play(steps):
+            observation = env.observation
+            for i in range(steps): # @UnusedVariable
+                action = FLAP if observation[0] > observation[4] - 70 else NOOP
+                observation, reward, done, info = env.step(action) # @UnusedVariable
+                if done:
+                    env.reset()
+
+        play(1000)
+        gc.collect()
+        objects = len(gc.get_objects())
+        start = default_timer()
+        play(steps)
+        elapsed = default_timer() - start
+        gc.collect()
+        report('env', 'frameskip-%d' % frameskip,
+               steps_per_s=steps / elapsed,
+               objects_per_step=(len(gc.get_objects()) - objects) / float(steps))
+
+def bench_fastforward(games=40, max_ticks=20000):
+    """
+    Simulated ticks per second replaying fixed flap schedules (recorded from
+    a policy flapping toward each gap) one tick() at a time, and from flap
+    to flap with advance(), which jumps the quiet ticks between events.
+    """
+    from lib.simulation import GAP_ROWS, Simulation
+
+    # each schedule is a list of [flap, ticks] runs, one per flap
+    schedules = []
+    for seed in range(games):
+        simulation = Simulation(seed=seed)
+        runs = []
+        while not simulation.done and simulation.ticks < max_ticks:
+            i = simulation.next_obstacle()
+            flap = simulation.y_velocity >= 0 and (i is None or simulation.height >
+                (simulation.number_above[i] + GAP_ROWS) * simulation.row_height - 70)
+            if flap or not runs:
+                runs.append([flap, 0])
+            runs[-1][1] += 1
+            simulation.tick(flap)
+        schedules.append((seed, runs, simulation.get_state()))
+
+    def play(fast):
+        ticks = 0
+        for seed, runs, state in schedules:
+            simulation = Simulation(seed=seed)
+            for flap, run in runs:
+                if fast:
+                    simulation.advance(run, flap)
+                else:
+                    simulation.tick(flap)
+                    for i in range(run - 1): # @UnusedVariable
+                        simulation.tick()
+            assert simulation.get_state() == state
+            ticks += simulation.ticks
+        return ticks
+
+    ticks = play(False)
+    for variant, fast in (('tick', False), ('advance', True)):
+        report('fastforward', variant, ticks_per_s=rate(lambda: play(fast)) * ticks)
+
+def bench_pixels(steps=3000, downsample=3, stack=4):
+    """
+    Pixel observations per second for each PixelEnv mode, against copying
+    the frame out with array3d and converting, resizing and stacking it
+    with fresh arrays.
+    """
+    import numpy
+    from lib.environment import FLAP, NOOP
+    from lib.pixels import PixelEnv
+
+    def play(env, observe=None):
+        env.reset(0)
+        start = default_timer()
+        for i in range(steps):
+            simulation = env.simulation
+            action = FLAP if simulation.y_velocity > 0 and \
+                simulation.height > 200 + (i % 7) * 10 else NOOP
+            done = env.step(action)[2]
+            if observe is not None:
+                observe(env)
+            if done:
+                env.reset()
+        return steps / (default_timer() - start)
+
+    for mode in PixelEnv.MODES:
+        env = PixelEnv(mode, downsample, stack)
+        report('pixels', mode, obs_per_s=play(env))
+
+    history = []
+    def naive(env):
+        frame = pygame.surfarray.array3d(env.renderer.surface)
+        gray = frame.dot([0.299, 0.587, 0.114])
+        width = gray.shape[0] // downsample * downsample
+        height = gray.shape[1] // downsample * downsample
+        small = gray[:width, :height].reshape(width // downsample, downsample,
+                                              height // downsample, downsample).mean(3).mean(1)
+        history.append(small.astype(numpy.uint8))
+        del history[:-stack]
+        return numpy.stack([history[0]] * (stack - len(history)) + history)
+
+    env = PixelEnv('rgb', downsample, stack)
+    env.observe = env.renderer.render
+    report('pixels', 'naive-stack', obs_per_s=play(env, naive))
+
+def bench_ghosts(ghosts=500, ticks=600):
+    """
+    Milliseconds per frame drawing a race of recorded ghosts: the GhostLayer
+    stepping them in arrays and drawing them with one blits() call, against
+    a rotate() and a blit() per ghost as PipePlayer draws itself.
+    """
+    import random
+    import shutil
+    import tempfile
+    from lib.engine.model import Model
+    from lib.engine.systemevents import KeyboardEvent, SystemEventManager
+    from lib.gamestate import GameState
+    from lib.ghosts import GhostLayer, GhostRace
+    from lib.replay import record_run
+
+    path = tempfile.mkdtemp()
+    try:
+        for n in range(ghosts):
+            jitter = random.Random(n)
+            def policy(observation):
+                return int(observation[1] > 0 and observation[0] >
+                           (observation[3] + observation[4]) / 2 + jitter.randint(-30, 30))
+            record_run(os.path.join(path, '%04d.replay' % n), n, policy, ticks)
+
+        screen = setup_display()
+        Assets.load()
+        Assets.preload()
+        race = GhostRace(path, ghosts) # @UnusedVariable
+        game = GameState(None, SCREEN_SIZE)
+        game.fade.set_alpha(0)
+        Model.change_state(game)
+        SystemEventManager.post(KeyboardEvent(pygame.KEYDOWN, pygame.K_SPACE))
+        layer = [game_object for game_object in game.game_objects
+                 if isinstance(game_object, GhostLayer)][0]
+        surf = Assets.surface('player').copy()
+        surf.set_alpha(80)
+        offscreen = pygame.Surface((1, 1))
+
+        def per_ghost():
+            racing = layer.racing()
+            for angle, height in zip(layer.angle[racing].tolist(),
+                                     layer.height[racing].tolist()):
+                screen.blit(pygame.transform.rotate(surf, angle), (layer.player.x_pos, height))
+
+        for variant, draw in (('layer', lambda: layer.render(screen)),
+                              ('per-ghost', per_ghost)):
+            layer.rewind()
+            times = []
+            for i in range(ticks // 2): # @UnusedVariable
+                start = default_timer()
+                draw()
+                times.append(default_timer() - start)
+                if variant != 'layer':
+                    layer.render(offscreen) # moves them on
+            times.sort()
+            report('ghosts', variant, ghosts=len(layer.runs),
+                   median_ms=times[len(times) // 2] * 1000,
+                   worst_ms=times[-1] * 1000)
+    finally:
+        shutil.rmtree(path)
+
+def bench_multiplayer(matches=24, players=4, ticks=1800):
+    """
+    A MatchServer and a bot client per player over local sockets, stepped
+    in turn: server milliseconds per tick and the tick rate that allows,
+    traffic per player at TICK_RATE, snapshot size and share sent as
+    deltas, and the predictions corrected, with and without datagrams lost.
+    """
+    import random
+    from lib.netplay import INPUT_LEAD, TICK_RATE, MatchClient, MatchServer
+    from lib.simulation import GAP_ROWS
+
+    def bot(simulation, rng):
+        # flap when falling near the bottom of the next gap
+        i = simulation.next_obstacle()
+        bottom = simulation.screensize[1] // 2
+        if i is not None:
+            bottom = (simulation.number_above[i] + GAP_ROWS) * simulation.row_height
+        return simulation.y_velocity >= 0 and \
+            simulation.height > bottom - 70 - rng.random() * 10
+
+    for variant, loss, lead in (('lan', 0., INPUT_LEAD),
+                                ('lossy-10%', 0.1, INPUT_LEAD),
+                                ('no-lead', 0.1, 0)):
+        server = MatchServer('127.0.0.1', 0, players)
+        server.loss = loss
+        clients = [MatchClient('127.0.0.1', server.port, lead)
+                   for i in range(matches * players)] # @UnusedVariable
+        rng = random.Random(0)
+        for tick in range(ticks): # @UnusedVariable
+            server.poll()
+            server.step()
+            for client in clients:
+                client.loss = loss
+                client.poll()
+                client.tick(client.joined() and bot(client.simulation, rng))
+        stats = server.get_stats()
+        per_player = TICK_RATE / 1024. / (server.ticks * len(clients))
+        report('multiplayer', variant, matches=stats['matches'],
+               players=stats['players'], step_ms=stats['step_ms'],
+               max_tick_rate=1000. / stats['step_ms'],
+               down_kB_s=server.bytes_out * per_player,
+               up_kB_s=server.bytes_in * per_player,
+               snapshot_bytes=stats['snapshot_bytes'],
+               delta_share=stats['delta_share'], late_flaps=stats['late_flaps'],
+               corrections=sum(client.corrections for client in clients))
+        for client in clients:
+            client.leave()
+        server.close()
+
+def queue_worker(queue, episodes, seed, max_ticks):
+    from lib.environment import FlappyEnv
+    from lib.trajectory import gap_policy
+
+    env = FlappyEnv(max_ticks=max_ticks)
+    for episode in range(episodes):
+        observation = env.reset(seed + episode)
+        done = False
+        while not done:
+            action = gap_policy(observation)
+            observation, reward, done, info = env.step(action)
+            queue.put((episode, info['ticks'], observation[0], observation[1],
+                       action, observation[2], observation[3], observation[4],
+                       reward, done))
+    queue.put(None)
+
+def bench_trajectory(workers=4, episodes=20, max_ticks=2000):
+    """
+    Trajectory rows per second reaching the parent from headless workers,
+    through the shared memory rings against pickled through a queue.
+    """
+    import multiprocessing
+    from lib.trajectory import TrajectoryPool
+
+    pool = TrajectoryPool(workers, episodes, max_ticks=max_ticks)
+    pool.start()
+    while not pool.done():
+        batches = pool.poll()
+        for worker, rows in batches:
+            count = len(rows)
+            del rows
+            pool.release(worker, count)
+        if not batches:
+            time.sleep(0.0005)
+    stats = pool.get_stats()
+    pool.close()
+    report('trajectory', 'shared', rows_per_s=stats['rows_per_s'],
+           stalls=stats['stalls'])
+
+    queue = multiprocessing.Queue(4096)
+    processes = [multiprocessing.Process(target=queue_worker,
+                                         args=(queue, episodes, i * episodes, max_ticks))
+                 for i in range(workers)]
+    start = default_timer()
+    for process in processes:
+        process.start()
+    rows = 0
+    finished = 0
+    while finished < workers:
+        if queue.get() is None:
+            finished += 1
+        else:
+            rows += 1
+    report('trajectory', 'queue', rows_per_s=rows / (default_timer() - start))
+    for process in processes:
+        process.join()
+
+def bench_dataset(rows=4000000, batch=65536):
+    """
+    Rows per second appended to a chunked dataset, then reading it back: a
+    scan of one column through memory maps against loading the whole of
+    every chunk, and random 1000 row range reads.
+    """
+    import random
+    import shutil
+    import tempfile
+    import numpy
+    from lib.dataset import DatasetReader, DatasetWriter
+    from lib.trajectory import ROW_DTYPE
+
+    path = tempfile.mkdtemp()
+    try:
+        rows_batch = numpy.zeros(batch, ROW_DTYPE)
+        rows_batch['height'] = numpy.arange(batch)
+        writer = DatasetWriter(path)
+        start = default_timer()
+        for i in range(rows // batch): # @UnusedVariable
+            writer.append_rows(rows_batch)
+        writer.close()
+        report('dataset', 'write', rows_per_s=writer.rows / (default_timer() - start),
+               chunks=len(writer.chunks))
+
+        reader = DatasetReader(path)
+        start = default_timer()
+        total = 0.
+        for first, heights in reader.scan('height'): # @UnusedVariable
+            total += heights.sum()
+        report('dataset', 'scan-mmap', rows_per_s=len(reader) / (default_timer() - start))
+
+        start = default_timer()
+        total = 0.
+        for chunk in range(len(reader.chunks)):
+            for name in ROW_DTYPE.names:
+                column = numpy.load(os.path.join(path, name, '%06d.npy' % chunk))
+            total += column.sum()
+        report('dataset', 'scan-load', rows_per_s=len(reader) / (default_timer() - start))
+
+        def read_range():
+            first = random.randrange(len(reader) - 1000)
+            reader.read('height', first, first + 1000)
+        report('dataset', 'range-1000', reads_per_s=rate(read_range))
+        reader = None
+    finally:
+        shutil.rmtree(path)
+
+BENCHMARKS = [('atlas', bench_atlas),
+              ('render', bench_render),
+              ('pacing', bench_pacing),
+              ('env', bench_env),
+              ('fastforward', bench_fastforward),
+              ('pixels', bench_pixels),
+              ('ghosts', bench_ghosts),
+              ('multiplayer', bench_multiplayer),
+              ('trajectory', bench_trajectory),
+              ('dataset', bench_dataset)]
+
+##############################################################################
+# MAIN EXECUTION
+##############################################################################
+
+if __name__ == '__main__':
+    chosen = sys.argv[1:] or [name for name, bench in BENCHMARKS] # @UnusedVariable
+    for name, bench in BENCHMARKS:
+        if name in chosen:
+            bench()
+    pygame.quit()
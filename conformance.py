@@ -0,0 +1,188 @@
+##############################################################################
+# conformance.py
+##############################################################################
+# Checks that every engine plays the same game: the same seeds and policy
+# are run, in deterministic mode, through the interactive GameState (driven
+# by posted events with the dummy video driver), the headless Simulation,
+# the lockstep BatchSimulation and TrajectoryPool worker processes, and the
+# score and tick each game ended on must be identical everywhere:
+#     python conformance.py [games] [max ticks]
+# Exits with status 1 on any difference.
+##############################################################################
+
+import os
+import sys
+import time
+
+# the interactive engine draws offscreen unless a real video driver is asked for
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from lib.batch import BatchSimulation
+from lib.engine.model import Model
+from lib.engine.pygameview import PygameView
+from lib.engine.systemevents import KeyboardEvent, SystemEventManager, TickEvent
+from lib.graphics.assets import Assets
+from lib.simulation import GAP_ROWS, Simulation
+from lib.trajectory import TrajectoryPool
+
+SCREEN_SIZE = (576, 512)
+GAMES = 32
+MAX_TICKS = 5000
+WORKERS = 4
+
+##############################################################################
+# POLICY
+##############################################################################
+
+def policy(observation):
+    """
+    Flaps when falling and less than 70 px above the bottom of the next
+    gap, and so straight away before play starts.  Takes FlappyEnv
+    observations, or BatchSimulation's to decide for every game at once.
+    """
+    return (observation[1] >= 0) & (observation[0] > observation[4] - 70)
+
+##############################################################################
+# ENGINES
+##############################################################################
+# Each runs the games of seeds and returns a (score, ticks, crashed) per
+# game.  A game starts with a flap and then flaps on the ticks the policy
+# says to, until it crashes or max_ticks have been played.
+
+def run_interactive(seeds, max_ticks):
+    from lib.gamestate import GameState
+
+    pygame.init()
+    # drawing moves the player, so the view has to be kept alive
+    view = PygameView('conformance', SCREEN_SIZE, (0, 0, 0)) # @UnusedVariable
+    Assets.load()
+    Assets.preload()
+    flap = KeyboardEvent(pygame.KEYDOWN, pygame.K_SPACE)
+    results = []
+    for seed in seeds:
+        game = GameState(None, SCREEN_SIZE, seed, deterministic=True)
+        game.fade.set_alpha(0) # the space bar does nothing while fading in
+        Model.change_state(game)
+        SystemEventManager.post(flap)
+        observation = [0.] * 5
+        ticks = 0
+        while Model.state is game and ticks < max_ticks:
+            player = game.player
+            observation[0] = player.height
+            observation[1] = player.y_velocity
+            observation[4] = 0.
+            nearest = game.obstacles.ahead(player.x_pos)
+            if nearest is not None:
+                observation[4] = (nearest.number_above + GAP_ROWS) * \
+                    nearest.get_obstacle_height()
+            if policy(observation):
+                SystemEventManager.post(flap)
+            SystemEventManager.post(TickEvent())
+            ticks += 1
+        results.append((game.score, ticks, Model.state is not game))
+    return results
+
+def run_headless(seeds, max_ticks):
+    from lib.environment import FlappyEnv
+
+    env = FlappyEnv(max_ticks=max_ticks, screensize=SCREEN_SIZE,
+                    deterministic=True)
+    results = []
+    for seed in seeds:
+        observation = env.reset(seed)
+        done = False
+        while not done:
+            observation, reward, done, info = env.step(policy(observation)) # @UnusedVariable
+        results.append((info['score'], info['ticks'], env.simulation.done))
+    return results
+
+def run_batch(seeds, max_ticks):
+    batch = BatchSimulation(len(seeds), SCREEN_SIZE)
+    batch.reset(seeds)
+    batch.flap(~batch.done)
+    for tick in range(max_ticks): # @UnusedVariable
+        if batch.tick(policy(batch.observe())).all():
+            break
+    return list(zip(batch.score.tolist(), batch.ticks.tolist(), batch.done.tolist()))
+
+def run_pool(seeds, max_ticks, workers=WORKERS):
+    """
+    Workers report rewards rather than scores, a point per obstacle passed
+    less one for crashing, so this returns (score - crashed, ticks).
+    """
+    episodes = len(seeds) // workers
+    pool = TrajectoryPool(workers, episodes, seed=seeds[0], max_ticks=max_ticks,
+                          policy=policy, deterministic=True)
+    rewards = [[0., 0] for seed in seeds] # @UnusedVariable
+    pool.start()
+    while not pool.done():
+        batches = pool.poll()
+        for worker, rows in batches:
+            for episode, tick, reward in zip(rows['episode'].tolist(),
+                                             rows['tick'].tolist(),
+                                             rows['reward'].tolist()):
+                game = rewards[worker * episodes + episode]
+                game[0] += reward
+                game[1] = tick
+            count = len(rows)
+            del rows
+            pool.release(worker, count)
+        if not batches:
+            time.sleep(0.001)
+    failed = pool.crashed()
+    pool.close()
+    if failed:
+        raise RuntimeError('Workers %s exited early' % (failed,))
+    return [(int(round(reward)), ticks) for reward, ticks in rewards]
+
+ENGINES = [('interactive', run_interactive),
+           ('headless', run_headless),
+           ('batch', run_batch),
+           ('multiprocess', run_pool)]
+
+##############################################################################
+# MAIN EXECUTION
+##############################################################################
+
+def check(games=GAMES, max_ticks=MAX_TICKS):
+    """
+    Runs every engine over seeds 0 to games - 1 and returns the number of
+    games any engine disagrees on.
+    """
+    games = max(games // WORKERS, 1) * WORKERS # whole episodes per worker
+    seeds = list(range(games))
+    results = {}
+    for name, run in ENGINES:
+        start = time.time()
+        results[name] = run(seeds, max_ticks)
+        ticks = sum(result[1] for result in results[name])
+        print('%-12s %d games, %d ticks in %.1f s' % (name, games, ticks,
+                                                     time.time() - start))
+
+    # workers see rewards, so the others' scores are made rewards for them
+    expected = {}
+    for name, run in ENGINES: # @UnusedVariable
+        expected[name] = results['interactive']
+        if name == 'multiprocess':
+            expected[name] = [(score - crashed, ticks)
+                              for score, ticks, crashed in results['interactive']]
+
+    mismatches = 0
+    for n, seed in enumerate(seeds):
+        differ = [name for name, run in ENGINES # @UnusedVariable
+                  if results[name][n] != expected[name][n]]
+        if differ:
+            mismatches += 1
+            print('seed %d: %s' % (seed, ', '.join('%s %s' % (name, results[name][n])
+                                                  for name, run in ENGINES))) # @UnusedVariable
+    scores = [result[0] for result in results['interactive']]
+    print('%d of %d games differ; scores %d to %d, mean %.1f' % (
+        mismatches, games, min(scores), max(scores), sum(scores) / float(games)))
+    return mismatches
+
+if __name__ == '__main__':
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else GAMES
+    max_ticks = int(sys.argv[2]) if len(sys.argv) > 2 else MAX_TICKS
+    sys.exit(1 if check(games, max_ticks) else 0)
@@ -0,0 +1,248 @@
+##############################################################################
+# batch.py
+##############################################################################
+# Many headless games stepped in lockstep, one element of each numpy array
+# per game.  The state is what Simulation.get_state() holds, with the
+# player and obstacles worked out from it with the MOTION closed forms in
+# the same order of operations, and angles always from an AngleTable, so
+# each game matches a deterministic Simulation on the same seed and flaps
+# to the last bit (see conformance.py).  Needs numpy.
+##############################################################################
+
+import numpy
+
+from simulation import *  # @UnusedWildImport
+
+class BatchSimulation:
+
+    def __init__(self, games, screensize=REFERENCE_SIZE, sprite_scale=2,
+                 obstacles=None):
+        """
+        games - number of games played side by side
+        screensize, sprite_scale, obstacles - see Simulation
+        """
+        # the sizes, speeds and tables of a deterministic Simulation
+        self.reference = reference = Simulation(screensize, sprite_scale,
+                                                obstacles=obstacles,
+                                                deterministic=True)
+        self.games = games
+        self.obstacle_count = reference.obstacle_count
+        self.arc = reference.arc
+        angles = reference.angles
+        self.ideal_by_tick = numpy.array(angles.ideal_by_tick)
+        self.widths = numpy.array(angles.widths)
+        self.heights = numpy.array(angles.heights)
+        self.lowest = angles.lowest
+        self.rest = angles.rest
+
+        self.started = numpy.zeros(games, bool)
+        self.done = numpy.zeros(games, bool)
+        self.score = numpy.zeros(games, numpy.int64)
+        self.ticks = numpy.zeros(games, numpy.int64)
+        self.scrolled = numpy.zeros(games, numpy.int64)
+        self.placed = numpy.zeros(games, numpy.int64)
+        self.flap_height = numpy.zeros(games)
+        self.flap_angle = numpy.zeros(games)
+        self.flap_ticks = numpy.zeros(games, numpy.int64)
+        self.lift = numpy.zeros(games, numpy.int64)
+        self.passed_count = numpy.zeros(games, numpy.int64)
+        self.gap_index = numpy.zeros(games, numpy.int64)
+        self.keys = numpy.zeros(games, numpy.uint64)
+        self.seeds = [None] * games
+        # gap of course index k in column k % obstacle_count
+        self.number_above = numpy.zeros((games, self.obstacle_count), numpy.int64)
+        self.rows = numpy.arange(games)
+
+        # worked out from the above
+        self.height = numpy.zeros(games)
+        self.y_velocity = numpy.zeros(games)
+        self.current_angle = numpy.zeros(games)
+
+    #--------------------------------------------------------------------------
+
+    def reset(self, seeds):
+        """
+        Starts every game again, game n on a Course of seeds[n].
+        """
+        count = self.obstacle_count
+        for n, seed in enumerate(seeds):
+            course = Course(seed)
+            self.seeds[n] = course.seed
+            self.keys[n] = course.key
+            self.number_above[n] = [course.gap(k) for k in range(count)]
+        self.choices = course.choices
+
+        for array in (self.started, self.done, self.score, self.ticks,
+                      self.scrolled, self.placed, self.flap_ticks, self.lift,
+                      self.y_velocity):
+            array[:] = 0
+        self.passed_count[:] = count
+        self.gap_index[:] = count
+        self.height[:] = self.flap_height[:] = self.reference.starting_height
+        self.current_angle[:] = self.flap_angle[:] = self.rest
+
+    def get_state(self, n):
+        """
+        Returns game n's state in the form of Simulation.get_state().
+        """
+        return (int(self.ticks[n]), bool(self.started[n]), bool(self.done[n]),
+                int(self.score[n]), int(self.scrolled[n]), int(self.placed[n]),
+                float(self.flap_height[n]), float(self.flap_angle[n]),
+                int(self.flap_ticks[n]), int(self.lift[n]),
+                int(self.passed_count[n]), self.seeds[n], int(self.gap_index[n]))
+
+    def get_obstacle_x(self, j):
+        """
+        Returns the x of each game's obstacle j from the left.
+        """
+        reference = self.reference
+        k = self.gap_index - self.obstacle_count + (FIRST_OBSTACLE + j)
+        distance = (self.scrolled - 2 * self.placed) * reference.x_velocity
+        x = reference.pipe_spacing * k - distance
+        x[~self.started] = reference.obstacle_start
+        return x
+
+    def get_number_above(self, j):
+        return self.number_above[self.rows, (self.gap_index + j) % self.obstacle_count]
+
+    def observe(self):
+        """
+        Returns FlappyEnv's observation of every game as an array with a row
+        per entry, so observation[0] holds the heights.
+        """
+        reference = self.reference
+        observation = numpy.zeros((5, self.games))
+        observation[0] = self.height
+        observation[1] = self.y_velocity
+        found = numpy.zeros(self.games, bool)
+        for j in range(self.obstacle_count):
+            x = self.get_obstacle_x(j)
+            ahead = ~found & (x + reference.obstacle_width > reference.player_x)
+            above = self.get_number_above(j)
+            observation[2][ahead] = (x - reference.player_x)[ahead]
+            observation[3][ahead] = (above * reference.row_height)[ahead]
+            observation[4][ahead] = ((above + GAP_ROWS) * reference.row_height)[ahead]
+            found |= ahead
+        return observation
+
+    #--------------------------------------------------------------------------
+
+    def tick(self, flaps):
+        """
+        Advances every game not over by one frame, flapping first in those
+        where flaps is set.  Returns the games that are over.
+        """
+        playing = ~self.done
+        self.flap(numpy.asarray(flaps, bool) & playing)
+        self.step(playing)
+        return self.done
+
+    def flap(self, games):
+        self.y_velocity[games] = self.arc.max_rise_speed
+        self.flap_height[games] = self.height[games]
+        self.flap_angle[games] = self.current_angle[games]
+        self.flap_ticks[games] = 0
+        self.lift[games] = 0
+        starting = games & ~self.started
+        self.started |= starting
+        self.placed[starting] = self.scrolled[starting]
+        self.passed_count[starting] = 0
+
+    def get_velocity(self, ticks):
+        arc = self.arc
+        return numpy.where(ticks < arc.terminal,
+                           arc.max_rise_speed + ticks * arc.gravity,
+                           arc.max_fall_speed)
+
+    def get_height(self):
+        arc = self.arc
+        ticks = self.flap_ticks
+        drop = numpy.where(ticks < arc.terminal,
+                           ticks * arc.max_rise_speed + arc.gravity * (ticks * (ticks + 1) // 2),
+                           arc.terminal_drop + (ticks - arc.terminal + 1) * arc.max_fall_speed)
+        return (self.flap_height + drop) + self.lift
+
+    def clamp_to_ceiling(self, games):
+        while True:
+            games = games & (numpy.trunc(self.height) < 0)
+            if not games.any():
+                return
+            self.lift[games] += 1
+            self.height[games] = self.get_height()[games]
+
+    def step(self, games):
+        """
+        Plays one tick of Simulation.step() in each of games.
+        """
+        reference = self.reference
+        count = self.obstacle_count
+        self.ticks[games] += 1
+
+        # move the leftmost obstacle behind the rightmost once offscreen
+        while True:
+            recycled = games & self.started & \
+                (self.get_obstacle_x(0) <= -reference.obstacle_width)
+            if not recycled.any():
+                break
+            index = self.gap_index[recycled]
+            self.number_above[recycled, index % count] = \
+                course_gaps(self.keys[recycled], index, self.choices)
+            self.gap_index[recycled] += 1
+            self.passed_count[recycled] = numpy.maximum(self.passed_count[recycled] - 1, 0)
+
+        # score when the player's center reaches the next obstacle
+        scoring = games & (self.passed_count < count)
+        self.clamp_to_ceiling(scoring)
+        k = self.gap_index - count + self.passed_count + FIRST_OBSTACLE
+        distance = (self.scrolled - 2 * self.placed) * reference.x_velocity
+        passing = scoring & (reference.player_x + reference.player_width // 2 >=
+                             reference.pipe_spacing * k - distance)
+        self.passed_count[passing] += 1
+        self.score[passing] += 1
+
+        crashed = games & self.collides()
+        self.done |= crashed
+        games = games & ~crashed
+
+        # drawing moves the player and then the scenery
+        ideal = numpy.where(self.started,
+                            self.ideal_by_tick[numpy.minimum(self.flap_ticks, self.arc.terminal)],
+                            self.rest)
+        angle = numpy.minimum(self.flap_angle + MAX_CHANGE_ANGLE * (self.flap_ticks + 1), ideal)
+        self.current_angle[games] = angle[games]
+        self.clamp_to_ceiling(games)
+
+        moving = games & self.started
+        self.flap_ticks[moving] += 1
+        self.y_velocity[moving] = self.get_velocity(self.flap_ticks)[moving]
+        self.height[moving] = self.get_height()[moving]
+        self.scrolled[games] += 1
+
+    def collides(self):
+        """
+        Returns which games' players hit the terrain or an obstacle.
+        """
+        reference = self.reference
+        offset = -int(reference.contraction / 2.)
+        size = numpy.rint(self.current_angle * ANGLE_UNITS).astype(numpy.int64) - self.lowest
+        px = reference.player_x + offset
+        py = numpy.trunc(self.height).astype(numpy.int64) + offset
+        pw = self.widths[size] + reference.contraction
+        ph = self.heights[size] + reference.contraction
+        right, bottom = px + pw, py + ph
+
+        tx, ty, tw, th = reference.terrain_rect
+        hit = (px < tx + tw) & (py < ty + th) & (right > tx) & (bottom > ty)
+
+        # an obstacle's column is hit outside its gap
+        width = reference.obstacle_width
+        row_height = reference.row_height
+        for j in range(self.obstacle_count):
+            x = numpy.trunc(self.get_obstacle_x(j)).astype(numpy.int64)
+            above = self.get_number_above(j)
+            over = (x < right) & (x + width > px)
+            hit |= over & (above > 0) & (py < row_height * above) & (bottom > 0)
+            hit |= over & (above + GAP_ROWS < OBSTACLE_ROWS) & \
+                (py < row_height * OBSTACLE_ROWS) & \
+                (bottom > row_height * (above + GAP_ROWS))
+        return hit & (pw > 0) & (ph > 0)
@@ -0,0 +1,216 @@
+##############################################################################
+# dataset.py
+##############################################################################
+# On-disk trajectory datasets.  Rows are gathered into fixed-size chunks in
+# memory, one buffer per column, and each full chunk is saved as one .npy
+# file per column:
+#     <path>/<column>/<chunk number>.npy
+# next to index.json, which lists the columns and the rows in each chunk.
+# Chunks are never rewritten and the index only names complete chunks, so
+# writing is append-only and a crash loses at most the unsaved chunk.  The
+# reader memory-maps chunks, so scans only touch the rows and columns asked
+# for.
+##############################################################################
+
+import bisect
+import json
+import os
+
+import numpy
+
+from trajectory import ROW_DTYPE
+
+INDEX_NAME = 'index.json'
+
+def chunk_name(chunk):
+    return '%06d.npy' % chunk
+
+def load_index(path):
+    index_path = os.path.join(path, INDEX_NAME)
+    if not os.path.exists(index_path):
+        return None
+    index_file = open(index_path)
+    try:
+        index = json.load(index_file)
+    finally:
+        index_file.close()
+    index['dtype'] = numpy.dtype([(str(name), str(code))
+                                  for name, code in index['columns']])
+    return index
+
+##############################################################################
+# WRITER
+##############################################################################
+
+class DatasetWriter:
+
+    def __init__(self, path, dtype=ROW_DTYPE, chunk_rows=65536):
+        """
+        path - directory of the dataset; an existing one is appended to
+        dtype - structured dtype of a row, one column per field
+        chunk_rows - rows per chunk, and so per column buffer in memory
+        """
+        self.path = path
+        index = load_index(path)
+        if index is None:
+            self.dtype = numpy.dtype(dtype)
+            self.chunk_rows = chunk_rows
+            self.chunks = [] # rows in each saved chunk
+        else:
+            if index['dtype'] != numpy.dtype(dtype):
+                raise ValueError('Dataset %s has columns %s, not %s' %
+                                 (path, index['dtype'], numpy.dtype(dtype)))
+            self.dtype = index['dtype']
+            self.chunk_rows = index['chunk_rows']
+            self.chunks = index['chunks']
+        self.names = self.dtype.names
+
+        for name in self.names:
+            column_path = os.path.join(path, name)
+            if not os.path.isdir(column_path):
+                os.makedirs(column_path)
+
+        self.buffers = [numpy.empty(self.chunk_rows, self.dtype[name])
+                        for name in self.names]
+        self.fill = 0
+        self.rows = sum(self.chunks) # rows saved
+
+    #--------------------------------------------------------------------------
+
+    def append(self, row):
+        """
+        Adds a row given as a tuple in column order.
+        """
+        fill = self.fill
+        for buffer, value in zip(self.buffers, row):
+            buffer[fill] = value
+        self.fill = fill + 1
+        if self.fill == self.chunk_rows:
+            self.flush()
+
+    def append_rows(self, rows):
+        """
+        Adds rows from a structured array, or anything else indexed by
+        column name, such as the views a TrajectoryRing hands out.
+        """
+        columns = [rows[name] for name in self.names]
+        count = len(columns[0])
+        copied = 0
+        while copied < count:
+            take = min(self.chunk_rows - self.fill, count - copied)
+            for buffer, column in zip(self.buffers, columns):
+                buffer[self.fill:self.fill + take] = column[copied:copied + take]
+            self.fill += take
+            copied += take
+            if self.fill == self.chunk_rows:
+                self.flush()
+
+    def flush(self):
+        """
+        Saves the rows gathered so far as a chunk, even if it is not full.
+        """
+        if self.fill == 0:
+            return
+        name = chunk_name(len(self.chunks))
+        for column, buffer in zip(self.names, self.buffers):
+            numpy.save(os.path.join(self.path, column, name), buffer[:self.fill])
+        self.chunks.append(self.fill)
+        self.rows += self.fill
+        self.fill = 0
+        self.write_index()
+
+    def write_index(self):
+        index = {'columns': [[name, self.dtype[name].str] for name in self.names],
+                 'chunk_rows': self.chunk_rows,
+                 'chunks': self.chunks}
+        index_path = os.path.join(self.path, INDEX_NAME)
+        temp_path = index_path + '.tmp'
+        index_file = open(temp_path, 'w')
+        try:
+            json.dump(index, index_file)
+        finally:
+            index_file.close()
+        if os.name == 'nt' and os.path.exists(index_path):
+            os.remove(index_path) # rename does not replace on Windows
+        os.rename(temp_path, index_path)
+
+    def close(self):
+        self.flush()
+
+##############################################################################
+# READER
+##############################################################################
+
+class DatasetReader:
+
+    def __init__(self, path):
+        index = load_index(path)
+        if index is None:
+            raise IOError('No dataset index in %s' % (path,))
+        self.path = path
+        self.dtype = index['dtype']
+        self.names = self.dtype.names
+        self.chunks = index['chunks']
+
+        # first row of each chunk
+        self.starts = []
+        start = 0
+        for rows in self.chunks:
+            self.starts.append(start)
+            start += rows
+        self.rows = start
+
+        self.maps = {} # (column, chunk) -> memmap
+
+    def __len__(self):
+        return self.rows
+
+    #--------------------------------------------------------------------------
+
+    def chunk(self, column, chunk):
+        """
+        Returns a chunk of a column, memory-mapped read-only.
+        """
+        key = (column, chunk)
+        array = self.maps.get(key)
+        if array is None:
+            array = numpy.load(os.path.join(self.path, column, chunk_name(chunk)),
+                               mmap_mode='r')
+            self.maps[key] = array
+        return array
+
+    def scan(self, column, start=0, stop=None):
+        """
+        Yields (first row, array) for each chunk's part of rows start to stop
+        of a column; the arrays are memory-mapped, not copied.
+        """
+        if stop is None or stop > self.rows:
+            stop = self.rows
+        chunk = max(0, bisect.bisect_right(self.starts, start) - 1)
+        while chunk < len(self.chunks) and self.starts[chunk] < stop:
+            first = self.starts[chunk]
+            lo = max(start - first, 0)
+            hi = min(stop - first, self.chunks[chunk])
+            if hi > lo:
+                yield first + lo, self.chunk(column, chunk)[lo:hi]
+            chunk += 1
+
+    def read(self, column, start=0, stop=None):
+        """
+        Returns rows start to stop of a column as one array.  Only those rows
+        are read.
+        """
+        parts = [array for first, array in self.scan(column, start, stop)] # @UnusedVariable
+        if not parts:
+            return numpy.empty(0, self.dtype[column])
+        if len(parts) == 1:
+            return parts[0]
+        return numpy.concatenate(parts)
+
+    def read_rows(self, start=0, stop=None, columns=None):
+        """
+        Returns a dict mapping each column, or each of columns, to rows start
+        to stop of it.
+        """
+        return dict([(name, self.read(name, start, stop))
+                     for name in (columns or self.names)])
@@ -0,0 +1,144 @@
+##############################################################################
+# asyncspinner.py
+##############################################################################
+# Game loop driven by an asyncio event loop, for running the game alongside
+# other asyncio work in the same process.  Ticks are posted from a coroutine
+# that sleeps to each frame deadline, and game code can hand coroutines to
+# the spinner with schedule() instead of blocking a frame.
+# Needs Python 3.7 or later.
+##############################################################################
+
+import asyncio
+from collections import deque
+
+from systemevents import *  # @UnusedWildImport
+
+class AsyncSpinner(SystemEventListener):
+
+    # spinner whose loop schedule() hands coroutines to
+    instance = None
+
+    @classmethod
+    def schedule(cls, coro):
+        """
+        Runs coro on the spinner's event loop, or as soon as it starts.
+        Returns the task, or None if the coroutine was queued or there is no
+        spinner (in which case it is closed without running).
+        """
+        spinner = cls.instance
+        if spinner is None:
+            coro.close()
+            return None
+        if spinner.loop is None:
+            spinner.queued.append(coro)
+            return None
+        return spinner.start_task(coro)
+
+    #--------------------------------------------------------------------------
+
+    def __init__(self, fps, gc_policy=None, history=600, shutdown_grace=1.):
+        """
+        gc_policy - optional GCPolicy, as for CPUSpinner
+        history - number of loop lag samples kept for get_lag_stats()
+        shutdown_grace - seconds outstanding tasks get to finish on quit
+        """
+        SystemEventListener.__init__(self)
+
+        self.fps = fps
+        self.running = True
+        self.gc_policy = gc_policy
+        self.shutdown_grace = shutdown_grace
+
+        self.loop = None
+        self.queued = [] # coroutines scheduled before the loop started
+        self.tasks = set()
+        self.failed_tasks = 0
+
+        # how late each tick coroutine woke after its deadline, in seconds
+        self.lags = deque(maxlen=history)
+        self.worst_lag = 0.
+
+        AsyncSpinner.instance = self
+
+    #--------------------------------------------------------------------------
+
+    def run(self):
+        """
+        Runs the game on a new event loop until a QuitEvent.
+        """
+        asyncio.run(self.run_async())
+
+    async def run_async(self):
+        """
+        Runs the game on the current event loop until a QuitEvent.
+        """
+        self.loop = asyncio.get_running_loop()
+        for coro in self.queued:
+            self.start_task(coro)
+        self.queued = []
+
+        if self.gc_policy is not None:
+            self.gc_policy.start()
+        try:
+            await self.spin()
+        finally:
+            if self.gc_policy is not None:
+                self.gc_policy.stop()
+            if self.tasks:
+                await asyncio.wait(list(self.tasks), timeout=self.shutdown_grace)
+            self.loop = None
+
+    async def spin(self):
+        frame_time = 1. / self.fps
+        deadline = self.loop.time()
+        while self.running:
+            deadline += frame_time
+            now = self.loop.time()
+            if deadline < now - frame_time: # fell behind; don't catch up
+                deadline = now
+            await asyncio.sleep(deadline - now)
+
+            frame_start = self.loop.time()
+            lag = max(0., frame_start - deadline)
+            self.lags.append(lag)
+            self.worst_lag = max(self.worst_lag, lag)
+
+            SystemEventManager.post(TickEvent())
+
+            work = self.loop.time() - frame_start
+            SystemEventManager.post(IdleEvent(frame_time - work))
+
+    #--------------------------------------------------------------------------
+
+    def start_task(self, coro):
+        task = self.loop.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.task_done)
+        return task
+
+    def task_done(self, task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.failed_tasks += 1
+            print('Scheduled task failed: %r' % (task.exception(),))
+
+    def get_lag_stats(self):
+        """
+        Returns a dict of the mean, 99th percentile and worst loop lag, in
+        seconds.
+        """
+        count = len(self.lags)
+        if count == 0:
+            return {'ticks': 0, 'mean_lag': 0., 'p99_lag': 0.,
+                    'worst_lag': self.worst_lag}
+        lags = sorted(self.lags)
+        return {'ticks': count,
+                'mean_lag': sum(lags) / count,
+                'p99_lag': lags[min(count - 1, int(count * 0.99))],
+                'worst_lag': self.worst_lag}
+
+    #--------------------------------------------------------------------------
+
+    def notify(self, event):
+        if isinstance(event, QuitEvent):
+            self.running = False
@@ -8,11 +8,14 @@
 ##############################################################################
 
 from systemevents import *  # @UnusedWildImport
+from timeit import default_timer
+import time
 import pygame
    
 class CPUSpinner(SystemEventListener):
 
-    def __init__(self, fps):
+    def __init__(self, fps, gc_policy=None, scene_tracker=None, idle_fps=10,
+                 latency_mode=False, pacer=None, event_source=None):
         # print 'cpuspinner init' # DEBUG
         SystemEventListener.__init__(self)
         
@@ -24,14 +27,89 @@ class CPUSpinner(SystemEventListener):
       
         # clock used to maintain FPS
         self.clock = pygame.time.Clock()
+        
+        # optional FramePacer used instead of the clock for precise pacing
+        self.pacer = pacer
+        
+        # optional GCPolicy; kept here as listeners are only weakly referenced
+        self.gc_policy = gc_policy
+        
+        # optional SceneTracker; while the scene is idle, tick at idle_fps
+        # unless input arrives
+        self.scene_tracker = scene_tracker
+        self.idle_fps = idle_fps
+        
+        # where waiting input is peeked at: pygame.event, or an EventQueue
+        # when the loop runs off the main thread
+        self.event_source = event_source or pygame.event
+        
+        # in latency mode the loop sleeps right after the frame is presented,
+        # wakes just in time to do the next frame's expected work, and reads
+        # input again immediately before the TickEvent
+        self.latency_mode = latency_mode
+        self.next_frame = None # time the next frame should be presented
+        self.work_estimate = 0. # decaying maximum of recent frame work
       
     #--------------------------------------------------------------------------
         
     def run(self):
-        while(self.running):
-            self.clock.tick(self.fps)
-            event = TickEvent()
-            SystemEventManager.post(event)
+        frame_time = 1. / self.fps
+        self.next_frame = default_timer()
+        if self.gc_policy is not None:
+            self.gc_policy.start()
+        try:
+            while(self.running):
+                if self.scene_tracker is not None and \
+                    self.scene_tracker.is_idle():
+                    self.wait_idle()
+                elif self.latency_mode:
+                    self.wait_late(frame_time)
+                elif self.pacer is not None:
+                    self.pacer.wait()
+                else:
+                    self.clock.tick(self.fps)
+                frame_start = default_timer()
+                if self.latency_mode:
+                    SystemEventManager.post(InputPollEvent())
+                event = TickEvent()
+                SystemEventManager.post(event)
+                
+                # hand whatever is left of the frame to idle work
+                work = default_timer() - frame_start
+                self.work_estimate = max(work, self.work_estimate * 0.95)
+                budget = frame_time - work
+                SystemEventManager.post(IdleEvent(budget))
+        finally:
+            if self.gc_policy is not None:
+                self.gc_policy.stop()
+         
+    def wait_idle(self):
+        """
+        Sleeps for one idle frame, returning early if input is waiting.
+        """
+        deadline = pygame.time.get_ticks() + 1000 / self.idle_fps
+        while pygame.time.get_ticks() < deadline and not self.event_source.peek():
+            pygame.time.wait(10)
+        self.clock.tick() # restart the frame clock after the long frame
+        self.next_frame = default_timer()
+        if self.pacer is not None:
+            self.pacer.resync()
+    
+    def wait_late(self, frame_time):
+        """
+        Sleeps until the next frame's expected work has to start for it to be
+        presented on time.
+        """
+        self.next_frame += frame_time
+        now = default_timer()
+        if self.next_frame < now - frame_time: # fell behind; don't catch up
+            self.next_frame = now
+        wake = self.next_frame - self.work_estimate - 0.001
+        if self.pacer is not None:
+            self.pacer.sleep_until(wake)
+            self.pacer.mark()
+        elif wake > now:
+            time.sleep(wake - now)
          
     #--------------------------------------------------------------------------
    
@@ -10,6 +10,7 @@
 # 03/13 - Flembobs
 ##############################################################################
 
+import threading
 from weakref import WeakKeyDictionary
 
 ##############################################################################
@@ -26,16 +27,54 @@ class Event:
 # LISTENER SUPERCLASS
 ##############################################################################
    
+# per-thread flag set by DeferredRegistration
+_registration = threading.local()
+
 class Listener:
     """
     Interface for listeners.                                                   
     """
    
     def __init__(self, event_manager):
-        event_manager.register_listener(self)
+        # remember every manager joined so they can all be left again
+        managers = self.__dict__.setdefault('_event_managers', [])
+        if event_manager not in managers:
+            managers.append(event_manager)
+        if not getattr(_registration, 'deferred', False):
+            event_manager.register_listener(self)
    
     def notify(self, event):
         raise NotImplementedError
+    
+    def subscribe(self):
+        """
+        Registers with every event manager this listener was created for.
+        """
+        for event_manager in self._event_managers:
+            event_manager.register_listener(self)
+    
+    def unsubscribe(self):
+        """
+        Unregisters from every event manager this listener was created for.
+        """
+        for event_manager in self._event_managers:
+            event_manager.unregister_listener(self)
+      
+class DeferredRegistration:
+    """
+    Context manager.  Listeners created inside it on the current thread are
+    not registered with their event managers until subscribe() is called, so
+    objects can be built ahead of time without receiving events.
+    """
+    
+    def __enter__(self):
+        self.previous = getattr(_registration, 'deferred', False)
+        _registration.deferred = True
+        return self
+    
+    def __exit__(self, *exc_info):
+        _registration.deferred = self.previous
+        return False
       
 ##############################################################################
 # EVENT MANAGER SUPERCLASS
@@ -49,24 +88,48 @@ class EventManager:
    
     # keys of this map are objects listening for events
     listeners = WeakKeyDictionary()
+    
+    # every manager that has had a listener registered, for debug reports
+    managers = set()
+    
+    # EventTracer timing every post while tracing is on (see tracer.py)
+    tracer = None
       
     #--------------------------------------------------------------------------
    
     @classmethod
     def register_listener(cls, listener):
         cls.listeners[listener] = 1
+        EventManager.managers.add(cls)
       
     #--------------------------------------------------------------------------
   
     @classmethod 
     def unregister_listener(cls, listener):
-        if listener in cls.listeners.keys():
-            del cls.listeners[listener]
+        cls.listeners.pop(listener, None)
          
     #--------------------------------------------------------------------------
    
     @classmethod
     def post(cls, event):
-        for listener in cls.listeners.keys():
+        if EventManager.tracer is not None:
+            EventManager.tracer.post(cls, event)
+            return
+        listeners = cls.listeners
+        for listener in listeners.keys():
             # print listener # DEBUG
-            listener.notify(event)
+            # skip listeners unregistered by an earlier notify of this event
+            if listener in listeners:
+                listener.notify(event)
+    
+    #--------------------------------------------------------------------------
+    
+    @staticmethod
+    def listener_counts():
+        """
+        Returns a dict mapping each manager's name to its number of listeners.
+        """
+        counts = {}
+        for manager in EventManager.managers:
+            counts[manager.__name__] = len(manager.listeners)
+        return counts
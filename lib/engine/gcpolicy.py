@@ -0,0 +1,121 @@
+##############################################################################
+# gcpolicy.py
+##############################################################################
+# Opt-in garbage collection policy for the CPU Spinner.  Turns off CPython's
+# automatic generational collector while the game loop runs and instead
+# collects in the time left over at the end of each frame, with a full
+# collection whenever the model changes state.
+##############################################################################
+
+import gc
+from collections import deque
+from timeit import default_timer
+
+from systemevents import *  # @UnusedWildImport
+
+class GCPolicy(SystemEventListener):
+
+    def __init__(self, min_budget=0.002, max_deferred=30, history=120):
+        """
+        min_budget - seconds that must be left in a frame before an
+                     incremental collection is run in it
+        max_deferred - number of frames a due collection may be put off for
+                       lack of time before it is run anyway
+        history - number of per-frame pause times to keep
+        """
+        SystemEventListener.__init__(self)
+
+        self.min_budget = min_budget
+        self.max_deferred = max_deferred
+
+        # thresholds the automatic collector would have used
+        self.thresholds = gc.get_threshold()
+
+        # set when the model changes state, serviced at the end of the frame
+        self.full_pending = False
+        self._deferred = 0
+        self._was_enabled = None
+
+        # counters
+        self.frame_pauses = deque(maxlen=history) # seconds spent per frame
+        self.collections = [0, 0, 0] # collections run per generation
+        self.total_pause = 0.
+        self.max_pause = 0.
+        self.last_pause = 0.
+
+    #--------------------------------------------------------------------------
+
+    def start(self):
+        """
+        Disables automatic collection.  Called when the game loop starts.
+        """
+        if self._was_enabled is None:
+            self._was_enabled = gc.isenabled()
+            gc.disable()
+
+    def stop(self):
+        """
+        Restores automatic collection if it was on before start() was called.
+        """
+        if self._was_enabled:
+            gc.enable()
+        self._was_enabled = None
+
+    #--------------------------------------------------------------------------
+
+    def due_generation(self):
+        """
+        Returns the generation the automatic collector would collect now, or
+        None if nothing is due.
+        """
+        count0, count1 = gc.get_count()[:2]
+        if count1 >= self.thresholds[1]:
+            return 1
+        if count0 >= self.thresholds[0]:
+            return 0
+        return None
+
+    def collect(self, generation):
+        start = default_timer()
+        gc.collect(generation)
+        pause = default_timer() - start
+        self.collections[generation] += 1
+        self.total_pause += pause
+        self.max_pause = max(self.max_pause, pause)
+        return pause
+
+    def get_stats(self):
+        frames = len(self.frame_pauses)
+        return {'collections': tuple(self.collections),
+                'total_pause': self.total_pause,
+                'max_pause': self.max_pause,
+                'last_pause': self.last_pause,
+                'mean_frame_pause': sum(self.frame_pauses) / frames if frames else 0.}
+
+    #--------------------------------------------------------------------------
+
+    def notify(self, event):
+
+        if isinstance(event, StateChangeEvent):
+            # old state is garbage now; collect everything once the frame ends
+            self.full_pending = True
+
+        if isinstance(event, IdleEvent):
+            pause = 0.
+
+            if self.full_pending:
+                self.full_pending = False
+                self._deferred = 0
+                pause += self.collect(2)
+            else:
+                generation = self.due_generation()
+                if generation is not None:
+                    if event.budget >= self.min_budget or \
+                        self._deferred >= self.max_deferred:
+                        self._deferred = 0
+                        pause += self.collect(generation)
+                    else:
+                        self._deferred += 1
+
+            self.last_pause = pause
+            self.frame_pauses.append(pause)
@@ -0,0 +1,83 @@
+##############################################################################
+# latency.py
+##############################################################################
+# Measures input-to-present latency: the time from a key press being read
+# from the pygame queue to the display flip of the first frame requested
+# after it was handled.
+##############################################################################
+
+from systemevents import *  # @UnusedWildImport
+import pygame
+
+class LatencyProbe(SystemEventListener):
+
+    def __init__(self, keys=None, bucket_ms=1, buckets=100):
+        """
+        keys - keys whose presses are measured, or None for every key
+        bucket_ms - width of each histogram bucket in milliseconds
+        buckets - number of buckets; slower presses go in the last one
+        """
+        SystemEventListener.__init__(self)
+
+        self.keys = keys
+        self.bucket_ms = bucket_ms
+        self.histogram = [0] * buckets
+
+        # times of presses not yet presented
+        self.pending = []
+
+        self.samples = 0
+        self.total = 0.
+        self.worst = 0.
+
+    #--------------------------------------------------------------------------
+
+    def record(self, latency):
+        bucket = int(latency * 1000 / self.bucket_ms)
+        self.histogram[min(bucket, len(self.histogram) - 1)] += 1
+        self.samples += 1
+        self.total += latency
+        self.worst = max(self.worst, latency)
+
+    def get_mean(self):
+        return self.total / self.samples if self.samples else 0.
+
+    def get_percentile(self, percent):
+        """
+        Returns the upper edge, in seconds, of the bucket holding the given
+        percentile.
+        """
+        if not self.samples:
+            return 0.
+        wanted = self.samples * percent / 100.
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if seen >= wanted:
+                return (bucket + 1) * self.bucket_ms / 1000.
+        return len(self.histogram) * self.bucket_ms / 1000.
+
+    def get_histogram(self):
+        """
+        Returns (bucket start in ms, count) for each non-empty bucket.
+        """
+        return [(bucket * self.bucket_ms, count)
+                for bucket, count in enumerate(self.histogram) if count]
+
+    #--------------------------------------------------------------------------
+
+    def notify(self, event):
+
+        if isinstance(event, KeyboardEvent) and event.type == pygame.KEYDOWN:
+            if self.keys is None or event.key in self.keys:
+                self.pending.append(event.time)
+
+        if isinstance(event, FramePresentedEvent) and self.pending:
+            # presses handled before the frame was requested are now visible
+            still_pending = []
+            for press_time in self.pending:
+                if press_time <= event.request_time:
+                    self.record(event.present_time - press_time)
+                else:
+                    still_pending.append(press_time)
+            self.pending = still_pending
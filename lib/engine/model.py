@@ -7,12 +7,33 @@
 # 06/12 - Flembobs
 ##############################################################################
 
+from events import EventManager, Listener
+from systemevents import SystemEventManager, StateChangeEvent
+
 class Model:
+    
+    state = None
+    
+    # listener counts per event manager, taken after the last state change
+    listener_report = {}
+    
+    # print the listener report after each state change
+    debug = False
    
     @classmethod
     def change_state(self, new_state):
         # print 'change model to', new_state # DEBUG
+        old_state = self.state
+        if old_state is not None and old_state is not new_state:
+            old_state.exit(new_state)
+        new_state.enter()
         self.state = new_state                                
+        
+        self.listener_report = EventManager.listener_counts()
+        if self.debug:
+            print(self.listener_report)
+        
+        SystemEventManager.post(StateChangeEvent(old_state, new_state))
                                  
 ##############################################################################
 # GAME OBJECT
@@ -22,6 +43,20 @@ class GameObject:
    
     def render(self, screen):
         raise NotImplementedError
+    
+    def attach(self):
+        """
+        Subscribes the object, and anything it owns, to its event managers.
+        """
+        if isinstance(self, Listener):
+            self.subscribe()
+    
+    def detach(self):
+        """
+        Unsubscribes the object, and anything it owns, from its event managers.
+        """
+        if isinstance(self, Listener):
+            self.unsubscribe()
       
 ##############################################################################
 # STATE
@@ -32,3 +67,22 @@ class State:
         systemeventlistener.__init__(self)
         guieventlistener.__init__(self)
         self.game_objects = []
+    
+    def enter(self):
+        """
+        Subscribes the state and its game objects.  Called by the model when
+        the state becomes current.
+        """
+        self.subscribe()
+        for game_object in self.game_objects:
+            game_object.attach()
+    
+    def exit(self, next_state):
+        """
+        Unsubscribes the state and every game object it owns that is not
+        handed on to next_state.  Called by the model when the state is left.
+        """
+        self.unsubscribe()
+        for game_object in self.game_objects:
+            if game_object not in next_state.game_objects:
+                game_object.detach()
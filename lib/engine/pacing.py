@@ -0,0 +1,94 @@
+##############################################################################
+# pacing.py
+##############################################################################
+# Frame pacing that hits each frame deadline precisely: a coarse sleep that
+# stops short of the deadline, then a short spin for the rest.  The spin is
+# capped per frame so pacing cannot eat the CPU.  Frame intervals are kept
+# so jitter can be queried while the game runs.
+##############################################################################
+
+import math
+import time
+from collections import deque
+from timeit import default_timer
+
+class FramePacer:
+
+    def __init__(self, fps, max_spin=0.002, history=600):
+        """
+        fps - frames per second to pace to
+        max_spin - most seconds spent busy-waiting before any one deadline
+        history - number of frame intervals kept for get_stats()
+        """
+        self.frame_time = 1. / fps
+        self.max_spin = max_spin
+
+        # how far short of the deadline to stop sleeping; grows with the
+        # worst oversleep seen, up to max_spin
+        self.spin_margin = max_spin / 2
+
+        self.deadline = None
+        self.last_mark = None
+        self.intervals = deque(maxlen=history)
+
+    #--------------------------------------------------------------------------
+
+    def wait(self):
+        """
+        Sleeps until the next frame is due, then records the frame interval.
+        """
+        now = default_timer()
+        if self.deadline is None or self.deadline < now - self.frame_time:
+            self.deadline = now # first frame, or fell behind; don't catch up
+        else:
+            self.deadline += self.frame_time
+        self.sleep_until(self.deadline)
+        self.mark()
+
+    def sleep_until(self, target):
+        remaining = target - default_timer()
+        if remaining > self.spin_margin:
+            time.sleep(remaining - self.spin_margin)
+            oversleep = default_timer() - (target - self.spin_margin)
+            if oversleep > self.spin_margin:
+                self.spin_margin = min(self.max_spin, oversleep * 1.25)
+        while default_timer() < target:
+            pass
+
+    def mark(self):
+        """
+        Records the interval since the previous mark as a frame interval.
+        """
+        now = default_timer()
+        if self.last_mark is not None:
+            self.intervals.append(now - self.last_mark)
+        self.last_mark = now
+
+    def resync(self):
+        """
+        Forgets the current deadline, e.g. after a deliberately long frame.
+        """
+        self.deadline = None
+        self.last_mark = None
+
+    #--------------------------------------------------------------------------
+
+    def get_stats(self):
+        """
+        Returns a dict of the mean frame interval, and the mean, standard
+        deviation and 99th percentile of each interval's deviation from the
+        target, all in seconds.
+        """
+        count = len(self.intervals)
+        if count == 0:
+            return {'frames': 0, 'mean_interval': 0., 'mean_jitter': 0.,
+                    'stddev_jitter': 0., 'p99_jitter': 0.}
+        deviations = sorted([abs(interval - self.frame_time)
+                             for interval in self.intervals])
+        mean = sum(deviations) / count
+        variance = sum([(d - mean) ** 2 for d in deviations]) / count
+        return {'frames': count,
+                'mean_interval': sum(self.intervals) / count,
+                'mean_jitter': mean,
+                'stddev_jitter': math.sqrt(variance),
+                'p99_jitter': deviations[min(count - 1, int(count * 0.99))]}
@@ -12,18 +12,24 @@ import pygame
 
 class PygameEventsManager(SystemEventListener):
 
-    def __init__(self):
+    def __init__(self, source=None):
+        """
+        source - where events are read from: pygame.event by default, or an
+                 EventQueue filled by another thread
+        """
         # print 'pygameeventsmanager init' # DEBUG
         SystemEventListener.__init__(self)
+        
+        self.source = source or pygame.event
       
     #--------------------------------------------------------------------------
       
     def notify(self, event):
    
-        if isinstance(event, TickEvent):
+        if isinstance(event, TickEvent) or isinstance(event, InputPollEvent):
       
             # get most recent pygame events
-            pygame_events = pygame.event.get()         
+            pygame_events = self.source.get()         
          
             # convert pygame events into system events
             for pygame_event in pygame_events:
@@ -8,32 +8,122 @@
 
 import os
 import pygame
+from collections import deque
+from timeit import default_timer
 from systemevents import *  # @UnusedWildImport
+from threadedloop import SnapshotBuffer
 
 class PygameView(SystemEventListener):
    
-    def __init__(self, caption, size, bg_color):
+    def __init__(self, caption, size, bg_color, render_size=None,
+                 scaler='scale2x', scene_tracker=None, snapshot_slots=None):
+        """
+        size - size of the window
+        render_size - if given, the scene is drawn offscreen at this size and
+                      upscaled into the window once per frame by the largest
+                      whole factor that fits
+        scaler - 'scale2x' to upscale with scale2x when the factor is 2, or
+                 'scale' to always use a plain pixel-doubling scale
+        scene_tracker - optional SceneTracker; static scenes that have
+                        already been presented are not drawn again
+        snapshot_slots - if given (2 or 3), frames are recorded into a
+                         SnapshotBuffer with that many slots instead of
+                         drawn, and presented from the main thread with
+                         present_latest()
+        """
         # print 'pygameview init' # DEBUG
         SystemEventListener.__init__(self)
       
         os.environ["SDL_VIDEO_CENTERED"] = "1"
         pygame.display.set_caption(caption)
-        self.screen = pygame.display.set_mode(size)
+        self.window = pygame.display.set_mode(size)
+        self.screen = self.window
       
         self.bg_color = bg_color
+        self.scene_tracker = scene_tracker
+        
+        # offscreen canvas and the part of the window it is scaled into
+        self.scaler = scaler
+        self.target = None
+        if render_size is not None:
+            factor = max(1, min(size[0] // render_size[0],
+                                size[1] // render_size[1]))
+            target_rect = pygame.Rect((0, 0), (render_size[0] * factor,
+                                               render_size[1] * factor))
+            target_rect.center = self.window.get_rect().center
+            self.screen = pygame.Surface(render_size).convert()
+            self.target = self.window.subsurface(target_rect)
+            self.factor = factor
+        
+        # recorded frames and the (request, present) times of those
+        # presented, posted from the drawing thread
+        self.snapshots = None
+        self.presented = deque()
+        if snapshot_slots is not None:
+            self.snapshots = SnapshotBuffer(self.screen.get_size(),
+                                            snapshot_slots)
       
     #--------------------------------------------------------------------------
     
     def get_size(self, event):
         return self.screen.get_size()
     
+    def present(self):
+        """
+        Upscales the offscreen canvas, if any, into the window and flips.
+        """
+        if self.target is not None:
+            if self.scaler == 'scale2x' and self.factor == 2:
+                pygame.transform.scale2x(self.screen, self.target)
+            else:
+                pygame.transform.scale(self.screen, self.target.get_size(),
+                                       self.target)
+        pygame.display.flip()
+    
+    def present_latest(self, timeout=None):
+        """
+        Replays and presents the latest recorded frame, waiting up to timeout
+        seconds for one.  Called from the main thread.
+        """
+        canvas = self.snapshots.acquire(timeout)
+        if canvas is None:
+            return
+        try:
+            canvas.replay(self.screen)
+            self.present()
+            self.presented.append((canvas.request_time, default_timer()))
+        finally:
+            self.snapshots.release()
+    
     def notify(self, event):
       
         if isinstance(event, DrawRequestEvent):
+            
+            while self.presented:
+                request_time, present_time = self.presented.popleft()
+                SystemEventManager.post(FramePresentedEvent(request_time,
+                                                            present_time))
+            
+            if self.scene_tracker is not None and \
+                not self.scene_tracker.should_draw(event):
+                return
+            
+            if self.snapshots is not None:
+                screen = self.snapshots.back()
+                screen.clear()
+                screen.request_time = event.time
+            else:
+                screen = self.screen
          
-            self.screen.fill(self.bg_color)
+            screen.fill(self.bg_color)
       
             for game_object in event.visible_objects:
-                game_object.render(self.screen)
+                game_object.render(screen)
+            
+            if self.snapshots is not None:
+                self.snapshots.publish()
+                return
             
-            pygame.display.flip()
+            self.present()
+            SystemEventManager.post(FramePresentedEvent(event.time,
+                                                        default_timer()))
@@ -0,0 +1,66 @@
+##############################################################################
+# scenetracker.py
+##############################################################################
+# Tracks whether the scene has changed since it was last presented, so the
+# view can skip redrawing a static scene and the CPU Spinner can drop to a
+# low tick rate until input or animation wakes it up.
+##############################################################################
+
+from systemevents import *  # @UnusedWildImport
+
+class SceneTracker(SystemEventListener):
+
+    def __init__(self, idle_after=2):
+        """
+        idle_after - number of consecutive skipped frames after which the
+                     scene counts as idle
+        """
+        SystemEventListener.__init__(self)
+
+        self.idle_after = idle_after
+
+        # input arrived since the last frame was presented
+        self.input_pending = True
+
+        # the last frame presented was a static scene
+        self.presented_static = False
+
+        # counters
+        self.skipped_frames = 0 # consecutive frames skipped
+        self.total_skipped = 0
+        self.total_drawn = 0
+
+    #--------------------------------------------------------------------------
+
+    def should_draw(self, event):
+        """
+        Returns whether the view needs to draw and present the DrawRequestEvent
+        event.
+        """
+        if event.static and self.presented_static and not self.input_pending:
+            self.skipped_frames += 1
+            self.total_skipped += 1
+            return False
+
+        self.presented_static = event.static
+        self.input_pending = False
+        self.skipped_frames = 0
+        self.total_drawn += 1
+        return True
+
+    def is_idle(self):
+        return self.skipped_frames >= self.idle_after
+
+    def wake(self):
+        self.input_pending = True
+        self.skipped_frames = 0
+
+    #--------------------------------------------------------------------------
+
+    def notify(self, event):
+        if isinstance(event, KeyboardEvent) or \
+            isinstance(event, MouseButtonEvent) or \
+            isinstance(event, MouseMotionEvent) or \
+            isinstance(event, QuitEvent) or \
+            isinstance(event, StateChangeEvent):
+            self.wake()
@@ -9,6 +9,7 @@
 
 from events import *  # @UnusedWildImport
 from weakref import WeakKeyDictionary  # @Reimport
+from timeit import default_timer
 
 ##############################################################################
 # EVENTS
@@ -19,6 +20,13 @@ class TickEvent(Event):
     Generated by the CPU Spinner when a game loop occurs
     """
     pass
+
+class InputPollEvent(Event):
+    """
+    Generated by the CPU Spinner in latency mode just before a TickEvent, so
+    that input is read as late as possible before the simulation runs.
+    """
+    pass
    
 class QuitEvent(Event):
     """
@@ -32,14 +40,16 @@ class KeyboardEvent(Event):
     key.
     """   
    
-    def __init__(self, _type, key):
+    def __init__(self, _type, key, time=None):
         """
         _type - pygame.KEYUP or pygame.KEYDOWN
         key - which key e.g. pygame.K_ESCAPE
+        time - default_timer() when the key was read from the pygame queue
         """ 
       
         self.type = _type
         self.key = key
+        self.time = default_timer() if time is None else time
       
 class MouseButtonEvent(Event):
     """
@@ -79,14 +89,60 @@ class DrawRequestEvent(Event):
     Generated by the model when it wants to be drawn.
     """
    
-    def __init__(self, visible_objects):
+    def __init__(self, visible_objects, static=False):
         """
         visible_objects - Game objects that are to be drawn on screen.
                           They will be drawn in the order they appear in this
                           list.
+        static - True if nothing in the scene has changed since the last
+                 request unless input arrived
         """
    
         self.visible_objects = visible_objects
+        self.static = static
+        self.time = default_timer()
+
+class FramePresentedEvent(Event):
+    """
+    Generated by the view after it has presented a frame.
+    """
+    
+    def __init__(self, request_time, present_time):
+        """
+        request_time - time of the DrawRequestEvent that was presented
+        present_time - default_timer() just after the display was flipped
+        """
+        
+        self.request_time = request_time
+        self.present_time = present_time
+
+class IdleEvent(Event):
+    """
+    Generated by the CPU Spinner once the work for a frame is done, before it
+    sleeps until the next frame.
+    """
+    
+    def __init__(self, budget):
+        """
+        budget - seconds left in the current frame (negative if the frame
+                 overran)
+        """
+        
+        self.budget = budget
+
+class StateChangeEvent(Event):
+    """
+    Generated by the model when it switches to a new state.
+    """
+    
+    def __init__(self, old_state, new_state):
+        """
+        old_state - state being left (None on the first change)
+        new_state - state being entered
+        """
+        
+        self.old_state = old_state
+        self.new_state = new_state
 
 ##############################################################################
 # LISTENER
@@ -0,0 +1,224 @@
+##############################################################################
+# threadedloop.py
+##############################################################################
+# Runs the simulation on a worker thread and presentation on the main thread.
+# The worker ticks the CPU Spinner as usual, but the view draws each frame
+# into a RecordingSurface: a list of fill and blit commands that is then
+# published to a SnapshotBuffer.  The main thread pumps SDL events into an
+# EventQueue for the worker, replays the latest snapshot onto the window and
+# flips, so a slow flip never holds up physics.
+##############################################################################
+
+import sys
+import threading
+import traceback
+import weakref
+from collections import deque
+import pygame
+
+FILL = 0
+BLIT = 1
+
+##############################################################################
+# SNAPSHOTS
+##############################################################################
+
+class RecordingSurface:
+    """
+    Stands in for the screen while a frame is drawn, recording what was
+    drawn instead of drawing it.
+    """
+
+    def __init__(self, size, frozen):
+        """
+        frozen - dict shared by the recorders of one buffer, mapping surfaces
+                 with a per-surface alpha to (alpha, copy)
+        """
+        self.size = size
+        self.frozen = frozen
+        self.commands = []
+        self.request_time = None
+
+    def clear(self):
+        del self.commands[:]
+
+    #--------------------------------------------------------------------------
+
+    def fill(self, color, rect=None):
+        self.commands.append((FILL, color, rect, 0))
+
+    def blit(self, source, dest, area=None, special_flags=0):
+        alpha = source.get_alpha()
+        if alpha is not None and not source.get_flags() & pygame.SRCALPHA:
+            # faded surfaces change from frame to frame; draw a copy taken
+            # when the alpha last changed
+            frozen = self.frozen.get(source)
+            if frozen is None or frozen[0] != alpha:
+                frozen = (alpha, source.copy())
+                self.frozen[source] = frozen
+            source = frozen[1]
+        self.commands.append((BLIT, source, dest, area, special_flags))
+
+    def replay(self, target):
+        for command in self.commands:
+            if command[0] == FILL:
+                target.fill(command[1], command[2])
+            else:
+                target.blit(command[1], command[2], command[3], command[4])
+
+    #--------------------------------------------------------------------------
+
+    def get_size(self):
+        return self.size
+
+    def get_width(self):
+        return self.size[0]
+
+    def get_height(self):
+        return self.size[1]
+
+    def get_rect(self, **kwargs):
+        rect = pygame.Rect((0, 0), self.size)
+        for attr, value in kwargs.items():
+            setattr(rect, attr, value)
+        return rect
+
+class SnapshotBuffer:
+    """
+    Double or triple buffer of RecordingSurfaces.  The writer draws into
+    back() and publishes it; the reader acquires the latest published frame
+    and releases it once presented.  With three slots the writer never
+    waits; with two it waits for the reader to release the previous frame.
+    """
+
+    def __init__(self, size, slots=3):
+        if slots not in (2, 3):
+            raise ValueError('A snapshot buffer has 2 or 3 slots, not %s' %
+                             (slots,))
+        frozen = weakref.WeakKeyDictionary()
+        # back (written), front (read) and, with three slots, ready
+        self.slots = [RecordingSurface(size, frozen) for i in range(slots)] # @UnusedVariable
+        self.condition = threading.Condition()
+        self.fresh = False # ready (or front, with two slots) is unread
+        self.reading = False
+
+        # counters
+        self.published = 0
+        self.presented = 0
+        self.dropped = 0 # published frames replaced before being read
+
+    #--------------------------------------------------------------------------
+
+    def back(self):
+        return self.slots[0]
+
+    def publish(self):
+        self.condition.acquire()
+        try:
+            if len(self.slots) == 2:
+                while self.reading:
+                    self.condition.wait()
+                self.slots[0], self.slots[1] = self.slots[1], self.slots[0]
+            else:
+                self.slots[0], self.slots[2] = self.slots[2], self.slots[0]
+            if self.fresh:
+                self.dropped += 1
+            self.fresh = True
+            self.published += 1
+            self.condition.notify_all()
+        finally:
+            self.condition.release()
+
+    def acquire(self, timeout=None):
+        """
+        Returns the latest published frame, waiting up to timeout seconds for
+        one, or None if none was published since the last acquire.
+        """
+        self.condition.acquire()
+        try:
+            if not self.fresh:
+                self.condition.wait(timeout)
+            if not self.fresh:
+                return None
+            if len(self.slots) == 3:
+                self.slots[1], self.slots[2] = self.slots[2], self.slots[1]
+            self.fresh = False
+            self.reading = True
+            self.presented += 1
+            return self.slots[1]
+        finally:
+            self.condition.release()
+
+    def release(self):
+        self.condition.acquire()
+        try:
+            self.reading = False
+            self.condition.notify_all()
+        finally:
+            self.condition.release()
+
+##############################################################################
+# INPUT
+##############################################################################
+
+class EventQueue:
+    """
+    pygame events pumped on the main thread, read on the worker.  Offers the
+    get() and peek() of pygame.event that the engine uses.
+    """
+
+    def __init__(self):
+        self.events = deque()
+
+    def pump(self):
+        self.events.extend(pygame.event.get())
+
+    def get(self):
+        events = []
+        while self.events:
+            events.append(self.events.popleft())
+        return events
+
+    def peek(self):
+        return len(self.events) > 0
+
+##############################################################################
+# LOOP
+##############################################################################
+
+class ThreadedLoop:
+
+    def __init__(self, cpu_spinner, view, event_queue, poll_time=0.005):
+        """
+        view - PygameView created with snapshot slots
+        poll_time - longest the main thread waits for a frame before pumping
+                    events again
+        """
+        self.cpu_spinner = cpu_spinner
+        self.view = view
+        self.event_queue = event_queue
+        self.poll_time = poll_time
+        self.error = None
+
+    #--------------------------------------------------------------------------
+
+    def run(self):
+        worker = threading.Thread(target=self.simulate)
+        worker.daemon = True
+        worker.start()
+        try:
+            while worker.is_alive():
+                self.event_queue.pump()
+                self.view.present_latest(self.poll_time)
+        finally:
+            self.cpu_spinner.running = False
+            worker.join()
+        if self.error is not None:
+            raise self.error
+
+    def simulate(self):
+        try:
+            self.cpu_spinner.run()
+        except Exception:
+            traceback.print_exc()
+            self.error = sys.exc_info()[1]
@@ -0,0 +1,199 @@
+##############################################################################
+# tracer.py
+##############################################################################
+# Opt-in tracer of event dispatch.  While it is on, EventManager.post()
+# records every post and every listener's notify within it: begin and end
+# times, the event type, the manager or listener class, nesting depth and
+# thread, into arrays allocated when tracing first starts.  Stopping writes
+# them as Chrome trace JSON, for chrome://tracing or ui.perfetto.dev.  F9
+# starts and stops tracing, or set FLAPPY_TRACE to a file name to trace
+# from launch until exit.
+##############################################################################
+
+import json
+import os
+import threading
+import time
+from array import array
+from itertools import count
+from timeit import default_timer
+
+import pygame
+
+from systemevents import *  # @UnusedWildImport
+
+try:
+    from threading import get_ident
+except ImportError:
+    from thread import get_ident
+
+TRACE_ENV = 'FLAPPY_TRACE'
+TRACE_KEY = pygame.K_F9
+CAPACITY = 1 << 18 # spans recorded before the rest are dropped
+
+POST = 0
+NOTIFY = 1
+
+class EventTracer(SystemEventListener):
+
+    def __init__(self, path=None, capacity=CAPACITY, key=TRACE_KEY):
+        """
+        path - file each trace is written to; by default one named after the
+               time tracing started, or FLAPPY_TRACE's if set, which also
+               starts tracing now
+        capacity - spans held per trace
+        key - key that starts and stops tracing, or None
+        """
+        SystemEventListener.__init__(self)
+        self.capacity = capacity
+        self.key = key
+        self.path = path or os.environ.get(TRACE_ENV)
+
+        self.buffers = None # allocated by the first start()
+        self.ids = {} # class or thread ident -> number in the trace
+        self.names = [] # name by number
+        self.depth = threading.local()
+        self.slots = count()
+        self.origin = 0.
+        self.started_at = None
+        self.spans = 0 # recorded by the last trace
+        self.dropped = 0
+
+        if os.environ.get(TRACE_ENV):
+            self.start()
+
+    def tracing(self):
+        return EventManager.tracer is self
+
+    #--------------------------------------------------------------------------
+
+    def start(self):
+        if self.buffers is None:
+            capacity = self.capacity
+            self.buffers = (array('d', [0.]) * capacity, # begin
+                            array('d', [0.]) * capacity, # end
+                            array('b', [0]) * capacity, # POST or NOTIFY
+                            array('i', [0]) * capacity, # manager or listener
+                            array('i', [0]) * capacity, # event type
+                            array('H', [0]) * capacity, # depth
+                            array('i', [0]) * capacity) # thread
+        self.slots = count()
+        self.dropped = 0
+        self.origin = default_timer()
+        self.started_at = time.localtime()
+        EventManager.tracer = self
+
+    def stop(self):
+        """
+        Stops tracing and writes the trace, if tracing.
+        """
+        if not self.tracing():
+            return
+        EventManager.tracer = None
+        self.spans = min(next(self.slots), self.capacity)
+        self.save(self.path or time.strftime('dispatch-%Y%m%d-%H%M%S.json',
+                                             self.started_at))
+
+    def get_id(self, key, name):
+        number = self.ids.get(key)
+        if number is None:
+            number = self.ids[key] = len(self.names)
+            self.names.append(name)
+        return number
+
+    #--------------------------------------------------------------------------
+
+    def post(self, manager, event):
+        """
+        EventManager.post() with every notify timed.
+        """
+        timer = default_timer
+        depth = getattr(self.depth, 'depth', 0)
+        event_type = event.__class__ # events are old-style classes
+        event_id = self.ids.get(event_type)
+        if event_id is None:
+            event_id = self.get_id(event_type, event_type.__name__)
+        thread = get_ident()
+        thread_id = self.ids.get(thread)
+        if thread_id is None:
+            thread_id = self.get_id(thread, threading.current_thread().name)
+
+        begin = timer()
+        try:
+            self.depth.depth = depth + 2 # posts from a notify nest under it
+            listeners = manager.listeners
+            for listener in listeners.keys():
+                # skip listeners unregistered by an earlier notify of this event
+                if listener in listeners:
+                    notify_begin = timer()
+                    try:
+                        listener.notify(event)
+                    finally:
+                        self.record(NOTIFY, notify_begin, timer(), listener.__class__,
+                                    event_id, depth + 1, thread_id)
+        finally:
+            self.depth.depth = depth
+            self.record(POST, begin, timer(), manager, event_id, depth, thread_id)
+
+    def record(self, kind, begin, end, source, event_id, depth, thread_id):
+        slot = next(self.slots) # atomic, so threads never share a slot
+        if slot >= self.capacity:
+            self.dropped += 1
+            return
+        source_id = self.ids.get(source)
+        if source_id is None:
+            source_id = self.get_id(source, source.__name__)
+        begins, ends, kinds, sources, events, depths, threads = self.buffers
+        begins[slot] = begin
+        ends[slot] = end
+        kinds[slot] = kind
+        sources[slot] = source_id
+        events[slot] = event_id
+        depths[slot] = depth
+        threads[slot] = thread_id
+
+    #--------------------------------------------------------------------------
+
+    def save(self, path):
+        """
+        Writes the last trace to path as Chrome trace JSON: a complete event
+        per span, named after the event type for posts and the listener
+        class for notifies.
+        """
+        begins, ends, kinds, sources, events, depths, threads = self.buffers
+        names = [json.dumps(name) for name in self.names]
+        pid = os.getpid()
+        with open(path, 'w') as trace:
+            trace.write('{"displayTimeUnit": "ms", "otherData": {"dropped_spans": %d}, '
+                        '"traceEvents": [\n' % (self.dropped,))
+            separator = ''
+            for thread_id in sorted(set(threads[:self.spans])):
+                trace.write('%s{"name": "thread_name", "ph": "M", "pid": %d, "tid": %d, '
+                            '"args": {"name": %s}}' % (separator, pid, thread_id,
+                                                       names[thread_id]))
+                separator = ',\n'
+            origin = self.origin
+            for n in range(self.spans):
+                if kinds[n] == POST:
+                    name, category = names[events[n]], 'post'
+                else:
+                    name, category = names[sources[n]], 'notify'
+                trace.write('%s{"name": %s, "cat": "%s", "ph": "X", "ts": %.3f, "dur": %.3f, '
+                            '"pid": %d, "tid": %d, "args": {"event": %s, "source": %s, '
+                            '"depth": %d}}' % (
+                                separator, name, category, (begins[n] - origin) * 1e6,
+                                (ends[n] - begins[n]) * 1e6, pid, threads[n],
+                                names[events[n]], names[sources[n]], depths[n]))
+                separator = ',\n'
+            trace.write('\n]}\n')
+
+    #--------------------------------------------------------------------------
+
+    def notify(self, event):
+
+        if isinstance(event, KeyboardEvent) and event.type == pygame.KEYDOWN and \
+            event.key == self.key:
+            if self.tracing():
+                self.stop()
+            else:
+                self.start()
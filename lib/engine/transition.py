@@ -0,0 +1,149 @@
+##############################################################################
+# transition.py
+##############################################################################
+# Builds the next state while the current one is still fading out, so that
+# switching to it at the fade peak is just a call to Model.change_state.
+# A builder that is a generator is run a step at a time in the idle time at
+# the end of frames, never starting a step the frame has no time left for.
+##############################################################################
+
+import threading
+from timeit import default_timer
+from types import GeneratorType
+
+from events import DeferredRegistration
+from systemevents import *  # @UnusedWildImport
+from model import Model
+
+class TransitionManager(SystemEventListener):
+
+    # shared instance handed out by get()
+    instance = None
+
+    @classmethod
+    def get(cls):
+        if cls.instance is None:
+            cls.instance = cls()
+        return cls.instance
+
+    #--------------------------------------------------------------------------
+
+    def __init__(self, threaded=False):
+        """
+        threaded - build the next state on a worker thread instead of in the
+                   idle time at the end of a frame
+        """
+        SystemEventListener.__init__(self)
+
+        self.threaded = threaded
+
+        self.builder = None
+        self.steps = None # the build under way, a step per next()
+        self.step_estimate = 0. # longest step of it so far
+        self.defer = False
+        self.next_state = None
+        self.thread = None
+
+        # frame timing while a transition is in progress
+        self.active = False
+        self.last_tick = None
+        self.worst_frame_time = 0. # worst over every transition so far
+        self.last_worst_frame_time = 0. # worst during the latest transition
+        self.build_time = 0. # seconds the latest build took
+
+    #--------------------------------------------------------------------------
+
+    def prepare(self, builder, defer=False):
+        """
+        Starts building the next state.
+        builder - callable returning the state to switch to, or a generator
+                  yielding None after each step of building it and then the
+                  state
+        defer - build only at the swap, for a state whose building changes
+                what is still on screen
+        """
+        self.builder = builder
+        self.steps = None
+        self.step_estimate = 0.
+        self.defer = defer
+        self.next_state = None
+        self.build_time = 0.
+        self.active = True
+        self.last_tick = None
+        self.last_worst_frame_time = 0.
+
+        if self.threaded and not defer:
+            self.thread = threading.Thread(target=self.build)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def run_builder(self):
+        result = self.builder()
+        if isinstance(result, GeneratorType):
+            for result in result: # the last one yielded is the state
+                yield result
+        else:
+            yield result
+
+    def step(self):
+        """
+        Runs the next step of the build.
+        """
+        start = default_timer()
+        with DeferredRegistration():
+            if self.steps is None:
+                self.steps = self.run_builder()
+            state = next(self.steps)
+        elapsed = default_timer() - start
+        self.build_time += elapsed
+        self.step_estimate = max(self.step_estimate, elapsed)
+        if state is not None:
+            self.steps = None
+            self.next_state = state
+
+    def build(self):
+        """
+        Runs the rest of the build.
+        """
+        while self.next_state is None:
+            self.step()
+
+    def swap(self):
+        """
+        Switches the model to the prepared state, building it first if it is
+        not ready yet.
+        """
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.next_state is None:
+            self.build()
+
+        state = self.next_state
+        self.builder, self.next_state = None, None
+        Model.change_state(state)
+
+        # keep timing until the next tick so the swap frame is counted
+        self.active = False
+
+    #--------------------------------------------------------------------------
+
+    def notify(self, event):
+
+        if isinstance(event, TickEvent) and self.last_tick is not None:
+            now = default_timer()
+            frame_time = now - self.last_tick
+            self.last_worst_frame_time = max(self.last_worst_frame_time, frame_time)
+            self.worst_frame_time = max(self.worst_frame_time, frame_time)
+            self.last_tick = now if self.active else None
+        elif isinstance(event, TickEvent) and self.active:
+            self.last_tick = default_timer()
+
+        if isinstance(event, IdleEvent):
+            if self.active and not self.threaded and not self.defer and \
+                self.builder is not None:
+                # a step is started only if the longest so far still fits
+                start = default_timer()
+                while self.next_state is None and \
+                    default_timer() - start + self.step_estimate < event.budget:
+                    self.step()
@@ -0,0 +1,115 @@
+##############################################################################
+# environment.py
+##############################################################################
+# Reinforcement learning style wrapper around the headless Simulation:
+# reset(seed) starts a game, step(action) plays frameskip ticks of it.  No
+# display is opened.  To keep per-step cost down, the observation list and
+# info dict returned are reused, and overwritten by the next call.
+##############################################################################
+
+from simulation import *  # @UnusedWildImport
+
+NOOP = 0
+FLAP = 1
+
+class FlappyEnv:
+
+    # layout of the observation vector
+    HEIGHT = 0 # player height
+    VELOCITY = 1 # player vertical velocity, negative is up
+    DISTANCE = 2 # from the player to the left of the next obstacle
+    GAP_TOP = 3 # height of the top of the next obstacle's gap
+    GAP_BOTTOM = 4 # height of the bottom of the next obstacle's gap
+    OBSERVATION_SIZE = 5
+
+    def __init__(self, frameskip=1, repeat_action=False, pass_reward=1.,
+                 tick_reward=0., crash_reward=-1., max_ticks=None,
+                 screensize=REFERENCE_SIZE, sprite_scale=2, deterministic=False):
+        """
+        frameskip - ticks played per step
+        repeat_action - flap on every tick of a step instead of only the first
+        pass_reward, tick_reward, crash_reward - reward for each obstacle
+                                                 passed, each tick survived
+                                                 and crashing
+        max_ticks - ticks after which a game ends without crashing, if given
+        deterministic - see Simulation
+        """
+        self.frameskip = frameskip
+        self.repeat_action = repeat_action
+        self.pass_reward = pass_reward
+        self.tick_reward = tick_reward
+        self.crash_reward = crash_reward
+        self.max_ticks = max_ticks
+
+        self.simulation = Simulation(screensize, sprite_scale,
+                                     deterministic=deterministic)
+        self.observation = [0.] * self.OBSERVATION_SIZE
+        self.info = {'score': 0, 'ticks': 0, 'truncated': False}
+
+    #--------------------------------------------------------------------------
+
+    def reset(self, seed=None, course=None):
+        """
+        Starts a game on course, or on a new Course of seed, and returns the
+        first observation.  The game starts with a flap, as with
+        the space bar press that starts it in play.
+        """
+        self.simulation.reset(seed, course)
+        self.simulation.flap()
+        self.info['score'] = 0
+        self.info['ticks'] = 0
+        self.info['truncated'] = False
+        self.observe()
+        return self.observation
+
+    def step(self, action):
+        """
+        Plays frameskip ticks, flapping if action is FLAP.  Returns
+        (observation, reward, done, info); info holds the score, the ticks
+        played and whether the game was cut short by max_ticks.
+        """
+        simulation = self.simulation
+        if simulation.done or self.info['truncated']:
+            return self.observation, 0., True, self.info
+
+        score = simulation.score
+        flap = action == FLAP
+        start = simulation.ticks
+        if self.repeat_action:
+            for i in range(self.frameskip): # @UnusedVariable
+                if simulation.tick(flap):
+                    break
+        else:
+            simulation.advance(self.frameskip, flap)
+        ticks = simulation.ticks - start # survived
+        if simulation.done:
+            ticks -= 1
+
+        reward = (simulation.score - score) * self.pass_reward + \
+            ticks * self.tick_reward
+        done = simulation.done
+        if done:
+            reward += self.crash_reward
+        elif self.max_ticks is not None and simulation.ticks >= self.max_ticks:
+            done = self.info['truncated'] = True
+
+        self.info['score'] = simulation.score
+        self.info['ticks'] = simulation.ticks
+        self.observe()
+        return self.observation, reward, done, self.info
+
+    #--------------------------------------------------------------------------
+
+    def observe(self):
+        simulation = self.simulation
+        observation = self.observation
+        observation[0] = simulation.height
+        observation[1] = simulation.y_velocity
+        i = simulation.next_obstacle()
+        if i is None:
+            observation[2] = observation[3] = observation[4] = 0.
+            return
+        row_height = simulation.row_height
+        observation[2] = simulation.obstacle_x[i] - simulation.player_x
+        observation[3] = simulation.number_above[i] * row_height
+        observation[4] = (simulation.number_above[i] + GAP_ROWS) * row_height
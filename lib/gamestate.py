@@ -7,15 +7,19 @@
 ##############################################################################
  
 import pygame  # @UnusedImport
-import random, math
+import math
+from timeit import default_timer
 from weakref import WeakKeyDictionary  # @UnusedImport
 from graphics.spritesheet import *  # @UnusedWildImport
+from graphics.assets import Assets, blit
 from engine.model import *  # @UnusedWildImport
 from engine.events import *  # @UnusedWildImport
 from engine.systemevents import *  # @UnusedWildImport
+from engine.transition import TransitionManager
+from simulation import *  # @UnusedWildImport
  
 from gui import *  # @UnusedWildImport
- 
+
 ##############################################################################
 # GAME EVENTS
 ##############################################################################
@@ -38,8 +42,8 @@ class GameOverEvent(Event):
     """
     Generated when pipe hits an obstacle or the ground.
     """
-    def __init__(self):
-        pass
+    def __init__(self, score=None):
+        self.score = score
 
 class NewGameEvent(Event):
     """
@@ -71,7 +75,7 @@ class Sprite(GameObject, GameEventListener):
         self.surf = image
     
     def render(self, screen):
-        screen.blit(self.surf, self.pos)
+        blit(screen, self.surf, self.pos)
     
     def update(self):
         pass
@@ -101,6 +105,16 @@ class AnimatedSprite(GameObject, GameEventListener):
     def game_over(self):
         self.can_move = False
     
+    def attach(self):
+        GameObject.attach(self)
+        for sprite in self.surf_list:
+            sprite.attach()
+    
+    def detach(self):
+        GameObject.detach(self)
+        for sprite in self.surf_list:
+            sprite.detach()
+    
     def get_surf(self):
         return self.surf_list[self.index].surf
     
@@ -110,7 +124,7 @@ class AnimatedSprite(GameObject, GameEventListener):
             self.index = 0
     
     def render(self, screen):
-        screen.blit(self.get_surf(), self.pos)
+        blit(screen, self.get_surf(), self.pos)
         self.update()
     
     def update(self):
@@ -144,64 +158,85 @@ class Obstacle(GameObject, GameEventListener):
         self.number_above = number_above
         self.gap_height = gap_height
         self.total_height = total_height
-        self.obstacle_list = []
         self.obstacle_height = image_list[0].get_height()
         
-        # create list of AnimatedSprites (None indicates no obstacle)
-        for obstacle in xrange(self.number_above):
-            self.obstacle_list.append(AnimatedSprite((x_pos,obstacle*self.obstacle_height),
-                                                     image_list,rate,x_velocity))
-        for obstacle in xrange(self.gap_height):
-            self.obstacle_list.append(None)
-        for obstacle in xrange(self.total_height - self.number_above - self.gap_height):
-            self.obstacle_list.append(AnimatedSprite((x_pos,(obstacle+self.number_above+self.gap_height)*self.obstacle_height),
-                                                     image_list,rate,x_velocity))
+        # one AnimatedSprite per row, reused whenever the gap moves
+        self.sprite_pool = []
+        for row in xrange(self.total_height):
+            self.sprite_pool.append(AnimatedSprite((x_pos,row*self.obstacle_height),
+                                                   image_list,rate,x_velocity))
+        
+        # list of AnimatedSprites (None indicates no obstacle)
+        self.obstacle_list = [None] * self.total_height
+        self.visible_list = []
+        self.arrange()
+    
+    def arrange(self):
+        # fill obstacle_list from the pool, leaving the gap rows empty
+        del self.visible_list[:]
+        gap_bottom = self.number_above + self.gap_height
+        for row in xrange(self.total_height):
+            if self.number_above <= row < gap_bottom:
+                self.obstacle_list[row] = None
+            else:
+                self.obstacle_list[row] = self.sprite_pool[row]
+                self.visible_list.append(self.sprite_pool[row])
     
     def game_over(self):
         for obstacle in self.obstacle_list:
             if obstacle is not None:
                 obstacle.game_over()
     
+    def attach(self):
+        GameObject.attach(self)
+        for obstacle in self.sprite_pool:
+            obstacle.attach()
+    
+    def detach(self):
+        GameObject.detach(self)
+        for obstacle in self.sprite_pool:
+            obstacle.detach()
+    
     def update_obstacle(self, number_above, gap_height, tick):
         # get new orientation
         self.number_above = number_above
         self.gap_height = gap_height
         x_pos = self.get_x_pos()
-        x_velocity = self.get_obstacle_list_wo_none()[0].get_x_velocity()
-        self.obstacle_list = []
-        for obstacle in xrange(self.number_above):
-            self.obstacle_list.append(AnimatedSprite((x_pos,obstacle*self.obstacle_height),
-                                                     self.image_list,self.rate,x_velocity))
-        for obstacle in xrange(self.gap_height):
-            self.obstacle_list.append(None)
-        for obstacle in xrange(self.total_height - self.number_above - self.gap_height):
-            self.obstacle_list.append(AnimatedSprite((x_pos,(obstacle+self.number_above+self.gap_height)*self.obstacle_height),
-                                                     self.image_list,self.rate,x_velocity))
-        
-        # synchronize tick
-        for obstacle in self.obstacle_list:
-            if obstacle is not None:
-                obstacle.tick = tick
+        self.arrange()
+        
+        # restart the animation and synchronize tick
+        for obstacle in self.sprite_pool:
+            obstacle.index = 0
+            obstacle.tick = tick
+            obstacle.update_x_pos(x_pos)
+    
+    def reset(self, x_pos, number_above, gap_height):
+        """
+        Puts the obstacle back to how the constructor left it.
+        """
+        for obstacle in self.sprite_pool:
+            obstacle.can_move = True
+        self.update_obstacle(number_above, gap_height, 0)
+        self.update_x_pos(x_pos)
     
     def get_tick(self):
-        return self.get_obstacle_list_wo_none()[0].tick
+        return self.visible_list[0].tick
     
     def get_x_pos(self):
-        return self.get_obstacle_list_wo_none()[0].pos[0]
+        return self.visible_list[0].pos[0]
     
     def update_x_pos(self, x_pos):
-        for obstacle in self.obstacle_list:
-            if obstacle is not None:
-                obstacle.update_x_pos(x_pos)
+        for obstacle in self.sprite_pool:
+            obstacle.update_x_pos(x_pos)
     
     def get_obstacle_height(self):
         return self.obstacle_height
     
     def get_width(self):
-        return self.get_obstacle_list_wo_none()[0].get_surf().get_width()
+        return self.visible_list[0].get_surf().get_width()
     
     def get_obstacle_list_wo_none(self):
-        return [i for i in self.obstacle_list if i is not None]
+        return self.visible_list
     
     def get_collision_rects(self):
         collision_rects = []
@@ -231,8 +266,128 @@ class Obstacle(GameObject, GameEventListener):
     def notify(self, event):
         pass
 
+class ObstacleRing:
+    """
+    The obstacle columns, kept in left-to-right order as a ring: only the
+    leftmost column can leave the screen, and it comes back behind the
+    rightmost, so the order never changes and queries start from the left
+    without searching.  The ring places the columns itself, from the ticks
+    scrolled (see get_obstacle_x()).
+    """
+    
+    def __init__(self, obstacles, spacing, x_velocity):
+        """
+        obstacles - list of Obstacles
+        spacing - px between the left edges of neighbouring columns
+        x_velocity - px the columns scroll per tick
+        """
+        self.obstacles = obstacles
+        self.spacing = spacing
+        self.x_velocity = x_velocity
+        self.first = 0 # index in obstacles of the leftmost column
+        self.index = 0 # course index of the leftmost column
+        self.passed = len(obstacles) # columns from the leftmost the player has passed
+        self.scrolled = self.placed = 0
+    
+    def __len__(self):
+        return len(self.obstacles)
+    
+    def __getitem__(self, i):
+        """
+        Returns the i-th column from the left.
+        """
+        return self.obstacles[(self.first + i) % len(self.obstacles)]
+    
+    def reset(self, x_pos, get_gap, gap_height):
+        # every column parked at x_pos, counting as passed
+        self.first = 0
+        self.index = 0
+        self.passed = len(self.obstacles)
+        self.scrolled = self.placed = 0
+        for obstacle in self.obstacles:
+            obstacle.reset(x_pos, get_gap(), gap_height)
+    
+    def get_column_x(self, index):
+        return get_obstacle_x(index, self.scrolled, self.placed, self.spacing,
+                              self.x_velocity)
+    
+    def place(self, scrolled):
+        """
+        Lines the columns up for play starting after scrolled ticks, none of
+        them passed.
+        """
+        self.placed = scrolled
+        self.scroll(scrolled)
+        self.passed = 0
+    
+    def scroll(self, scrolled):
+        """
+        Puts every column where it is after scrolled ticks.
+        """
+        self.scrolled = scrolled
+        for i in xrange(len(self.obstacles)):
+            self[i].update_x_pos(self.get_column_x(self.index + i))
+    
+    def recycle(self, get_gap, gap_height):
+        """
+        Moves columns that went offscreen behind the rightmost one.
+        """
+        leftmost = self[0]
+        while leftmost.get_x_pos() <= -leftmost.get_width():
+            rightmost = self[-1]
+            leftmost.update_obstacle(get_gap(), gap_height, rightmost.get_tick())
+            leftmost.update_x_pos(self.get_column_x(self.index + len(self.obstacles)))
+            self.first = (self.first + 1) % len(self.obstacles)
+            self.index += 1
+            self.passed = max(self.passed - 1, 0)
+            leftmost = self[0]
+    
+    def next_to_pass(self):
+        """
+        Returns the leftmost column not yet passed, or None.
+        """
+        if self.passed < len(self.obstacles):
+            return self[self.passed]
+        return None
+    
+    def pass_next(self):
+        self.passed += 1
+    
+    def passed_flags(self):
+        """
+        Returns whether each of obstacles has been passed, in list order.
+        """
+        count = len(self.obstacles)
+        return [(i - self.first) % count < self.passed for i in xrange(count)]
+    
+    def ahead(self, x):
+        """
+        Returns the leftmost column whose right edge is right of x, or None.
+        Only columns left of x are skipped, so the cost does not grow with
+        the number of columns.
+        """
+        for i in xrange(len(self.obstacles)):
+            obstacle = self[i]
+            if obstacle.get_x_pos() + obstacle.get_width() > x:
+                return obstacle
+        return None
+    
+    def overlapping(self, left, right):
+        """
+        Returns the columns overlapping x from left to right.
+        """
+        columns = []
+        for i in xrange(len(self.obstacles)):
+            obstacle = self[i]
+            x_pos = obstacle.get_x_pos()
+            if x_pos >= right:
+                break
+            if x_pos + obstacle.get_width() > left:
+                columns.append(obstacle)
+        return columns
+
 class PipePlayer(Sprite):
-    def __init__(self, x_pos, image, starting_height, x_velocity, gravity=0.77, max_rise_speed=-9.4, max_fall_speed=18.8, contraction=-20):
+    def __init__(self, x_pos, image, starting_height, x_velocity, gravity=0.77, max_rise_speed=-9.4, max_fall_speed=18.8, contraction=-20, deterministic=False):
         Sprite.__init__(self, (x_pos, starting_height), image)
         self.height = starting_height
         self.gravity = gravity
@@ -244,12 +399,40 @@ class PipePlayer(Sprite):
         self.x_pos = x_pos
         self.x_velocity = x_velocity
         self.y_velocity = 0
+        
+        # the arc of the last flap, pushed down lift px by the ceiling
+        self.arc = FlapArc(gravity, max_rise_speed, max_fall_speed)
+        # angles from a table in deterministic mode (see simulation.DETERMINISM)
+        self.angles = None
+        if deterministic:
+            self.angles = AngleTable(self.arc, x_velocity, self.surf.get_width(),
+                                     self.surf.get_height())
         self.prev_angle = self.get_ideal_angle()
         self.current_angle = self.get_ideal_angle()
+        self.flap_height = self.height
+        self.flap_angle = self.current_angle
+        self.flap_ticks = 0
+        self.lift = 0
         
         self.game_started = False
     
+    def reset(self, starting_height):
+        """
+        Puts the player back to how the constructor left it.
+        """
+        self.height = starting_height
+        self.y_velocity = 0
+        self.prev_angle = self.get_ideal_angle()
+        self.current_angle = self.get_ideal_angle()
+        self.flap_height = self.height
+        self.flap_angle = self.current_angle
+        self.flap_ticks = 0
+        self.lift = 0
+        self.game_started = False
+    
     def get_ideal_angle(self):
+        if self.angles is not None:
+            return self.angles.ideal[self.y_velocity]
         dampening_factor = 0.2
         return -math.degrees(math.atan(self.y_velocity / float(self.x_velocity))) * dampening_factor
     
@@ -257,27 +440,35 @@ class PipePlayer(Sprite):
         ARB_DIM = 600
         ceiling_rect = Rect(-1,-ARB_DIM,ARB_DIM,ARB_DIM)
         while ceiling_rect.colliderect(self.get_collision_rect(False)): # prevent pipe from going above ceiling
-            self.height += 1
+            self.lift += 1
+            self.height = self.get_height()
         return (self.x_pos, self.height)
     
+    def get_height(self):
+        return (self.flap_height + self.arc.drop(self.flap_ticks)) + self.lift
+    
     def get_surf(self):
         # figure out angle
         max_change_angle = 5
         self.current_angle = self.get_ideal_angle()
-        if self.prev_angle < self.current_angle: # if angle is increasing, pipe is rising
-            # limit on how fast the pipe's angle can rise
-            self.current_angle = min(self.prev_angle + max_change_angle, self.current_angle)
+        # limit on how fast the pipe's angle can rise since the flap
+        self.current_angle = min(self.flap_angle + max_change_angle * (self.flap_ticks + 1),
+                                 self.current_angle)
         self.prev_angle = self.current_angle
         
         return pygame.transform.rotate(self.surf.copy(), self.current_angle)
     
     def get_collision_rect(self, apply_contraction = True):
-        height = self.surf.get_height()
-        width = self.surf.get_width()
-        angle = abs(math.radians(self.current_angle))
-        collision_rect = Rect(self.x_pos, self.height,
-                              height * math.sin(angle) + width * math.cos(angle),
-                              width * math.sin(angle) + height * math.cos(angle))
+        if self.angles is not None:
+            width, height = self.angles.get_size(self.current_angle)
+            collision_rect = Rect(self.x_pos, self.height, width, height)
+        else:
+            height = self.surf.get_height()
+            width = self.surf.get_width()
+            angle = abs(math.radians(self.current_angle))
+            collision_rect = Rect(self.x_pos, self.height,
+                                  height * math.sin(angle) + width * math.cos(angle),
+                                  width * math.sin(angle) + height * math.cos(angle))
         if apply_contraction:
             return collision_rect.inflate(self.contraction,self.contraction)
         else:
@@ -290,14 +481,17 @@ class PipePlayer(Sprite):
     
     def update(self):
         if self.game_started:
-            self.y_velocity += self.gravity
-            if self.y_velocity >= self.max_fall_speed:
-                self.y_velocity = self.max_fall_speed
-            self.height += self.y_velocity
+            self.flap_ticks += 1
+            self.y_velocity = self.arc.velocity(self.flap_ticks)
+            self.height = self.get_height()
     
     def notify(self, event):
         if isinstance(event, SpaceBarEvent):
             self.y_velocity = self.max_rise_speed
+            self.flap_height = self.height
+            self.flap_angle = self.current_angle
+            self.flap_ticks = 0
+            self.lift = 0
             self.game_started = True
             
 ##############################################################################
@@ -312,49 +506,48 @@ class IntroState(State, SystemEventListener, GUIEventListener):
         self.speed = 2*math.pi/90 # radians per frame
         self.amplitude = screensize[1]/50
         self.screensize = screensize
+        self.unit = get_unit(screensize)
         
         # scrolling animation variables
         self.x_displacement = 0.
-        self.x_velocity = 3.575
+        self.x_velocity = SCROLL_SPEED * self.unit
         
-        # construct a list of sprites
-        self.spritesheet = Spritesheet(sys.path[0] + SS_NAME)
-        self.img_dict = {}
-        colorkey = False
-        for name in RECT_DICT.keys():
-            self.img_dict[name] = pygame.transform.scale2x(self.spritesheet.image_at(RECT_DICT[name], colorkey)) # smooth-scaled 2x
+        # derive every sprite once; the unscaled sheet is not needed after
+        if not Assets.is_loaded():
+            Assets.load()
+            Assets.preload()
         
         # background
-        self.background1 = Image(self.img_dict['background'].get_rect(), self.img_dict['background'])
+        self.background1 = Image(Assets.sprite('background').get_rect(), Assets.sprite('background'))
         self.background1.rect.topleft = (0,0)
         self.game_objects.append(self.background1)
-        self.background2 = Image(self.img_dict['background'].get_rect(), pygame.transform.flip(self.img_dict['background'],True,False))
+        self.background2 = Image(Assets.sprite('background').get_rect(), Assets.sprite('background', ('flip',True,False)))
         self.background2.rect.bottomright = screensize
         self.game_objects.append(self.background2)
         
         # terrain (terrain is 308 wide; screen is 576 wide)
-        self.terrain1 = Image(self.img_dict['terrain'].get_rect(), self.img_dict['terrain'])
+        self.terrain1 = Image(Assets.sprite('terrain').get_rect(), Assets.sprite('terrain'))
         self.terrain1.rect.bottomleft = (0,screensize[1])
         self.game_objects.append(self.terrain1)
-        self.terrain2 = Image(self.img_dict['terrain'].get_rect(), self.img_dict['terrain'])
+        self.terrain2 = Image(Assets.sprite('terrain').get_rect(), Assets.sprite('terrain'))
         self.terrain2.rect.bottomleft = self.terrain1.rect.bottomright
         self.game_objects.append(self.terrain2)
-        self.terrain3 = Image(self.img_dict['terrain'].get_rect(), self.img_dict['terrain'])
+        self.terrain3 = Image(Assets.sprite('terrain').get_rect(), Assets.sprite('terrain'))
         self.terrain3.rect.bottomleft = self.terrain2.rect.bottomright
         self.game_objects.append(self.terrain3)
         
         # logos
-        self.logo = Image(self.img_dict['logo'].get_rect(), self.img_dict['logo'])
+        self.logo = Image(Assets.sprite('logo').get_rect(), Assets.sprite('logo'))
         self.logo.rect.left = screensize[0]/5
         self.logo.rect.centery = screensize[1]/4 # centered
         self.game_objects.append(self.logo)
-        self.pipe = Image(self.img_dict['player'].get_rect(), self.img_dict['player'])
+        self.pipe = Image(Assets.sprite('player').get_rect(), Assets.sprite('player'))
         self.pipe.rect.right = 4*screensize[0]/5
         self.pipe.rect.centery = screensize[1]/4 # centered
         self.game_objects.append(self.pipe)
         
         # buttons
-        self.button = Button(self.img_dict['start'].get_rect(), self.img_dict['start'])
+        self.button = Button(Assets.sprite('start').get_rect(), Assets.sprite('start'))
         self.button.rect.centerx = screensize[0]/2
         self.button.rect.centery = 3*screensize[1]/4
         self.game_objects.append(self.button)
@@ -382,82 +575,160 @@ class IntroState(State, SystemEventListener, GUIEventListener):
             self.fade.set_alpha(0)
             self.fade.set_speed(5)
             self.fade.set_end_event(255, FadeIntoGameEvent)
+            TransitionManager.get().prepare(lambda: build_game_state(self.fade, self.screensize))
         if isinstance(event, FadeIntoGameEvent):
             self.fade.delete_end_event()
-            Model.change_state(GameState(self.fade, self.img_dict, self.screensize))
+            TransitionManager.get().swap()
 
 class GameState(State, SystemEventListener, GUIEventListener): # main game state
-    def __init__(self, fade_screen, img_dict, screensize):
+    def __init__(self, fade_screen, screensize, seed=None, deterministic=False, build=True):
+        """
+        build - construct every game object now; otherwise the caller runs
+                each of build_steps() in order before the state is used
+        """
         State.__init__(self, SystemEventListener, GUIEventListener)
         
         self.fade = fade_screen
-        self.img_dict = img_dict
         self.game_started = False
+        self.deterministic = deterministic
+        
+        # obstacle gaps, drawn in order from a course seeded per game
+        self.course = Course(seed)
+        self.gap_index = 0
         
         # scrolling animation variables
         self.x_displacement = 0.
-        self.x_velocity = 3.575 # TODO: make self.x_velocity an integer OBJECT to allow for variable speed
+        self.scrolled = 0 # ticks the scenery has moved
+        self.unit = get_unit(screensize)
+        self.x_velocity = SCROLL_SPEED * self.unit # TODO: make self.x_velocity an integer OBJECT to allow for variable speed
         self.screensize = screensize
         
         # obstacle settings
-        self.distance_between_pipes = 320.4
-        self.total_height = 17
-        self.gap_height = 7
+        self.distance_between_pipes = PIPE_SPACING * self.unit
+        self.obstacle_start = OBSTACLE_START * self.unit # parked offscreen until play starts
+        self.total_height = OBSTACLE_ROWS
+        self.gap_height = GAP_ROWS
+        
+        if build:
+            for step in self.build_steps():
+                step()
+    
+    def build_steps(self):
+        """
+        Returns the rest of construction as callables to run in order, each
+        well under a millisecond, so it can be spread over idle frame time.
+        """
+        steps = [self.build_scenery]
+        steps.extend([self.add_obstacle] * get_obstacle_count(self.screensize))
+        steps.extend([self.build_player, self.build_overlay])
+        return steps
+    
+    def build_scenery(self):
+        screensize = self.screensize
         
         # background
-        self.background1 = Image(self.img_dict['background'].get_rect(), self.img_dict['background'])
+        self.background1 = Image(Assets.sprite('background').get_rect(), Assets.sprite('background'))
         self.background1.rect.topleft = (0,0)
         self.game_objects.append(self.background1)
-        self.background2 = Image(self.img_dict['background'].get_rect(), pygame.transform.flip(self.img_dict['background'],True,False))
+        self.background2 = Image(Assets.sprite('background').get_rect(), Assets.sprite('background', ('flip',True,False)))
         self.background2.rect.bottomright = screensize
         self.game_objects.append(self.background2)
         
         # terrain (terrain is 308 wide; screen is 576 wide)
-        self.terrain1 = Image(self.img_dict['terrain'].get_rect(), self.img_dict['terrain'])
+        self.terrain1 = Image(Assets.sprite('terrain').get_rect(), Assets.sprite('terrain'))
         self.terrain1.rect.bottomleft = (0,screensize[1])
         self.game_objects.append(self.terrain1)
-        self.terrain2 = Image(self.img_dict['terrain'].get_rect(), self.img_dict['terrain'])
+        self.terrain2 = Image(Assets.sprite('terrain').get_rect(), Assets.sprite('terrain'))
         self.terrain2.rect.bottomleft = self.terrain1.rect.bottomright
         self.game_objects.append(self.terrain2)
-        self.terrain3 = Image(self.img_dict['terrain'].get_rect(), self.img_dict['terrain'])
+        self.terrain3 = Image(Assets.sprite('terrain').get_rect(), Assets.sprite('terrain'))
         self.terrain3.rect.bottomleft = self.terrain2.rect.bottomright
         self.game_objects.append(self.terrain3)
         
-        # obstacles
-        self.obstacle1 = Obstacle(-100, (img_dict['fb1'], img_dict['fb2'], img_dict['fb3'], img_dict['fb2']),
-                                  5, self.get_gap(self.total_height,self.gap_height),
-                                  self.gap_height, self.total_height, self.x_velocity)
-        self.game_objects.append(self.obstacle1)
-        self.obstacle2 = Obstacle(-100, (img_dict['fb1'], img_dict['fb2'], img_dict['fb3'], img_dict['fb2']),
-                                  5, self.get_gap(self.total_height,self.gap_height),
-                                  self.gap_height, self.total_height, self.x_velocity)
-        self.game_objects.append(self.obstacle2)
-        self.obstacle1_passed, self.obstacle2_passed = True, True
+        self.obstacle_list = []
+    
+    def add_obstacle(self):
+        # enough columns are added that a recycled one comes back at the
+        # right edge of the screen; the ring moves them, not their sprites
+        self.obstacle_list.append(Obstacle(self.obstacle_start, Assets.frames(('fb1','fb2','fb3','fb2')),
+                                           5, self.get_gap(),
+                                           self.gap_height, self.total_height, 0))
+        self.game_objects.append(self.obstacle_list[-1])
+    
+    def build_player(self):
+        screensize = self.screensize
+        self.obstacles = ObstacleRing(self.obstacle_list, self.distance_between_pipes, self.x_velocity)
+        del self.obstacle_list
         
         # player
         self.score = 0
-        self.player = PipePlayer(screensize[0]/4, img_dict['player'],
-                                 (screensize[1] - self.img_dict['terrain'].get_height())/2,
-                                 self.x_velocity)
+        self.player = PipePlayer(screensize[0]/4, Assets.surface('player'),
+                                 (screensize[1] - Assets.sprite('terrain').get_height())/2,
+                                 self.x_velocity, GRAVITY * self.unit, MAX_RISE_SPEED * self.unit,
+                                 MAX_FALL_SPEED * self.unit, int(CONTRACTION * self.unit),
+                                 self.deterministic)
         self.game_objects.append(self.player)
         
         # instructions
-        self.instructions = Sprite((screensize[0]/2,(screensize[1] - self.img_dict['terrain'].get_height())/2),
-                                   img_dict['instructions'])
+        self.instructions = Sprite((screensize[0]/2,(screensize[1] - Assets.sprite('terrain').get_height())/2),
+                                   Assets.sprite('instructions'))
         self.game_objects.append(self.instructions)
         
         # score tag
-        fontsize = 40
-        self.score_tag = Text(str(self.score), (255, 255, 255), fontsize, 'flappybird.ttf', False)
+        fontsize = int(40 * self.unit)
+        self.score_tag = Text(str(self.score), (255, 255, 255), fontsize, 'flappybird.TTF', False)
         self.score_tag.rect.centerx = screensize[0]/2
         self.score_tag.rect.centery = screensize[1]/10
         self.game_objects.append(self.score_tag)
-        
+    
+    def build_overlay(self):
         # construct fadescreen (should be last)
-        self.fade = FadeScreen(-5,255,screensize)
+        self.fade = FadeScreen(-5,255,self.screensize)
         self.game_objects.append(self.fade)
         
         self.terrain_collision_rect = Rect(self.terrain1.rect.unionall([self.terrain2.rect, self.terrain3.rect])) # terrain collision rect
+        
+        # everything reset() has to restore
+        self.initial_objects = tuple(self.game_objects)
+        self.reset_time = 0. # seconds taken by the last reset()
+    
+    def reset(self, seed=None):
+        """
+        Puts the state back to how the constructor left it, on a new course,
+        reusing every game object instead of rebuilding them.
+        """
+        start = default_timer()
+        self.game_started = False
+        self.x_displacement = 0.
+        self.scrolled = 0
+        self.course = Course(seed)
+        self.gap_index = 0
+        
+        # terrain
+        self.terrain1.rect.bottomleft = (0,self.screensize[1])
+        self.terrain2.rect.bottomleft = self.terrain1.rect.bottomright
+        self.terrain3.rect.bottomleft = self.terrain2.rect.bottomright
+        
+        # obstacles
+        self.obstacles.reset(self.obstacle_start, self.get_gap, self.gap_height)
+        
+        # player
+        self.score = 0
+        self.player.reset((self.screensize[1] - Assets.sprite('terrain').get_height())/2)
+        
+        # score tag
+        self.score_tag.update(str(self.score))
+        self.score_tag.rect.centerx = self.screensize[0]/2
+        self.score_tag.rect.centery = self.screensize[1]/10
+        
+        # fadescreen
+        self.fade.set_color((0,0,0))
+        self.fade.set_alpha(255)
+        self.fade.set_speed(-5)
+        self.fade.delete_end_event()
+        
+        self.game_objects[:] = self.initial_objects
+        self.reset_time = default_timer() - start
     
     def notify(self, event):   
         if isinstance(event, TickEvent):
@@ -469,33 +740,29 @@ class GameState(State, SystemEventListener, GUIEventListener): # main game state
             
             # update obstacle positions and orientations
             if self.game_started:
-                if self.obstacle1.get_x_pos() <= -self.obstacle1.get_width():
-                    self.obstacle1.update_obstacle(self.get_gap(self.total_height, self.gap_height), self.gap_height, self.obstacle2.get_tick())
-                    self.obstacle1.update_x_pos(self.obstacle2.get_x_pos() + self.distance_between_pipes)
-                    self.obstacle1_passed = False
-                if self.obstacle2.get_x_pos() <= -self.obstacle2.get_width():
-                    self.obstacle2.update_obstacle(self.get_gap(self.total_height, self.gap_height), self.gap_height, self.obstacle1.get_tick())
-                    self.obstacle2.update_x_pos(self.obstacle1.get_x_pos() + self.distance_between_pipes)
-                    self.obstacle2_passed = False
+                self.obstacles.recycle(self.get_gap, self.gap_height)
             
             # update score
-            if not self.obstacle1_passed:
-                if self.player.get_pos()[0] + self.player.get_width()/2 >= self.obstacle1.get_x_pos(): # center of player aligns with leftside of obstacle
-                    self.obstacle1_passed = True
-                    SystemEventManager.post(IncrementScoreEvent())
-            if not self.obstacle2_passed:
-                if self.player.get_pos()[0] + self.player.get_width()/2 >= self.obstacle2.get_x_pos():
-                    self.obstacle2_passed = True
+            obstacle = self.obstacles.next_to_pass()
+            if obstacle is not None:
+                if self.player.get_pos()[0] + self.player.get_width()/2 >= obstacle.get_x_pos(): # center of player aligns with leftside of obstacle
+                    self.obstacles.pass_next()
                     SystemEventManager.post(IncrementScoreEvent())
             
-            # collision check
-            collision_rects = list(self.obstacle1.get_collision_rects()) + list(self.obstacle2.get_collision_rects())
-            collision_rects.append(self.terrain_collision_rect)
-            if self.player.get_collision_rect().collidelistall(collision_rects) != []:
-                SystemEventManager.post(GameOverEvent())
+            # collision check, against the columns the player is over
+            player_rect = self.player.get_collision_rect()
+            collision_rects = [self.terrain_collision_rect]
+            for obstacle in self.obstacles.overlapping(player_rect.left, player_rect.right):
+                collision_rects.extend(obstacle.get_collision_rects())
+            crashed = player_rect.collidelistall(collision_rects) != []
+            if crashed:
+                SystemEventManager.post(GameOverEvent(self.score))
             
             SystemEventManager.post(DrawRequestEvent(self.game_objects))
-            self.x_displacement -= self.x_velocity
+            self.scrolled += 1
+            self.x_displacement = -self.scrolled * self.x_velocity
+            if self.game_started and not crashed: # drawn, now scroll
+                self.obstacles.scroll(self.scrolled)
         
         if isinstance(event, KeyboardEvent):
             if event.key == pygame.K_ESCAPE:
@@ -504,10 +771,9 @@ class GameState(State, SystemEventListener, GUIEventListener): # main game state
                 GameEventManager.post(SpaceBarEvent())
                 if not self.game_started: # remove instructions from screen if not already done
                     self.game_objects.remove(self.instructions)
+                    self.instructions.detach()
                     self.game_started = True
-                    self.obstacle1.update_x_pos(self.distance_between_pipes * 2 - self.x_displacement)
-                    self.obstacle2.update_x_pos(self.distance_between_pipes * 3 - self.x_displacement)
-                    self.obstacle1_passed, self.obstacle2_passed = False, False
+                    self.obstacles.place(self.scrolled)
         
         if isinstance(event, IncrementScoreEvent):
             self.score += 1
@@ -518,18 +784,37 @@ class GameState(State, SystemEventListener, GUIEventListener): # main game state
         if isinstance(event, GameOverEvent): # when game is over, switch to GameOverState
             Model.change_state(GameOverState((self.background1, self.background2),
                                              (self.terrain1, self.terrain2, self.terrain3),
-                                             (self.obstacle1, self.obstacle2), self.player, self.score_tag,
-                                             self.fade, self.img_dict, self.screensize, self.score))
+                                             self.obstacles.obstacles, self.player, self.score_tag,
+                                             self.fade, self.screensize, self.score, self))
+
+    def get_gap(self): # 17 birds tall, gaps are 7 birds tall
+        gap = self.course.gap(self.gap_index)
+        self.gap_index += 1
+        return gap
+    
+    def lookahead(self, count):
+        """
+        Returns the gaps of the next count obstacles to appear.
+        """
+        return self.course.gaps(self.gap_index, count)
 
-    def get_gap(self, total_height, gap_height): # 17 birds tall, gaps are 6 birds tall
-        return random.randint(0,total_height-gap_height)
+def build_game_state(fade_screen, screensize):
+    """
+    Builds a GameState a step at a time, for TransitionManager.prepare():
+    yields None after each step, then the state.
+    """
+    game = GameState(fade_screen, screensize, build=False)
+    for step in game.build_steps():
+        step()
+        yield None
+    yield game
 
 class GameOverState(State, SystemEventListener, GUIEventListener):
-    def __init__(self, background_list, terrain_list, obstacle_list, player, score_tag, fade_screen, img_dict, screensize, score):
+    def __init__(self, background_list, terrain_list, obstacle_list, player, score_tag, fade_screen, screensize, score, game_state=None):
         State.__init__(self, SystemEventListener, GUIEventListener)
+        self.game_state = game_state # finished GameState, reset() on restart
         self.player = player
         self.fade = fade_screen
-        self.img_dict = img_dict
         self.screensize = screensize
         self.score = score
         
@@ -547,19 +832,19 @@ class GameOverState(State, SystemEventListener, GUIEventListener):
         self.game_objects.append(self.score_tag)
         
         # gameover tag (will appear after player falls offscreen)
-        self.gameover_tag = Image(self.img_dict['gameover'].get_rect(), self.img_dict['gameover'])
+        self.gameover_tag = Image(Assets.sprite('gameover').get_rect(), Assets.sprite('gameover'))
         self.gameover_tag.rect.centerx = self.screensize[0]/2
         self.gameover_tag.rect.centery = -self.screensize[1]
         self.game_objects.append(self.gameover_tag)
         
         # score background tag (will appear after player falls offscreen)
-        self.score_bg = Image(self.img_dict['scorebg'].get_rect(), self.img_dict['scorebg'])
+        self.score_bg = Image(Assets.sprite('scorebg').get_rect(), Assets.sprite('scorebg'))
         self.score_bg.rect.centerx = self.screensize[0]/2
         self.score_bg.rect.centery = self.screensize[1]*3/2
         self.game_objects.append(self.score_bg)
         
         # scores
-        fontsize = 24
+        fontsize = int(24 * get_unit(screensize))
         self.final_score_tag = Text(str(self.score), (255,255,255), fontsize, 'flappybird.TTF', False)
         self.final_score_tag.rect.centery = self.screensize[1]*2
         self.game_objects.append(self.final_score_tag)
@@ -568,10 +853,11 @@ class GameOverState(State, SystemEventListener, GUIEventListener):
 #         self.game_objects.append(self.high_score_tag)
         
         # restart button
-        self.restart_button = Button(self.img_dict['ok'].get_rect(), self.img_dict['ok'])
+        self.restart_button = Button(Assets.sprite('ok').get_rect(), Assets.sprite('ok'))
         self.restart_button.rect.centerx = self.screensize[0]/2
         self.restart_button.rect.centery = self.screensize[1]*2
         self.game_objects.append(self.restart_button)
+        self.scoreboard_in_place = False # nothing moves once this is set
         
         # construct fadescreen (should be last)
         self.fade = FadeScreen(-15,255,screensize,(255,255,255))
@@ -579,7 +865,8 @@ class GameOverState(State, SystemEventListener, GUIEventListener):
     
     def notify(self, event):
         if isinstance(event, TickEvent):
-            SystemEventManager.post(DrawRequestEvent(self.game_objects))
+            static = self.scoreboard_in_place and self.fade.get_alpha() == 0
+            SystemEventManager.post(DrawRequestEvent(self.game_objects, static))
             try:
                 if self.player.get_pos()[1] > self.screensize[1]*2 and self.fade.get_alpha() == 0:
                     del self.player
@@ -593,6 +880,7 @@ class GameOverState(State, SystemEventListener, GUIEventListener):
                     self.final_score_tag.rect.right = 33*self.screensize[0]/50
                     self.final_score_tag.rect.centery = 9*self.screensize[1]/20
                     self.restart_button.rect.centery = 2*self.screensize[1]/3
+                    self.scoreboard_in_place = True
         
         if isinstance(event, KeyboardEvent): # DEBUG
             if event.key == pygame.K_r:
@@ -604,7 +892,17 @@ class GameOverState(State, SystemEventListener, GUIEventListener):
                 self.fade.set_alpha(0)
                 self.fade.set_speed(5)
                 self.fade.set_end_event(255, FadeIntoGameEvent)
+                if self.game_state is None:
+                    TransitionManager.get().prepare(lambda: build_game_state(self.fade, self.screensize))
+                else:
+                    # the objects to reset are still on screen, so the reset
+                    # waits for the peak
+                    TransitionManager.get().prepare(self.reset_game, defer=True)
         
         if isinstance(event, FadeIntoGameEvent):
             self.fade.delete_end_event()
-            Model.change_state(GameState(self.fade, self.img_dict, self.screensize))
\ No newline at end of file
+            TransitionManager.get().swap()
+    
+    def reset_game(self):
+        self.game_state.reset()
+        return self.game_state
\ No newline at end of file
@@ -0,0 +1,230 @@
+##############################################################################
+# ghosts.py
+##############################################################################
+# Ghost races: recorded games replayed as translucent players alongside the
+# one being played.  Only a ghost's player is drawn, so a ghost is its flap
+# inputs from the replay's start keyframe on, played with the FlapArc
+# closed forms (see simulation.MOTION) for all ghosts at once in numpy
+# arrays.  Every ghost is drawn with one blits() call from the per-degree
+# rotations of the player sprite that Assets memoizes.  Needs numpy.
+##############################################################################
+
+import glob
+import math
+import os
+
+import numpy
+
+from engine.model import GameObject
+from engine.systemevents import *  # @UnusedWildImport
+from gamestate import GameState
+from graphics.assets import Assets
+from replay import ReplayReader
+from simulation import ANGLE_DAMPENING, MAX_CHANGE_ANGLE
+
+GHOST_ALPHA = 80
+MAX_GHOSTS = 500
+
+##############################################################################
+# RUNS
+##############################################################################
+
+class GhostRuns:
+    """
+    The inputs and start states of replays, packed for a GhostLayer.  The
+    replay files are not kept open.
+    """
+
+    def __init__(self, readers):
+        """
+        readers - ReplayReaders of games on one screen size; those that never
+                  started are left out
+        """
+        inputs = []
+        starts = []
+        self.screensize = None
+        for reader in readers:
+            if self.screensize is None:
+                self.screensize = reader.screensize
+            elif reader.screensize != self.screensize:
+                raise ValueError('Ghost replays are of %s and %s screens' %
+                                 (self.screensize, reader.screensize))
+            started = numpy.flatnonzero(reader.keyframes['started'])
+            if len(started) == 0:
+                continue
+            record = reader.keyframes[started[0]]
+            inputs.append(numpy.array(reader.inputs[int(record['tick']):], bool))
+            starts.append((record['flap_height'], record['flap_angle'],
+                           record['flap_ticks'], record['lift']))
+
+        # ghost n's inputs are inputs[offsets[n]:offsets[n] + lengths[n]]
+        self.lengths = numpy.array([len(ghost) for ghost in inputs], numpy.int64)
+        self.offsets = numpy.zeros(len(inputs), numpy.int64)
+        self.offsets[1:] = numpy.cumsum(self.lengths)[:-1]
+        self.inputs = numpy.concatenate(inputs + [numpy.zeros(1, bool)])
+        starts = numpy.array(starts, numpy.float64).reshape(-1, 4)
+        self.flap_height = starts[:, 0]
+        self.flap_angle = starts[:, 1]
+        self.flap_ticks = starts[:, 2].astype(numpy.int64)
+        self.lift = starts[:, 3].astype(numpy.int64)
+
+    def __len__(self):
+        return len(self.lengths)
+
+def load_runs(directory, screensize, limit=MAX_GHOSTS):
+    """
+    Returns the GhostRuns of the limit longest replays in directory that
+    were played on a screen of screensize.
+    """
+    readers = []
+    for path in glob.glob(os.path.join(directory, '*.replay')):
+        try:
+            reader = ReplayReader(path)
+        except ValueError:
+            continue # unfinished or of another version
+        if reader.screensize == tuple(screensize):
+            readers.append(reader)
+    readers.sort(key=len, reverse=True)
+    return GhostRuns(readers[:limit])
+
+##############################################################################
+# LAYER
+##############################################################################
+
+class GhostLayer(GameObject):
+    """
+    Draws the ghosts of runs behind a game's player, setting off when the
+    player does and vanishing as each recording ends.
+    """
+
+    def __init__(self, runs, player, alpha=GHOST_ALPHA):
+        """
+        runs - GhostRuns to race
+        player - PipePlayer of the game, whose arc and position ghosts share
+        alpha - opacity of the ghosts, 0 to 255
+        """
+        self.runs = runs
+        self.player = player
+        self.arc = arc = player.arc
+
+        # ideal angle by ticks since a flap, up to full fall speed; the
+        # player tilts between the extremes
+        x_velocity = float(player.x_velocity)
+        self.ideal = numpy.array([-math.degrees(math.atan(arc.velocity(n) / x_velocity)) *
+                                  ANGLE_DAMPENING for n in range(arc.terminal + 1)])
+        # translucent per-pixel alpha blits several times faster than surface
+        # alpha over a colorkey
+        self.lowest = int(round(self.ideal.min()))
+        self.rotations = [Assets.sprite('player', ('rotate', angle), ('convert_alpha',),
+                                        ('alpha', alpha))
+                          for angle in range(self.lowest, int(round(self.ideal.max())) + 1)]
+
+        self.rewind()
+
+    #--------------------------------------------------------------------------
+
+    def rewind(self):
+        """
+        Puts every ghost back at its start.
+        """
+        runs = self.runs
+        self.tick = 0 # ticks raced
+        self.flap_height = runs.flap_height.copy()
+        self.flap_angle = runs.flap_angle.copy()
+        self.flap_ticks = runs.flap_ticks.copy()
+        self.lift = runs.lift.copy()
+        self.height = self.get_height()
+        # the angle after the last tick (see Simulation.get_angle())
+        ticks = self.flap_ticks
+        self.angle = numpy.where(ticks > 0,
+                                 numpy.minimum(self.flap_angle + MAX_CHANGE_ANGLE * ticks,
+                                               self.ideal[numpy.clip(ticks - 1, 0, self.arc.terminal)]),
+                                 self.flap_angle)
+
+    def racing(self):
+        """
+        Returns which ghosts are still racing.
+        """
+        return self.tick < self.runs.lengths
+
+    def get_height(self):
+        arc = self.arc
+        ticks = self.flap_ticks
+        drop = numpy.where(ticks < arc.terminal,
+                           ticks * arc.max_rise_speed + arc.gravity * (ticks * (ticks + 1) // 2),
+                           arc.terminal_drop + (ticks - arc.terminal + 1) * arc.max_fall_speed)
+        return (self.flap_height + drop) + self.lift
+
+    #--------------------------------------------------------------------------
+
+    def render(self, screen):
+        if not self.player.game_started:
+            if self.tick:
+                self.rewind()
+            return
+        racing = self.racing()
+        if not racing.any():
+            return
+
+        # the tick's flaps, then what PipePlayer does in a frame
+        runs = self.runs
+        flaps = racing & runs.inputs[runs.offsets + numpy.minimum(self.tick, runs.lengths - 1)]
+        self.flap_height[flaps] = self.height[flaps]
+        self.flap_angle[flaps] = self.angle[flaps]
+        self.flap_ticks[flaps] = 0
+        self.lift[flaps] = 0
+
+        self.angle = numpy.minimum(self.flap_angle + MAX_CHANGE_ANGLE * (self.flap_ticks + 1),
+                                   self.ideal[numpy.minimum(self.flap_ticks, self.arc.terminal)])
+        while True: # kept below the ceiling
+            clamped = racing & (numpy.trunc(self.height) < 0)
+            if not clamped.any():
+                break
+            self.lift[clamped] += 1
+            self.height = self.get_height()
+
+        rotations = self.rotations
+        x = self.player.x_pos
+        rotation = numpy.rint(self.angle[racing]).astype(numpy.int64) - self.lowest
+        y = numpy.trunc(self.height[racing]).astype(numpy.int64)
+        screen.blits([(rotations[i], (x, top)) for i, top in zip(rotation.tolist(), y.tolist())],
+                     False)
+
+        self.flap_ticks[racing] += 1
+        self.height = self.get_height()
+        self.tick += 1
+
+##############################################################################
+# RACE
+##############################################################################
+
+class GhostRace(SystemEventListener):
+    """
+    Puts a GhostLayer of the longest replays in a directory into every game
+    played, behind the player.
+    """
+
+    def __init__(self, directory, limit=MAX_GHOSTS, alpha=GHOST_ALPHA):
+        SystemEventListener.__init__(self)
+        self.directory = directory
+        self.limit = limit
+        self.alpha = alpha
+        self.runs = None # GhostRuns, loaded for the screen size of the games
+        self.screensize = None
+
+    def notify(self, event):
+        if isinstance(event, StateChangeEvent) and isinstance(event.new_state, GameState):
+            self.join(event.new_state)
+
+    def join(self, game):
+        objects = game.game_objects
+        for game_object in objects:
+            if isinstance(game_object, GhostLayer):
+                return # still there from before a reset
+        if self.screensize != game.screensize:
+            self.runs = load_runs(self.directory, game.screensize, self.limit)
+            self.screensize = game.screensize
+        if len(self.runs) == 0:
+            return
+        objects.insert(objects.index(game.player), GhostLayer(self.runs, game.player,
+                                                              self.alpha))
@@ -0,0 +1,280 @@
+# Registry of the named sprites on the sprite sheet.  Every surface derived
+# from a sprite (scaled, flipped, rotated...) is memoized under the chain of
+# transforms that produced it, so states ask the registry for what they need
+# instead of passing image dictionaries to each other.
+# A transform chain is a sequence of tuples, each an operation name followed
+# by its arguments:
+# ('scale2x',)  ('scale', (w, h))  ('flip', xbool, ybool)  ('rotate', angle)
+# ('colorkey', color)  ('alpha', alpha)  ('convert',)  ('convert_alpha',)
+# In atlas mode the whole sheet is put through the base chain once, and
+# sprites are handed out as AtlasRegions: areas of that one surface, drawn
+# with blit(atlas, dest, area).
+
+import os
+import pygame
+
+from spritesheet import Spritesheet, RECT_DICT
+
+SHEET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'spritesheet.png')
+
+def apply_transform(surf, transform):
+    """
+    Returns a new surface with a single transform applied to surf.
+    """
+    op, args = transform[0], transform[1:]
+    if op == 'scale2x':
+        return pygame.transform.scale2x(surf)
+    if op == 'scale':
+        return pygame.transform.scale(surf, args[0])
+    if op == 'flip':
+        return pygame.transform.flip(surf, args[0], args[1])
+    if op == 'rotate':
+        return pygame.transform.rotate(surf, args[0])
+    if op == 'colorkey':
+        surf = surf.copy()
+        surf.set_colorkey(args[0], pygame.RLEACCEL)
+        return surf
+    if op == 'alpha':
+        surf = surf.copy()
+        if surf.get_flags() & pygame.SRCALPHA:
+            # scale the per-pixel alpha, which surface alpha may not apply to
+            surf.fill((255, 255, 255, args[0]), None, pygame.BLEND_RGBA_MULT)
+        else:
+            surf.set_alpha(args[0])
+        return surf
+    if op == 'convert':
+        return surf.convert()
+    if op == 'convert_alpha':
+        return surf.convert_alpha()
+    raise ValueError('Unknown transform: %s' % (op,))
+
+def blit(screen, image, dest):
+    """
+    Draws image, a surface or an AtlasRegion, onto screen at dest.
+    """
+    if isinstance(image, AtlasRegion):
+        return screen.blit(image.atlas, dest, image.area)
+    return screen.blit(image, dest)
+
+class AtlasRegion(object):
+    """
+    Handle on a sprite within the atlas.  Answers the size queries of a
+    surface; draw it with blit().
+    """
+    __slots__ = ['atlas', 'area']
+
+    def __init__(self, atlas, area):
+        self.atlas = atlas
+        self.area = area
+
+    def get_rect(self, **kwargs):
+        rect = pygame.Rect((0, 0), self.area.size)
+        for attr, value in kwargs.items():
+            setattr(rect, attr, value)
+        return rect
+
+    def get_size(self):
+        return self.area.size
+
+    def get_width(self):
+        return self.area.width
+
+    def get_height(self):
+        return self.area.height
+
+class Assets:
+
+    filename = SHEET_PATH
+    rect_dict = RECT_DICT
+
+    # chain applied to every sprite handed out by sprite() and frames()
+    base_chain = (('scale2x',),) # smooth-scaled 2x
+
+    sheet = None # Spritesheet, dropped by release_sources()
+    sources = {} # name -> surface cut straight from the sheet
+    variants = {} # (name, chain) -> derived surface
+    frame_sets = {} # (names, chain) -> tuple of derived surfaces
+
+    # hand out AtlasRegions instead of separate surfaces
+    use_atlas = False
+    atlas = None # whole sheet through base_chain
+    atlas_scale = (1., 1.) # size of the atlas relative to the sheet
+    regions = {} # name -> AtlasRegion
+
+    #--------------------------------------------------------------------------
+
+    @classmethod
+    def load(cls, filename=None, rect_dict=None):
+        """
+        Opens the sprite sheet, forgetting anything derived from a previous
+        one.  Needs a display mode to have been set.
+        """
+        if filename is not None:
+            cls.filename = filename
+        if rect_dict is not None:
+            cls.rect_dict = rect_dict
+        cls.sheet = Spritesheet(cls.filename)
+        cls.sources = {}
+        cls.variants = {}
+        cls.frame_sets = {}
+        cls.atlas = None
+        cls.regions = {}
+
+    @classmethod
+    def is_loaded(cls):
+        return cls.sheet is not None or cls.variants != {} or \
+            cls.atlas is not None
+
+    @classmethod
+    def source(cls, name):
+        """
+        Returns the unscaled sprite called name, cutting it from the sheet
+        (reopened if it was released) the first time.
+        """
+        surf = cls.sources.get(name)
+        if surf is None:
+            if cls.sheet is None:
+                cls.sheet = Spritesheet(cls.filename)
+            surf = cls.sheet.image_at(cls.rect_dict[name], False)
+            cls.sources[name] = surf
+        return surf
+
+    @classmethod
+    def get_atlas(cls):
+        """
+        Returns the whole sheet put through base_chain and converted.
+        """
+        if cls.atlas is None:
+            if cls.sheet is None:
+                cls.sheet = Spritesheet(cls.filename)
+            atlas = cls.sheet.sheet
+            for transform in cls.base_chain:
+                if transform[0] not in ('scale2x', 'scale', 'convert',
+                                        'convert_alpha'):
+                    raise ValueError('Cannot build an atlas through: %s' %
+                                     (transform[0],))
+                atlas = apply_transform(atlas, transform)
+            cls.atlas_scale = (atlas.get_width() / float(cls.sheet.sheet.get_width()),
+                               atlas.get_height() / float(cls.sheet.sheet.get_height()))
+            cls.atlas = atlas.convert()
+        return cls.atlas
+
+    @classmethod
+    def region(cls, name):
+        """
+        Returns the AtlasRegion of the sprite called name.
+        """
+        region = cls.regions.get(name)
+        if region is None:
+            atlas = cls.get_atlas()
+            scale_x, scale_y = cls.atlas_scale
+            rect = pygame.Rect(cls.rect_dict[name])
+            area = pygame.Rect(int(rect.x * scale_x), int(rect.y * scale_y),
+                               int(rect.width * scale_x),
+                               int(rect.height * scale_y))
+            region = AtlasRegion(atlas, area)
+            cls.regions[name] = region
+        return region
+
+    #--------------------------------------------------------------------------
+
+    @classmethod
+    def get(cls, name, *chain):
+        """
+        Returns the sprite called name with each transform in chain applied
+        in order.  Results, including those for every prefix of the chain,
+        are memoized.
+        """
+        key = (name, chain)
+        surf = cls.variants.get(key)
+        if surf is None:
+            if cls.use_atlas and chain == cls.base_chain:
+                # shares the atlas pixels
+                surf = cls.get_atlas().subsurface(cls.region(name).area)
+                cls.variants[key] = surf
+            elif chain:
+                surf = apply_transform(cls.get(name, *chain[:-1]), chain[-1])
+                cls.variants[key] = surf
+            else:
+                surf = cls.source(name)
+        return surf
+
+    @classmethod
+    def sprite(cls, name, *chain):
+        """
+        Returns the sprite called name as the game draws it: base_chain
+        followed by chain.  In atlas mode, and with no chain, this is an
+        AtlasRegion.
+        """
+        if cls.use_atlas and not chain:
+            return cls.region(name)
+        return cls.get(name, *(cls.base_chain + chain))
+
+    @classmethod
+    def surface(cls, name, *chain):
+        """
+        As sprite(), but always a surface, for callers that transform or
+        copy it.
+        """
+        return cls.get(name, *(cls.base_chain + chain))
+
+    @classmethod
+    def frames(cls, names, *chain):
+        """
+        Returns a memoized tuple of sprite(name, *chain) for each name.
+        """
+        key = (tuple(names), chain)
+        frames = cls.frame_sets.get(key)
+        if frames is None:
+            frames = tuple([cls.sprite(name, *chain) for name in names])
+            cls.frame_sets[key] = frames
+        return frames
+
+    #--------------------------------------------------------------------------
+
+    @classmethod
+    def preload(cls):
+        """
+        Derives every sprite through base_chain, then drops the sources.
+        """
+        if cls.use_atlas:
+            cls.get_atlas()
+        for name in cls.rect_dict.keys():
+            cls.sprite(name)
+        cls.release_sources()
+
+    @classmethod
+    def release_sources(cls):
+        """
+        Drops the sheet and any cut sprite that already has a derived variant.
+        Both are recreated on demand if a new variant is asked for later.
+        """
+        cls.sheet = None
+        derived = set([name for name, chain in cls.variants.keys()])
+        for name in list(cls.sources.keys()):
+            if name in derived:
+                del cls.sources[name]
+
+    @classmethod
+    def memory_usage(cls):
+        """
+        Returns a dict mapping each sprite name to the bytes of pixel data
+        held for it, sources and variants included.  The sheet, if still
+        held, is reported under None.
+        """
+        usage = {}
+        for name, surf in cls.sources.items():
+            usage[name] = usage.get(name, 0) + surface_bytes(surf)
+        for (name, chain), surf in cls.variants.items(): # @UnusedVariable
+            usage[name] = usage.get(name, 0) + surface_bytes(surf)
+        if cls.sheet is not None:
+            usage[None] = surface_bytes(cls.sheet.sheet)
+        if cls.atlas is not None:
+            usage['atlas'] = surface_bytes(cls.atlas)
+        return usage
+
+def surface_bytes(surf):
+    if surf.get_parent() is not None: # subsurface; pixels counted on parent
+        return 0
+    return surf.get_pitch() * surf.get_height()
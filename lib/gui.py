@@ -11,6 +11,7 @@ import pygame
 from engine.events import *  # @UnusedWildImport
 from engine.systemevents import *  # @UnusedWildImport
 from engine.model import GameObject
+from graphics.assets import blit
 from weakref import WeakKeyDictionary  # @Reimport
 
 ##############################################################################
@@ -90,7 +91,7 @@ class Image(GameObject):
         self.surf = surf
       
     def render(self, screen):
-        screen.blit(self.surf, self.rect)
+        blit(screen, self.surf, self.rect)
 
 ##############################################################################
 # COMPONENTS - BUTTON
@@ -159,32 +160,42 @@ class Text(Image):
     Allows a string to be displayed on screen.
     """
     
+    # fonts loaded so far, keyed by (font, fontsize, is_sys_font)
+    fonts = {}
+    
     def __init__(self, text, color, fontsize, font='courier', is_sys_font=False):
         """
         text - the text to be displayed
         colour - the colour the text should be drawn
         """
+        self.text = text
         self.color = color
         self.fontsize = fontsize
         self.font = font
         self.is_sys_font = is_sys_font
-        if self.is_sys_font:
-            text_surf = pygame.font.SysFont(font, fontsize, True).\
-                                            render(text, True, color)
-        else:
-            text_surf = pygame.font.Font(font, fontsize).render(text, True, color)
+        text_surf = self.get_font().render(text, True, color)
                             
         text_rect = pygame.Rect((0, 0), (text_surf.get_width(),
                                 text_surf.get_height()))
                                        
         Image.__init__(self, text_rect, text_surf)
     
+    def get_font(self):
+        key = (self.font, self.fontsize, self.is_sys_font)
+        font = Text.fonts.get(key)
+        if font is None:
+            if self.is_sys_font:
+                font = pygame.font.SysFont(self.font, self.fontsize, True)
+            else:
+                font = pygame.font.Font(self.font, self.fontsize)
+            Text.fonts[key] = font
+        return font
+    
     def update(self, text):
-        if self.is_sys_font:
-            self.surf = pygame.font.SysFont(self.font, self.fontsize, True).\
-                                            render(text, True, self.color)
-        else:
-            self.surf = pygame.font.Font(self.font, self.fontsize).render(text, True, self.color)
+        if text == self.text:
+            return
+        self.text = text
+        self.surf = self.get_font().render(text, True, self.color)
         self.rect = pygame.Rect((0, 0), (self.surf.get_width(),
                                 self.surf.get_height()))
 
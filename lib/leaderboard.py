@@ -0,0 +1,129 @@
+##############################################################################
+# leaderboard.py
+##############################################################################
+# Uploads final scores to a local leaderboard service from the AsyncSpinner's
+# event loop, so a slow or missing service never holds up a frame.  Also a
+# stand-in for that service, speaking the same line protocol:
+#     SCORE <name> <score>   answered with   RANK <rank>
+#     TOP <count>            answered with   <name> <score> lines, then END
+# Needs Python 3.7 or later.
+##############################################################################
+
+import asyncio
+
+from engine.asyncspinner import AsyncSpinner
+from engine.systemevents import *  # @UnusedWildImport
+from gamestate import GameOverEvent
+
+HOST = '127.0.0.1'
+PORT = 47474
+
+##############################################################################
+# STAND-IN SERVER
+##############################################################################
+
+class LeaderboardServer:
+
+    def __init__(self, host=HOST, port=PORT):
+        """
+        port - port to listen on, or 0 for any free one (see self.port once
+               started)
+        """
+        self.host = host
+        self.port = port
+        self.server = None
+        self.scores = [] # (score, name), best first
+
+    #--------------------------------------------------------------------------
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host,
+                                                 self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+    def add_score(self, name, score):
+        """
+        Records the score and returns its rank, counting from 1.
+        """
+        rank = 1 + len([best for best, other in self.scores if best >= score]) # @UnusedVariable
+        self.scores.insert(rank - 1, (score, name))
+        return rank
+
+    #--------------------------------------------------------------------------
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                writer.write(self.reply(line.decode('ascii', 'replace').split()))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def reply(self, request):
+        try:
+            if request[0] == 'SCORE' and len(request) == 3:
+                return ('RANK %d\n' % self.add_score(request[1],
+                                                     int(request[2]))).encode()
+            if request[0] == 'TOP' and len(request) == 2:
+                lines = ['%s %d\n' % (name, score)
+                         for score, name in self.scores[:int(request[1])]]
+                return (''.join(lines) + 'END\n').encode()
+        except (IndexError, ValueError):
+            pass
+        return b'ERROR\n'
+
+##############################################################################
+# UPLOADER
+##############################################################################
+
+class ScoreUploader(SystemEventListener):
+    """
+    Schedules an upload of the score carried by each GameOverEvent.
+    """
+
+    def __init__(self, name='player', host=HOST, port=PORT, timeout=2.):
+        """
+        name - name the scores are uploaded under; no whitespace
+        timeout - seconds to wait for the service before giving up
+        """
+        SystemEventListener.__init__(self)
+
+        self.name = name
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+        self.last_rank = None
+        self.uploads = 0
+        self.failures = 0
+
+    #--------------------------------------------------------------------------
+
+    async def upload(self, score):
+        writer = None
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), self.timeout)
+            writer.write(('SCORE %s %d\n' % (self.name, score)).encode())
+            reply = await asyncio.wait_for(reader.readline(), self.timeout)
+            self.last_rank = int(reply.split()[1])
+            self.uploads += 1
+        except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+            self.failures += 1
+        finally:
+            if writer is not None:
+                writer.close()
+
+    def notify(self, event):
+        if isinstance(event, GameOverEvent) and event.score is not None:
+            AsyncSpinner.schedule(self.upload(event.score))
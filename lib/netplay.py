@@ -0,0 +1,542 @@
+##############################################################################
+# netplay.py
+##############################################################################
+# Multiplayer over UDP.  A headless MatchServer runs any number of matches,
+# each a group of players racing on one shared Course, every player a
+# Simulation that only the server steps.  Clients send nothing but their
+# flaps, each stamped with the tick it falls on, and play ahead of the
+# server on a Simulation of their own; the snapshots the server sends back
+# correct that prediction, with the flaps the server has not played yet
+# replayed on top.  A snapshot holds every player of the match, each field
+# sent only if it changed since the last snapshot the client acknowledged.
+# Datagrams, little-endian, first byte the message type:
+#     JOIN       client -> server   join a match with room
+#     WELCOME    server -> client   match, player number and course seed
+#     INPUT      client -> server   last snapshot received, unacknowledged flaps
+#     SNAPSHOT   server -> client   tick, baseline, last flap received, players
+#     LEAVE      client -> server
+##############################################################################
+
+import random
+import select
+import socket
+import struct
+from timeit import default_timer
+
+from simulation import Course, Simulation
+
+PORT = 47475
+TICK_RATE = 60
+SNAPSHOT_INTERVAL = 2 # ticks between snapshots
+HISTORY = 64 # ticks of snapshots kept as delta baselines
+MAX_PLAYERS = 8 # per match
+INPUT_LEAD = 4 # ticks clients play ahead of the server
+TIMEOUT = 5. # seconds a player can be silent before being dropped
+JOIN_RETRY = 30 # ticks between JOINs until welcomed
+MAX_FLAPS = 32 # flaps resent per INPUT
+MAX_DATAGRAM = 2048
+NO_TICK = 0xFFFFFFFF
+
+JOIN, WELCOME, INPUT, SNAPSHOT, LEAVE = range(1, 6)
+
+KIND = struct.Struct('<B')
+JOIN_MESSAGE = struct.Struct('<B')
+WELCOME_MESSAGE = struct.Struct('<BIHQB') # match, player, seed, snapshot interval
+INPUT_MESSAGE = struct.Struct('<BIHIB') # match, player, snapshot acked, flaps
+FLAP = struct.Struct('<I') # tick, after INPUT for each flap
+SNAPSHOT_MESSAGE = struct.Struct('<BIIIB') # tick, baseline, last flap, players
+PLAYER = struct.Struct('<HH') # player, fields sent; the fields follow
+LEAVE_MESSAGE = struct.Struct('<BIH') # match, player
+
+# Simulation.get_state() less the course seed, which is the match's
+FIELDS = [struct.Struct(code) for code in
+          ('<I', '<?', '<?', '<I', '<I', '<I', '<d', '<d', '<I', '<I', '<B', '<I')]
+SEED_FIELD = 11
+FULL_MASK = (1 << len(FIELDS)) - 1
+
+def strip_seed(state):
+    return state[:SEED_FIELD] + state[SEED_FIELD + 1:]
+
+def add_seed(state, seed):
+    return state[:SEED_FIELD] + (seed,) + state[SEED_FIELD:]
+
+def encode_state(state, baseline=None):
+    """
+    Returns (mask, bytes) of the fields of state that differ from baseline,
+    or of all of them without one.
+    """
+    mask = 0
+    parts = []
+    for i, field in enumerate(FIELDS):
+        if baseline is None or state[i] != baseline[i]:
+            mask |= 1 << i
+            parts.append(field.pack(state[i]))
+    return mask, b''.join(parts)
+
+def decode_state(data, offset, mask, baseline=None):
+    """
+    Returns (state, offset after it) of fields encoded at offset over
+    baseline.
+    """
+    if baseline is None and mask != FULL_MASK:
+        raise ValueError('Delta without a baseline')
+    values = list(baseline or FIELDS)
+    for i, field in enumerate(FIELDS):
+        if mask & (1 << i):
+            values[i] = field.unpack_from(data, offset)[0]
+            offset += field.size
+    return tuple(values), offset
+
+def pack_tick(tick):
+    return NO_TICK if tick < 0 else tick
+
+def unpack_tick(tick):
+    return -1 if tick == NO_TICK else tick
+
+class Endpoint:
+    """
+    A non-blocking UDP socket that counts what goes through it.
+    """
+
+    def __init__(self, address=None):
+        """
+        address - (host, port) to bind to, if any
+        """
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if address is not None:
+            self.socket.bind(address)
+        self.socket.setblocking(False)
+        self.loss = 0. # share of datagrams dropped instead of sent, for testing
+        self.random = random.Random()
+
+        # counters
+        self.bytes_in = self.bytes_out = 0
+        self.packets_in = self.packets_out = 0
+        self.start_time = default_timer()
+
+    def send(self, data, address):
+        self.packets_out += 1
+        self.bytes_out += len(data)
+        if self.loss and self.random.random() < self.loss:
+            return
+        try:
+            self.socket.sendto(data, address)
+        except socket.error:
+            pass # full buffer or nobody listening; as good as lost
+
+    def receive(self):
+        """
+        Yields (data, address) for every datagram waiting.
+        """
+        while True:
+            try:
+                data, address = self.socket.recvfrom(MAX_DATAGRAM)
+            except socket.error:
+                return
+            self.packets_in += 1
+            self.bytes_in += len(data)
+            yield data, address
+
+    def close(self):
+        self.socket.close()
+
+##############################################################################
+# SERVER
+##############################################################################
+
+class RemotePlayer:
+
+    def __init__(self, number, address, course):
+        self.number = number
+        self.address = address
+        self.simulation = Simulation(course=course)
+        self.flaps = set() # ticks to flap on, not yet played
+        self.last_flap = -1 # latest flap tick received
+        self.ack = -1 # latest snapshot tick the client has
+        self.heard = default_timer()
+
+class Match:
+
+    def __init__(self, number, seed):
+        self.number = number
+        self.course = Course(seed)
+        self.players = {} # number -> RemotePlayer
+        self.next_player = 0
+        self.tick = 0
+        self.history = {} # snapshot tick -> {player: state}
+
+class MatchServer(Endpoint):
+
+    def __init__(self, host='', port=PORT, players_per_match=MAX_PLAYERS,
+                 tick_rate=TICK_RATE, snapshot_interval=SNAPSHOT_INTERVAL):
+        """
+        host, port - address to serve on; port 0 picks a free one (see
+                     self.port)
+        players_per_match - players a match is filled to before another
+                            is started
+        """
+        Endpoint.__init__(self, (host, port))
+        self.port = self.socket.getsockname()[1]
+        self.players_per_match = players_per_match
+        self.tick_rate = tick_rate
+        self.snapshot_interval = snapshot_interval
+
+        self.matches = {} # number -> Match
+        self.next_match = 0
+        self.addresses = {} # address -> (match, player)
+
+        # counters
+        self.ticks = 0
+        self.step_time = 0.
+        self.late_flaps = 0 # played after the tick they were stamped with
+        self.snapshots = 0
+        self.snapshot_bytes = 0
+        self.full_states = self.delta_states = 0
+
+    #--------------------------------------------------------------------------
+
+    def poll(self):
+        """
+        Handles every message waiting.
+        """
+        for data, address in self.receive():
+            try:
+                self.handle(data, address)
+            except struct.error:
+                pass # truncated
+
+    def handle(self, data, address):
+        kind = KIND.unpack_from(data)[0]
+        if kind == JOIN:
+            self.join(address)
+        elif kind == INPUT:
+            match, number, ack, count = INPUT_MESSAGE.unpack_from(data)[1:]
+            player = self.get_player(match, number, address)
+            if player is None:
+                return
+            player.heard = default_timer()
+            player.ack = max(player.ack, unpack_tick(ack))
+            ticks = player.simulation.ticks
+            for i in range(count):
+                tick = FLAP.unpack_from(data, INPUT_MESSAGE.size + i * FLAP.size)[0]
+                if tick > player.last_flap: # flaps are resent until acknowledged
+                    player.last_flap = tick
+                    player.flaps.add(tick)
+                    if tick < ticks:
+                        self.late_flaps += 1
+        elif kind == LEAVE:
+            match, number = LEAVE_MESSAGE.unpack_from(data)[1:]
+            if self.get_player(match, number, address) is not None:
+                self.remove(self.matches[match], number)
+
+    def get_player(self, match, number, address):
+        if self.addresses.get(address) != (match, number):
+            return None
+        return self.matches[match].players[number]
+
+    def join(self, address):
+        if address in self.addresses: # the welcome was lost
+            match, number = self.addresses[address]
+            match = self.matches[match]
+        else:
+            for match in self.matches.values():
+                if len(match.players) < self.players_per_match:
+                    break
+            else:
+                match = Match(self.next_match, random.getrandbits(64))
+                self.matches[match.number] = match
+                self.next_match += 1
+            number = match.next_player
+            match.next_player += 1
+            match.players[number] = RemotePlayer(number, address, match.course)
+            self.addresses[address] = (match.number, number)
+        self.send(WELCOME_MESSAGE.pack(WELCOME, match.number, number,
+                                       match.course.seed, self.snapshot_interval),
+                  address)
+
+    def remove(self, match, number):
+        player = match.players.pop(number)
+        del self.addresses[player.address]
+        if not match.players:
+            del self.matches[match.number]
+
+    #--------------------------------------------------------------------------
+
+    def step(self):
+        """
+        Plays a tick of every match, sending snapshots when due.
+        """
+        start = default_timer()
+        for match in list(self.matches.values()):
+            for player in match.players.values():
+                simulation = player.simulation
+                flap = False
+                if player.flaps:
+                    due = [tick for tick in player.flaps if tick <= simulation.ticks]
+                    if due:
+                        flap = True
+                        player.flaps.difference_update(due)
+                simulation.tick(flap)
+            match.tick += 1
+            if match.tick % self.snapshot_interval == 0:
+                self.send_snapshots(match)
+        self.ticks += 1
+        if self.ticks % self.tick_rate == 0:
+            self.drop_silent()
+        self.step_time += default_timer() - start
+
+    def send_snapshots(self, match):
+        states = {}
+        for number, player in match.players.items():
+            states[number] = strip_seed(player.simulation.get_state())
+        history = match.history
+        history[match.tick] = states
+        for tick in [tick for tick in history if tick <= match.tick - HISTORY]:
+            del history[tick]
+
+        # the players part depends only on the baseline, so clients that
+        # acknowledged the same snapshot share it
+        bodies = {}
+        for player in match.players.values():
+            baseline = player.ack if player.ack in history else -1
+            body = bodies.get(baseline)
+            if body is None:
+                body = bodies[baseline] = self.encode(states, history.get(baseline))
+            data = SNAPSHOT_MESSAGE.pack(SNAPSHOT, match.tick, pack_tick(baseline),
+                                         pack_tick(player.last_flap), len(states)) + body
+            self.send(data, player.address)
+            self.snapshots += 1
+            self.snapshot_bytes += len(data)
+
+    def encode(self, states, baseline):
+        parts = []
+        for number in sorted(states):
+            previous = baseline.get(number) if baseline is not None else None
+            mask, data = encode_state(states[number], previous)
+            if mask == FULL_MASK:
+                self.full_states += 1
+            else:
+                self.delta_states += 1
+            parts.append(PLAYER.pack(number, mask))
+            parts.append(data)
+        return b''.join(parts)
+
+    def drop_silent(self):
+        now = default_timer()
+        for match in list(self.matches.values()):
+            for number, player in list(match.players.items()):
+                if now - player.heard > TIMEOUT:
+                    self.remove(match, number)
+
+    #--------------------------------------------------------------------------
+
+    def run(self, duration=None, report=None, report_every=5.):
+        """
+        Serves in real time, for duration seconds or for good, calling
+        report with get_stats() every report_every seconds if given.
+        """
+        period = 1. / self.tick_rate
+        start = next_tick = next_report = default_timer()
+        while duration is None or default_timer() - start < duration:
+            self.poll()
+            now = default_timer()
+            if now >= next_tick:
+                self.step()
+                next_tick += period
+                if now - next_tick > 0.25: # fell behind; do not race to catch up
+                    next_tick = now
+            if report is not None and now >= next_report:
+                report(self.get_stats())
+                next_report += report_every
+            wait = next_tick - default_timer()
+            if wait > 0:
+                select.select([self.socket], [], [], wait)
+
+    def get_stats(self):
+        """
+        Returns a dict of matches and players, ticks stepped and per second,
+        milliseconds per step, traffic per second, snapshot size and share of
+        player states sent as deltas, and late flaps.
+        """
+        elapsed = max(default_timer() - self.start_time, 1e-9)
+        states = self.full_states + self.delta_states
+        return {'matches': len(self.matches),
+                'players': len(self.addresses),
+                'ticks': self.ticks,
+                'ticks_per_s': self.ticks / elapsed,
+                'step_ms': self.step_time / max(self.ticks, 1) * 1000,
+                'bytes_in_per_s': self.bytes_in / elapsed,
+                'bytes_out_per_s': self.bytes_out / elapsed,
+                'packets_in_per_s': self.packets_in / elapsed,
+                'packets_out_per_s': self.packets_out / elapsed,
+                'snapshot_bytes': self.snapshot_bytes / float(max(self.snapshots, 1)),
+                'delta_share': self.delta_states / float(max(states, 1)),
+                'late_flaps': self.late_flaps}
+
+##############################################################################
+# CLIENT
+##############################################################################
+
+class MatchClient(Endpoint):
+
+    def __init__(self, host, port=PORT, lead=INPUT_LEAD):
+        """
+        lead - ticks to play ahead of the server, so flaps reach it in time
+        """
+        Endpoint.__init__(self)
+        self.server = (host, port)
+        self.lead = lead
+
+        self.match = self.player = None
+        self.seed = None
+        self.simulation = None # this player's game, predicted
+        self.others = {} # player -> Simulation of their last snapshot
+        self.flaps = [] # ticks flapped on, until the server has played them
+        self.acked_flap = -1 # latest flap tick the server has
+        self.predictions = {} # tick -> predicted state after it
+        self.snapshot_tick = -1 # latest snapshot received
+        self.server_ticks = -1 # this player's ticks in it
+        self.baselines = {} # snapshot tick -> {player: state}
+        self.waited = 0 # ticks since the last JOIN
+
+        # counters
+        self.snapshots = 0
+        self.lost_snapshots = 0
+        self.corrections = 0 # predictions the server disagreed with
+
+        self.send(JOIN_MESSAGE.pack(JOIN), self.server)
+
+    def joined(self):
+        return self.simulation is not None
+
+    #--------------------------------------------------------------------------
+
+    def poll(self):
+        """
+        Handles every message waiting.
+        """
+        for data, address in self.receive():
+            if address != self.server:
+                continue
+            try:
+                kind = KIND.unpack_from(data)[0]
+                if kind == WELCOME:
+                    self.welcome(data)
+                elif kind == SNAPSHOT and self.joined():
+                    self.receive_snapshot(data)
+            except (struct.error, ValueError):
+                pass # truncated, or a delta on a baseline already dropped
+
+    def welcome(self, data):
+        if self.joined():
+            return
+        self.match, self.player, self.seed, self.snapshot_interval = \
+            WELCOME_MESSAGE.unpack_from(data)[1:]
+        self.simulation = Simulation(course=Course(self.seed))
+        for i in range(self.lead): # @UnusedVariable
+            self.simulation.tick()
+            self.predictions[self.simulation.ticks] = self.simulation.get_state()
+
+    def tick(self, flap=False):
+        """
+        Plays a tick of this player's game ahead of the server, flapping
+        first if flap is set, and sends the flaps not yet acknowledged.
+        """
+        if not self.joined():
+            self.waited += 1
+            if self.waited % JOIN_RETRY == 0:
+                self.send(JOIN_MESSAGE.pack(JOIN), self.server)
+            return
+        simulation = self.simulation
+        if flap and not simulation.done:
+            self.flaps.append(simulation.ticks)
+        simulation.tick(flap)
+        self.predictions[simulation.ticks] = simulation.get_state()
+
+        flaps = [flap for flap in self.flaps if flap > self.acked_flap][-MAX_FLAPS:]
+        self.send(INPUT_MESSAGE.pack(INPUT, self.match, self.player,
+                                     pack_tick(self.snapshot_tick), len(flaps)) +
+                  b''.join([FLAP.pack(tick) for tick in flaps]), self.server)
+
+    def leave(self):
+        if self.joined():
+            self.send(LEAVE_MESSAGE.pack(LEAVE, self.match, self.player), self.server)
+        self.close()
+
+    #--------------------------------------------------------------------------
+
+    def receive_snapshot(self, data):
+        tick, baseline_tick, last_flap, count = SNAPSHOT_MESSAGE.unpack_from(data)[1:]
+        if tick <= self.snapshot_tick:
+            return # late or repeated
+        baseline = None
+        if baseline_tick != NO_TICK:
+            baseline = self.baselines[baseline_tick]
+        states = {}
+        offset = SNAPSHOT_MESSAGE.size
+        for i in range(count): # @UnusedVariable
+            number, mask = PLAYER.unpack_from(data, offset)
+            previous = baseline.get(number) if baseline is not None else None
+            states[number], offset = decode_state(data, offset + PLAYER.size, mask, previous)
+
+        if self.snapshot_tick >= 0:
+            self.lost_snapshots += (tick - self.snapshot_tick) // self.snapshot_interval - 1
+        self.snapshots += 1
+        self.snapshot_tick = tick
+        self.baselines[tick] = states
+        for old in [old for old in self.baselines if old <= tick - HISTORY]:
+            del self.baselines[old]
+        last_flap = unpack_tick(last_flap)
+        self.acked_flap = max(self.acked_flap, last_flap)
+
+        for number, state in states.items():
+            if number == self.player:
+                self.reconcile(add_seed(state, self.seed), last_flap)
+            else:
+                other = self.others.get(number)
+                if other is None:
+                    other = self.others[number] = Simulation(course=self.simulation.course)
+                other.set_state(add_seed(state, self.seed))
+        for number in [number for number in self.others if number not in states]:
+            del self.others[number]
+
+    def reconcile(self, state, last_flap):
+        """
+        Checks the prediction against the server's state, and if it was
+        wrong, plays from the server's state to the current tick again with
+        the flaps the server has yet to play.  Catches up to lead ticks
+        ahead if the client has fallen behind, as when a WELCOME was lost.
+        """
+        ticks = state[0]
+        self.server_ticks = ticks
+        simulation = self.simulation
+        now = simulation.ticks
+        predicted = self.predictions.get(ticks)
+        for old in [old for old in self.predictions if old < ticks]:
+            del self.predictions[old]
+        self.flaps = [flap for flap in self.flaps if flap >= ticks or flap > last_flap]
+        if predicted == state and (now >= ticks + self.lead or simulation.done):
+            return
+
+        if predicted != state:
+            self.corrections += 1
+        simulation.set_state(state)
+        # flaps the server has not received are played as soon as they are
+        flaps = set([max(flap, ticks) for flap in self.flaps])
+        for tick in range(ticks, max(now, ticks + self.lead)):
+            simulation.tick(tick in flaps)
+            self.predictions[simulation.ticks] = simulation.get_state()
+
+    def get_stats(self):
+        """
+        Returns a dict of traffic per second, snapshots received and lost,
+        corrections and the ticks played ahead of the last snapshot.
+        """
+        elapsed = max(default_timer() - self.start_time, 1e-9)
+        return {'bytes_in_per_s': self.bytes_in / elapsed,
+                'bytes_out_per_s': self.bytes_out / elapsed,
+                'snapshots': self.snapshots,
+                'lost_snapshots': self.lost_snapshots,
+                'corrections': self.corrections,
+                'lead': (self.simulation.ticks - self.server_ticks
+                         if self.joined() and self.server_ticks >= 0 else 0)}
@@ -0,0 +1,211 @@
+##############################################################################
+# pixels.py
+##############################################################################
+# Pixel observations of the headless Simulation.  SimulationRenderer draws
+# the simulation's state offscreen (opening a 1x1 display with the dummy
+# video driver if no display is open), and PixelEnv hands the frame to the
+# agent as a NumPy view of the surface's pixels, or as a downsampled
+# grayscale frame or stack of frames computed into preallocated buffers.
+# Needs numpy.
+##############################################################################
+
+import os
+import numpy
+import pygame
+import pygame.surfarray
+
+from environment import FlappyEnv
+from graphics.assets import Assets
+from simulation import GAP_ROWS, OBSTACLE_ROWS
+
+BIRD_FRAMES = ('fb1', 'fb2', 'fb3', 'fb2')
+ANIMATION_RATE = 6 # ticks per bird frame
+
+def init_display():
+    """
+    Opens a 1x1 display, with the dummy video driver unless one is already
+    initialized, so surfaces can be converted without a window.
+    """
+    if pygame.display.get_surface() is None:
+        if not pygame.display.get_init():
+            os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+            pygame.display.init()
+        pygame.display.set_mode((1, 1))
+
+##############################################################################
+# RENDERER
+##############################################################################
+
+class SimulationRenderer:
+
+    def __init__(self, simulation, scale=0.5):
+        """
+        scale - pixels drawn per simulation pixel; sprites end up at
+                simulation.sprite_scale * scale times the sheet size, which
+                has to be 1 or 2
+        """
+        init_display()
+        if not Assets.is_loaded():
+            Assets.load()
+
+        sprite_scale = simulation.sprite_scale * scale
+        if sprite_scale == 1:
+            self.chain = ()
+        elif sprite_scale == 2:
+            self.chain = (('scale2x',),)
+        else:
+            raise ValueError('Sprites cannot be drawn at %sx' % (sprite_scale,))
+
+        self.simulation = simulation
+        self.scale = scale
+        self.size = (int(simulation.screensize[0] * scale),
+                     int(simulation.screensize[1] * scale))
+        self.surface = pygame.Surface(self.size).convert()
+
+        self.background = self.sprite('background')
+        self.background_flipped = self.sprite('background', ('flip', True, False))
+        self.background_flipped_pos = (self.size[0] - self.background.get_width(),
+                                       self.size[1] - self.background.get_height())
+        self.terrain = self.sprite('terrain')
+        self.birds = [self.sprite(name) for name in BIRD_FRAMES]
+        self.row_height = self.birds[0].get_height()
+
+    def sprite(self, name, *chain):
+        return Assets.get(name, *(self.chain + chain))
+
+    #--------------------------------------------------------------------------
+
+    def render(self):
+        """
+        Draws the simulation's current state onto self.surface.
+        """
+        simulation = self.simulation
+        surface = self.surface
+        scale = self.scale
+        width, height = self.size
+
+        surface.blit(self.background, (0, 0))
+        surface.blit(self.background_flipped, self.background_flipped_pos)
+
+        # terrain tiles scroll as in GameState
+        terrain_width = self.terrain.get_width()
+        x = int((terrain_width + simulation.x_displacement * scale) % -terrain_width)
+        y = height - self.terrain.get_height()
+        for i in range(3): # @UnusedVariable
+            surface.blit(self.terrain, (x, y))
+            x += terrain_width
+
+        # obstacles
+        bird = self.birds[(simulation.ticks // ANIMATION_RATE) % len(self.birds)]
+        bird_width = bird.get_width()
+        for i in range(simulation.obstacle_count):
+            x = int(simulation.obstacle_x[i] * scale)
+            if x >= width or x + bird_width <= 0:
+                continue
+            gap_top = simulation.number_above[i]
+            gap_bottom = gap_top + GAP_ROWS
+            for row in range(OBSTACLE_ROWS):
+                if row < gap_top or row >= gap_bottom:
+                    surface.blit(bird, (x, row * self.row_height))
+
+        # player, with rotations memoized to the nearest degree
+        player = self.sprite('player', ('rotate', int(round(simulation.current_angle))))
+        surface.blit(player, (int(simulation.player_x * scale),
+                              int(simulation.height * scale)))
+
+##############################################################################
+# ENVIRONMENT
+##############################################################################
+
+class PixelEnv(FlappyEnv):
+    """
+    FlappyEnv observing pixels.  Modes:
+    'rgb'   - pixels3d view of the frame, shape (width, height, 3)
+    'raw'   - pixels2d view of the frame's mapped pixels
+    'gray'  - grayscale frame, every downsample-th pixel, uint8
+    'stack' - the last stack grayscale frames, oldest first
+    Views lock the surface: drop 'rgb' and 'raw' observations before the
+    next step.  Every observation is overwritten by later steps.
+    """
+
+    MODES = ('rgb', 'raw', 'gray', 'stack')
+
+    def __init__(self, mode='stack', downsample=3, stack=4, scale=0.5,
+                 **kwargs):
+        """
+        downsample - keep every downsample-th pixel in each direction
+        stack - number of frames in a 'stack' observation
+        scale - see SimulationRenderer
+        Other keyword arguments are passed to FlappyEnv.
+        """
+        if mode not in self.MODES:
+            raise ValueError('Unknown observation mode: %s' % (mode,))
+        FlappyEnv.__init__(self, **kwargs)
+        self.mode = mode
+        self.downsample = downsample
+        self.renderer = SimulationRenderer(self.simulation, scale)
+
+        width, height = self.renderer.size
+        size = (len(range(0, width, downsample)), len(range(0, height, downsample)))
+        self.luma = numpy.zeros(size, numpy.uint16)
+        self.channel = numpy.zeros(size, numpy.uint16)
+
+        # ring of grayscale frames, and the orders that list it oldest first
+        if mode != 'stack':
+            stack = 1
+        self.frames = numpy.zeros((stack,) + size, numpy.uint8)
+        self.frame_views = [self.frames[i] for i in range(stack)]
+        self.orders = [numpy.array([(latest + 1 + i) % stack for i in range(stack)])
+                       for latest in range(stack)]
+        self.stacked = numpy.zeros_like(self.frames)
+        self.latest = 0
+        self.fill_stack = True
+
+        self.pixels = None
+
+    #--------------------------------------------------------------------------
+
+    def reset(self, seed=None, course=None):
+        self.fill_stack = True
+        return FlappyEnv.reset(self, seed, course)
+
+    def observe(self):
+        # the last view has to go before the surface can be drawn on
+        self.observation = self.pixels = None
+        self.renderer.render()
+
+        if self.mode == 'rgb':
+            self.observation = self.pixels = pygame.surfarray.pixels3d(self.renderer.surface)
+            return
+        if self.mode == 'raw':
+            self.observation = self.pixels = pygame.surfarray.pixels2d(self.renderer.surface)
+            return
+
+        self.latest = (self.latest + 1) % len(self.frame_views)
+        frame = self.frame_views[self.latest]
+        self.grayscale(frame)
+
+        if self.mode == 'gray':
+            self.observation = frame
+            return
+        if self.fill_stack:
+            numpy.copyto(self.frames, frame)
+            self.fill_stack = False
+        numpy.take(self.frames, self.orders[self.latest], 0, self.stacked, 'clip')
+        self.observation = self.stacked
+
+    def grayscale(self, out):
+        """
+        Writes the downsampled luma of the rendered frame into out.
+        """
+        step = self.downsample
+        pixels = pygame.surfarray.pixels3d(self.renderer.surface)
+        luma, channel = self.luma, self.channel
+        numpy.multiply(pixels[::step, ::step, 0], 77, out=luma, dtype=numpy.uint16)
+        numpy.multiply(pixels[::step, ::step, 1], 150, out=channel, dtype=numpy.uint16)
+        numpy.add(luma, channel, out=luma)
+        numpy.multiply(pixels[::step, ::step, 2], 29, out=channel, dtype=numpy.uint16)
+        numpy.add(luma, channel, out=luma)
+        del pixels
+        numpy.right_shift(luma, 8, out=luma)
+        numpy.copyto(out, luma, 'unsafe')
@@ -0,0 +1,183 @@
+##############################################################################
+# recorder.py
+##############################################################################
+# Records games played in GameState, as dataset rows in the same columns as
+# headless runs (see trajectory.ROW_DTYPE) or as replay files.  Both record
+# once a frame's work is done, so they see the state after that frame and
+# whether the player flapped during it.
+##############################################################################
+
+import os
+import time
+
+from engine.model import Model
+from engine.systemevents import *  # @UnusedWildImport
+from gamestate import GameEventListener, GameOverEvent, GameState, SpaceBarEvent
+from graphics.spritesheet import RECT_DICT
+
+from replay import KEYFRAME_INTERVAL, ReplayWriter
+
+PASS_REWARD = 1.
+CRASH_REWARD = -1.
+
+##############################################################################
+# DATASETS
+##############################################################################
+
+class GameRecorder(SystemEventListener, GameEventListener):
+
+    def __init__(self, writer, episode=0):
+        """
+        writer - DatasetWriter the rows go to
+        episode - number given to the first game recorded
+        """
+        SystemEventListener.__init__(self)
+        GameEventListener.__init__(self)
+
+        self.writer = writer
+        self.episode = episode
+        self.game = None # GameState being recorded
+        self.ticks = 0
+        self.score = 0
+        self.flapped = False
+        self.crashed = False
+
+    #--------------------------------------------------------------------------
+
+    def notify(self, event):
+        if isinstance(event, SpaceBarEvent):
+            self.flapped = True
+        elif isinstance(event, GameOverEvent):
+            self.crashed = True
+        elif isinstance(event, IdleEvent):
+            state = Model.state
+            if self.game is None and isinstance(state, GameState) and state.game_started:
+                self.game = state
+                self.ticks = self.score = 0
+                self.crashed = False
+            if self.game is not None:
+                self.record(self.game)
+            self.flapped = False
+
+    def record(self, game):
+        self.ticks += 1
+        reward = (game.score - self.score) * PASS_REWARD
+        self.score = game.score
+        if self.crashed:
+            reward += CRASH_REWARD
+
+        player = game.player
+        distance = gap_top = gap_bottom = 0.
+        nearest = game.obstacles.ahead(player.x_pos)
+        if nearest is not None:
+            row_height = nearest.get_obstacle_height()
+            distance = nearest.get_x_pos() - player.x_pos
+            gap_top = nearest.number_above * row_height
+            gap_bottom = (nearest.number_above + nearest.gap_height) * row_height
+
+        self.writer.append((self.episode, self.ticks, player.height,
+                            player.y_velocity, int(self.flapped), distance,
+                            gap_top, gap_bottom, reward, self.crashed))
+
+        if self.crashed:
+            self.episode += 1
+            self.game = None
+            self.crashed = False
+
+##############################################################################
+# REPLAYS
+##############################################################################
+
+def get_game_state(game, ticks, done=False):
+    """
+    Returns the state of a GameState in the form of Simulation.get_state().
+    """
+    player = game.player
+    return (ticks, game.game_started, done, game.score, game.scrolled,
+            game.obstacles.placed, player.flap_height, player.flap_angle,
+            player.flap_ticks, player.lift, game.obstacles.passed,
+            game.course.seed, game.gap_index)
+
+class ReplayRecorder(SystemEventListener, GameEventListener):
+    """
+    Writes each game played to its own replay file.
+    """
+
+    def __init__(self, directory, interval=KEYFRAME_INTERVAL):
+        """
+        directory - where replay files go
+        interval - ticks between keyframes
+        """
+        SystemEventListener.__init__(self)
+        GameEventListener.__init__(self)
+
+        self.directory = directory
+        self.interval = interval
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.writer = None
+        self.game = None # GameState being recorded
+        self.ticks = 0
+        self.x_displacement = 0.
+        self.started = False
+        self.flapped = False
+        self.crashed = False
+        self.replays = 0 # files written
+
+    #--------------------------------------------------------------------------
+
+    def notify(self, event):
+        if isinstance(event, SpaceBarEvent):
+            self.flapped = True
+        elif isinstance(event, GameOverEvent):
+            self.crashed = True
+        elif isinstance(event, StateChangeEvent):
+            if isinstance(event.new_state, GameState):
+                self.start(event.new_state)
+        elif isinstance(event, IdleEvent):
+            if self.writer is not None:
+                self.record()
+            self.flapped = False
+
+    def start(self, game):
+        self.close()
+        self.game = game
+        self.ticks = 0
+        self.x_displacement = game.x_displacement
+        self.started = game.game_started
+        self.crashed = False
+        self.replays += 1
+        name = '%s-%03d.replay' % (time.strftime('%Y%m%d-%H%M%S'), self.replays)
+        self.writer = ReplayWriter(os.path.join(self.directory, name),
+                                   self.get_state, len(game.obstacles), self.interval,
+                                   game.screensize, game.player.surf.get_width() //
+                                   RECT_DICT['player'].width)
+
+    def get_state(self):
+        return get_game_state(self.game, self.ticks, self.crashed)
+
+    def record(self):
+        # a frame the game did not tick in (it is entered mid-frame) does not
+        # move the scenery
+        game = self.game
+        if game.x_displacement == self.x_displacement:
+            return
+        self.x_displacement = game.x_displacement
+        self.ticks += 1
+        self.writer.add(self.flapped)
+
+        # where the first flap lands in a frame depends on listener order,
+        # so replays do not re-simulate it
+        if game.game_started and not self.started:
+            self.started = True
+            self.writer.add_keyframe()
+
+        if self.crashed:
+            self.close()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        self.game = None
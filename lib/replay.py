@@ -0,0 +1,250 @@
+##############################################################################
+# replay.py
+##############################################################################
+# Replay files: the flap input of every tick, plus a full keyframe of the
+# game's state every interval ticks, laid out as
+#     header | one input byte per tick | keyframe records | footer
+# The footer says where the keyframes start, so a reader memory-maps the
+# file and seeks to any tick by restoring the keyframe at or before it and
+# playing at most interval - 1 ticks forward with the headless Simulation.
+# Keyframes are kept in memory until close(), so a file is only readable
+# once it has been closed.  Needs numpy.
+##############################################################################
+
+import struct
+
+import numpy
+
+from simulation import MASK, REFERENCE_SIZE, Simulation
+
+MAGIC = b'FPRP'
+END_MAGIC = b'FPRE'
+VERSION = 3
+# magic, version, obstacles, keyframe interval, screen width and height,
+# sprite scale
+HEADER = struct.Struct('<4sHHIHHH')
+# ticks, keyframe offset, keyframe count, magic
+FOOTER = struct.Struct('<QQQ4s')
+
+KEYFRAME_INTERVAL = 256
+
+# the player and obstacles are worked out from these (see simulation.MOTION)
+KEYFRAME_DTYPE = numpy.dtype([('tick', numpy.int64), # inputs before the keyframe
+                              ('ticks', numpy.int64),
+                              ('started', numpy.bool_),
+                              ('done', numpy.bool_),
+                              ('score', numpy.int32),
+                              ('scrolled', numpy.int64),
+                              ('placed', numpy.int64),
+                              ('flap_height', numpy.float64),
+                              ('flap_angle', numpy.float64),
+                              ('flap_ticks', numpy.int64),
+                              ('lift', numpy.int32),
+                              ('passed', numpy.int32),
+                              ('course_seed', numpy.uint64),
+                              ('gap_index', numpy.int64)])
+
+##############################################################################
+# WRITER
+##############################################################################
+
+class ReplayWriter:
+
+    def __init__(self, path, get_state, obstacles=2, interval=KEYFRAME_INTERVAL,
+                 screensize=REFERENCE_SIZE, sprite_scale=2):
+        """
+        get_state - returns the game's current state in the form of
+                    Simulation.get_state(); called for each keyframe,
+                    starting with one now
+        interval - ticks between keyframes
+        """
+        self.get_state = get_state
+        self.interval = interval
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, obstacles, interval,
+                                    screensize[0], screensize[1], sprite_scale))
+
+        self.record = numpy.zeros(1, KEYFRAME_DTYPE)
+        self.keyframes = [] # packed records
+        self.keyframe_tick = None
+        self.inputs = bytearray() # not yet written
+        self.ticks = 0
+        self.add_keyframe()
+
+    #--------------------------------------------------------------------------
+
+    def add(self, flap):
+        """
+        Records whether the player flapped on the tick just played, and adds
+        a keyframe of the state after it if one is due.
+        """
+        self.inputs.append(1 if flap else 0)
+        self.ticks += 1
+        if len(self.inputs) >= 4096:
+            self.file.write(self.inputs)
+            del self.inputs[:]
+        if self.ticks % self.interval == 0:
+            self.add_keyframe()
+
+    def add_keyframe(self):
+        """
+        Adds a keyframe of the current state, unless this tick has one.
+        """
+        if self.keyframe_tick == self.ticks:
+            return
+        self.keyframe_tick = self.ticks
+        record = self.record[0]
+        (record['ticks'], record['started'], record['done'], record['score'],
+         record['scrolled'], record['placed'], record['flap_height'],
+         record['flap_angle'], record['flap_ticks'], record['lift'],
+         record['passed'], seed, record['gap_index']) = self.get_state()
+        record['tick'] = self.ticks
+        record['course_seed'] = seed & MASK
+        self.keyframes.append(self.record.tobytes())
+
+    def close(self):
+        if self.file is None:
+            return
+        self.file.write(self.inputs)
+        del self.inputs[:]
+        # keyframes start 8-byte aligned
+        offset = HEADER.size + self.ticks
+        padding = -offset % 8
+        self.file.write(b'\0' * padding)
+        self.file.write(b''.join(self.keyframes))
+        self.file.write(FOOTER.pack(self.ticks, offset + padding,
+                                    len(self.keyframes), END_MAGIC))
+        self.file.close()
+        self.file = None
+
+##############################################################################
+# READER
+##############################################################################
+
+class ReplayReader:
+
+    def __init__(self, path):
+        self.data = numpy.memmap(path, numpy.uint8, 'r')
+        if len(self.data) < HEADER.size + FOOTER.size:
+            raise ValueError('%s is not a replay' % (path,))
+        (magic, version, self.obstacles, self.interval, width, height,
+         self.sprite_scale) = HEADER.unpack(self.data[:HEADER.size].tobytes())
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not a version %d replay' % (path, VERSION))
+        self.screensize = (width, height)
+        ticks, offset, count, end = FOOTER.unpack(self.data[-FOOTER.size:].tobytes())
+        if end != END_MAGIC:
+            raise ValueError('Replay %s was not closed' % (path,))
+
+        self.inputs = self.data[HEADER.size:HEADER.size + ticks]
+        self.keyframes = self.data[offset:offset + count *
+                                   KEYFRAME_DTYPE.itemsize].view(KEYFRAME_DTYPE)
+        self.keyframe_ticks = numpy.array(self.keyframes['tick'])
+
+    def __len__(self):
+        return len(self.inputs)
+
+    #--------------------------------------------------------------------------
+
+    def simulation(self):
+        """
+        Returns a Simulation matching the recorded game, at tick 0.
+        """
+        simulation = Simulation(self.screensize, self.sprite_scale,
+                                obstacles=self.obstacles)
+        self.restore(simulation, 0)
+        return simulation
+
+    def keyframe_before(self, tick):
+        """
+        Returns the index of the last keyframe at or before tick.
+        """
+        return max(int(numpy.searchsorted(self.keyframe_ticks, tick, 'right')) - 1, 0)
+
+    def restore(self, simulation, keyframe):
+        """
+        Puts simulation in the state of a keyframe and returns its tick.
+        """
+        record = self.keyframes[keyframe]
+        simulation.set_state((int(record['ticks']), bool(record['started']),
+                              bool(record['done']), int(record['score']),
+                              int(record['scrolled']), int(record['placed']),
+                              float(record['flap_height']), float(record['flap_angle']),
+                              int(record['flap_ticks']), int(record['lift']),
+                              int(record['passed']), int(record['course_seed']),
+                              int(record['gap_index'])))
+        return int(record['tick'])
+
+    def play(self, simulation, start, stop):
+        """
+        Plays the recorded inputs of ticks start to stop on simulation, from
+        flap to flap with Simulation.advance().
+        """
+        flaps = (numpy.flatnonzero(self.inputs[start:stop]) + start).tolist()
+        simulation.advance(flaps[0] - start if flaps else stop - start)
+        for flap, following in zip(flaps, flaps[1:] + [stop]):
+            simulation.advance(following - flap, True)
+
+##############################################################################
+# PLAYER
+##############################################################################
+
+class ReplayPlayer:
+    """
+    A simulation that can be moved to any tick of a replay.
+    """
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.simulation = reader.simulation()
+        self.tick = 0
+        self.resimulated = 0 # ticks played by the last seek
+
+    def seek(self, tick):
+        """
+        Moves to the state after tick inputs.  Plays forward from the current
+        tick when no keyframe is closer, otherwise from the nearest keyframe.
+        """
+        tick = min(max(tick, 0), len(self.reader))
+        keyframe = self.reader.keyframe_before(tick)
+        start = self.reader.keyframe_ticks[keyframe]
+        if tick < self.tick or self.tick < start:
+            self.tick = self.reader.restore(self.simulation, keyframe)
+        self.resimulated = tick - self.tick
+        self.reader.play(self.simulation, self.tick, tick)
+        self.tick = tick
+
+    def step(self, ticks=1):
+        self.seek(self.tick + ticks)
+
+    def at_end(self):
+        return self.tick >= len(self.reader)
+
+##############################################################################
+# RECORDING
+##############################################################################
+
+def record_run(path, seed=0, policy=None, max_ticks=None,
+               interval=KEYFRAME_INTERVAL):
+    """
+    Records a headless game of policy (by default flapping toward the
+    middle of each gap) and returns its final score.
+    """
+    from environment import FlappyEnv
+    from trajectory import gap_policy
+
+    policy = policy or gap_policy
+    env = FlappyEnv(max_ticks=max_ticks)
+    observation = env.reset(seed)
+    simulation = env.simulation
+    writer = ReplayWriter(path, simulation.get_state, simulation.obstacle_count,
+                          interval, simulation.screensize, simulation.sprite_scale)
+    try:
+        done = False
+        while not done:
+            action = policy(observation)
+            observation, reward, done, info = env.step(action) # @UnusedVariable
+            writer.add(action)
+    finally:
+        writer.close()
+    return simulation.score
@@ -0,0 +1,719 @@
+##############################################################################
+# simulation.py
+##############################################################################
+# Headless core of the game play state: the pipe player, the obstacles and
+# the score, stepped one tick at a time with no surfaces, events or display.
+# A tick does what GameState and the objects it draws do in one frame, in
+# the same order and with pygame's Rect rounding, so a run here matches a
+# run of the game on the same Course and with the same flaps.  Between
+# events (see Simulation.quiet_ticks()) whole stretches of ticks are jumped
+# in one go.
+##############################################################################
+
+import array
+import math
+import random
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from graphics.spritesheet import RECT_DICT
+
+##############################################################################
+# CONSTANTS
+##############################################################################
+
+# speeds and distances below are in pixels of a screen this size; they are
+# scaled to the screen size in use
+REFERENCE_SIZE = (576, 512)
+
+def get_unit(screensize):
+    return screensize[1] / float(REFERENCE_SIZE[1])
+
+SCROLL_SPEED = 3.575 # px per tick
+PIPE_SPACING = 320.4 # px between obstacles
+OBSTACLE_START = -100 # obstacles are parked offscreen until play starts
+OBSTACLE_ROWS = 17 # rows of birds in an obstacle
+GAP_ROWS = 7 # rows left out for the gap
+GRAVITY = 0.77
+MAX_RISE_SPEED = -9.4
+MAX_FALL_SPEED = 18.8
+CONTRACTION = -20 # px the player's collision rect is contracted by
+MAX_CHANGE_ANGLE = 5 # degrees the player can tilt up per tick
+ANGLE_DAMPENING = 0.2
+FIRST_OBSTACLE = 2 # spacings from the left edge to the first obstacle
+
+def get_obstacle_count(screensize):
+    """
+    Returns how many obstacles cycle across a screen this size: enough that
+    one moved behind the last comes back at the right edge, and at least 2.
+    """
+    spacing = PIPE_SPACING * get_unit(screensize)
+    return max(2, int(math.ceil(screensize[0] / spacing)))
+
+##############################################################################
+# COURSE
+##############################################################################
+# The obstacle layout of a game as a seeded stream: gap k is a pure function
+# of the seed and k (a SplitMix64 counter, not a generator stepped along),
+# so any obstacle can be looked up in O(1), the coming gaps can be read
+# ahead of play, and one Course can be shared by any number of games, each
+# keeping its own index into it.
+
+MASK = (1 << 64) - 1
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15 # SplitMix64's counter step
+MIX1 = 0xBF58476D1CE4E5B9
+MIX2 = 0x94D049BB133111EB
+
+def mix(z):
+    """
+    SplitMix64's finalizer: a well scrambled 64-bit function of z.
+    """
+    z = ((z ^ (z >> 30)) * MIX1) & MASK
+    z = ((z ^ (z >> 27)) * MIX2) & MASK
+    return z ^ (z >> 31)
+
+class Course:
+
+    def __init__(self, seed=None, rows=OBSTACLE_ROWS, gap_rows=GAP_ROWS):
+        """
+        seed - any integer; a random one is picked if not given
+        rows, gap_rows - rows in an obstacle, and in its gap
+        """
+        if seed is None:
+            seed = random.getrandbits(64)
+        self.seed = seed
+        self.choices = rows - gap_rows + 1 # gaps start on rows 0 to this - 1
+        self.key = mix(seed & MASK)
+
+    def gap(self, k):
+        """
+        Returns the number of rows above the gap of obstacle k.
+        """
+        z = mix((self.key + k * GOLDEN_GAMMA) & MASK)
+        # top 32 bits scaled to the choices, without modulo bias to speak of
+        return int(((z >> 32) * self.choices) >> 32)
+
+    def gaps(self, start, count):
+        """
+        Returns the gaps of obstacles start to start + count - 1 as a numpy
+        array, or an array.array where numpy is missing.
+        """
+        if numpy is None:
+            return array.array('b', [self.gap(k) for k in range(start, start + count)])
+        return course_gaps(numpy.uint64(self.key),
+                           numpy.arange(start, start + count, dtype=numpy.uint64),
+                           self.choices)
+
+def course_gaps(keys, indices, choices):
+    """
+    Course.gap() over numpy arrays: the gaps of obstacles indices of the
+    courses with keys, as int8.  Needs numpy.
+    """
+    z = indices.astype(numpy.uint64) * numpy.uint64(GOLDEN_GAMMA)
+    z += keys
+    z ^= z >> numpy.uint64(30)
+    z *= numpy.uint64(MIX1)
+    z ^= z >> numpy.uint64(27)
+    z *= numpy.uint64(MIX2)
+    z ^= z >> numpy.uint64(31)
+    z >>= numpy.uint64(32)
+    z *= numpy.uint64(choices)
+    z >>= numpy.uint64(32)
+    return z.astype(numpy.int8)
+
+##############################################################################
+# MOTION
+##############################################################################
+# Everything that moves is worked out from a count of ticks instead of being
+# added to a tick at a time: the player from the ticks since it last
+# flapped, the obstacles from the ticks scrolled.  A tick and a jump of many
+# ticks then give the same floats to the last bit, which is what lets
+# Simulation.advance() skip the ticks between events.  GameState moves its
+# objects with the same functions.
+
+class FlapArc:
+    """
+    The player's path after a flap: rising at max_rise_speed, slowed by
+    gravity every tick, and falling no faster than max_fall_speed.
+    """
+
+    def __init__(self, gravity, max_rise_speed, max_fall_speed):
+        self.gravity = gravity
+        self.max_rise_speed = max_rise_speed
+        self.max_fall_speed = max_fall_speed
+
+        # the first tick at full fall speed, and the drop until then
+        terminal = max(int((max_fall_speed - max_rise_speed) / gravity), 1)
+        while terminal > 1 and max_rise_speed + (terminal - 1) * gravity >= max_fall_speed:
+            terminal -= 1
+        while max_rise_speed + terminal * gravity < max_fall_speed:
+            terminal += 1
+        self.terminal = terminal
+        self.terminal_drop = self.drop(terminal - 1)
+
+        # the last tick still rising, where the player is highest
+        top = max(int(-max_rise_speed / gravity), 0)
+        while top > 0 and self.velocity(top) >= 0:
+            top -= 1
+        while self.velocity(top + 1) < 0:
+            top += 1
+        self.top = top
+
+    def velocity(self, ticks):
+        """
+        Returns the speed ticks ticks after the flap, positive down.
+        """
+        if ticks < self.terminal:
+            return self.max_rise_speed + ticks * self.gravity
+        return self.max_fall_speed
+
+    def drop(self, ticks):
+        """
+        Returns how far the player has moved down ticks ticks after the flap
+        (negative while above where it flapped).
+        """
+        if ticks < self.terminal:
+            return ticks * self.max_rise_speed + self.gravity * (ticks * (ticks + 1) // 2)
+        return self.terminal_drop + (ticks - self.terminal + 1) * self.max_fall_speed
+
+def get_obstacle_x(k, scrolled, placed, spacing, x_velocity):
+    """
+    Returns the x of obstacle k of the course after scrolled ticks, play
+    having started after placed.  The obstacles are lined up from
+    FIRST_OBSTACLE spacings less the scenery's x displacement at the start,
+    as the game always has, and scroll left from there.
+    """
+    return spacing * (k + FIRST_OBSTACLE) - (scrolled - 2 * placed) * x_velocity
+
+##############################################################################
+# DETERMINISM
+##############################################################################
+# Heights and obstacle positions are sums and products done in a fixed
+# order (see MOTION), so any engine doing the same double arithmetic gets
+# the same bits, numpy's included.  Angles are not: they come from atan, sin
+# and cos, whose last bits differ between C libraries and numpy's own
+# loops, and the angle sizes the collision rect.  In deterministic mode they
+# come from an AngleTable instead, worked out once per game setup: the ideal
+# angle of every speed the player can have, rounded to 1 / ANGLE_UNITS of a
+# degree so that every angle tilted to from there is exact too, and the
+# rotated player's rect size at each of those angles.
+
+ANGLE_UNITS = 64 # steps per degree
+
+class AngleTable:
+
+    def __init__(self, arc, x_velocity, player_width, player_height):
+        """
+        arc - FlapArc of the player
+        x_velocity - scroll speed, which the ideal angle is worked out against
+        player_width, player_height - size of the unrotated player as drawn
+        """
+        # speed -> ideal angle, and the ideal angle by ticks since a flap up
+        # to full fall speed
+        self.ideal = {}
+        for speed in [0] + [arc.velocity(n) for n in range(arc.terminal + 1)]:
+            angle = -math.degrees(math.atan(speed / float(x_velocity))) * ANGLE_DAMPENING
+            self.ideal[speed] = int(round(angle * ANGLE_UNITS)) / float(ANGLE_UNITS)
+        self.ideal_by_tick = [self.ideal[arc.velocity(n)] for n in range(arc.terminal + 1)]
+        self.rest = self.ideal[0]
+
+        # the player never tilts past the ideal angles either way
+        self.lowest = int(round(min(self.ideal.values()) * ANGLE_UNITS))
+        self.highest = int(round(max(self.ideal.values()) * ANGLE_UNITS))
+        self.widths = []
+        self.heights = []
+        for units in range(self.lowest, self.highest + 1):
+            angle = abs(math.radians(units / float(ANGLE_UNITS)))
+            sin, cos = math.sin(angle), math.cos(angle)
+            self.widths.append(int(player_height * sin + player_width * cos))
+            self.heights.append(int(player_width * sin + player_height * cos))
+
+    def get_size(self, angle):
+        """
+        Returns the size of the rotated player's rect at angle.
+        """
+        i = int(round(angle * ANGLE_UNITS)) - self.lowest
+        return self.widths[i], self.heights[i]
+
+##############################################################################
+# SIMULATION
+##############################################################################
+
+class Simulation:
+
+    def __init__(self, screensize=REFERENCE_SIZE, sprite_scale=2, seed=None,
+                 obstacles=None, course=None, deterministic=False):
+        """
+        screensize - size of the screen the game would be played on
+        sprite_scale - size of the drawn sprites relative to the sprite sheet
+        obstacles - number of obstacles cycling across the screen, by default
+                    as many as GameState uses (see get_obstacle_count())
+        seed, course - see reset()
+        deterministic - take angles from an AngleTable, to match GameState
+                        and BatchSimulation in that mode on any platform
+        """
+        unit = get_unit(screensize)
+        self.x_velocity = SCROLL_SPEED * unit
+        self.pipe_spacing = PIPE_SPACING * unit
+        self.obstacle_start = OBSTACLE_START * unit
+        self.gravity = GRAVITY * unit
+        self.max_rise_speed = MAX_RISE_SPEED * unit
+        self.max_fall_speed = MAX_FALL_SPEED * unit
+        self.contraction = int(CONTRACTION * unit)
+        self.arc = FlapArc(self.gravity, self.max_rise_speed, self.max_fall_speed)
+
+        self.screensize = screensize
+        self.sprite_scale = sprite_scale
+
+        # sprite sizes as drawn
+        self.player_width = RECT_DICT['player'].width * sprite_scale
+        self.player_height = RECT_DICT['player'].height * sprite_scale
+        self.obstacle_width = RECT_DICT['fb1'].width * sprite_scale
+        self.row_height = RECT_DICT['fb1'].height * sprite_scale
+        # widest and tallest the rotated player's rect can get
+        self.player_extent = int(math.hypot(self.player_width, self.player_height)) + 1
+        terrain_width = RECT_DICT['terrain'].width * sprite_scale
+        terrain_height = RECT_DICT['terrain'].height * sprite_scale
+        self.angles = None
+        if deterministic:
+            self.angles = AngleTable(self.arc, self.x_velocity,
+                                     self.player_width, self.player_height)
+
+        self.player_x = screensize[0] // 4
+        self.starting_height = (screensize[1] - terrain_height) // 2
+        # the three terrain tiles' union
+        self.terrain_rect = (0, screensize[1] - terrain_height,
+                             terrain_width * 3, terrain_height)
+
+        # obstacles are a ring in left-to-right order from index first
+        if obstacles is None:
+            obstacles = get_obstacle_count(screensize)
+        self.obstacle_count = obstacles
+        self.obstacle_x = [0.] * obstacles
+        self.number_above = [0] * obstacles
+        self.passed = [True] * obstacles
+        self.reset(seed, course)
+
+    #--------------------------------------------------------------------------
+
+    def reset(self, seed=None, course=None):
+        """
+        Puts the simulation back to the start of a game, on course if given,
+        or else on a new Course of seed (random if not given).
+        """
+        self.course = course if course is not None else Course(seed)
+        self.gap_index = 0 # course index of the next obstacle to appear
+        self.started = False
+        self.done = False
+        self.score = 0
+        self.ticks = 0
+        self.scrolled = 0 # ticks the scenery has moved
+        self.placed = 0 # value of scrolled when play started
+        self.x_displacement = 0.
+
+        # the player follows the arc of its last flap, pushed down lift px
+        # by the ceiling
+        self.height = self.starting_height
+        self.y_velocity = 0
+        self.prev_angle = self.current_angle = self.get_ideal_angle(self.y_velocity)
+        self.flap_height = self.height
+        self.flap_angle = self.current_angle
+        self.flap_ticks = 0
+        self.lift = 0
+
+        for i in range(self.obstacle_count):
+            self.obstacle_x[i] = self.obstacle_start
+            self.number_above[i] = self.get_gap()
+            self.passed[i] = True
+        self.first = 0 # index of the leftmost obstacle
+        self.passed_count = self.obstacle_count # passed obstacles from first
+
+    def get_state(self):
+        """
+        Returns everything a tick depends on as a tuple, for set_state().
+        """
+        return (self.ticks, self.started, self.done, self.score, self.scrolled,
+                self.placed, self.flap_height, self.flap_angle, self.flap_ticks,
+                self.lift, self.passed_count, self.course.seed, self.gap_index)
+
+    def set_state(self, state):
+        (self.ticks, self.started, self.done, self.score, self.scrolled,
+         self.placed, self.flap_height, self.flap_angle, self.flap_ticks,
+         self.lift, self.passed_count, seed, self.gap_index) = state
+        if seed != self.course.seed:
+            self.course = Course(seed)
+
+        # the obstacles on screen are the last ones drawn from the course,
+        # each in the ring slot of its course index
+        count = self.obstacle_count
+        self.first = self.gap_index % count
+        for j in range(count):
+            i = (self.first + j) % count
+            self.number_above[i] = self.course.gap(self.gap_index - count + j)
+            self.passed[i] = j < self.passed_count
+        self.x_displacement = -self.scrolled * self.x_velocity
+
+        if self.started:
+            self.y_velocity = self.arc.velocity(self.flap_ticks)
+            self.height = self.get_height()
+            self.place_obstacles()
+        else:
+            self.y_velocity = 0
+            self.height = self.flap_height
+            for i in range(count):
+                self.obstacle_x[i] = self.obstacle_start
+        self.current_angle = self.flap_angle
+        if self.flap_ticks > 0:
+            self.current_angle = self.get_angle()
+        self.prev_angle = self.current_angle
+
+    def get_gap(self):
+        gap = self.course.gap(self.gap_index)
+        self.gap_index += 1
+        return gap
+
+    def lookahead(self, count):
+        """
+        Returns the gaps of the next count obstacles to appear (see
+        Course.gaps()).
+        """
+        return self.course.gaps(self.gap_index, count)
+
+    def get_ideal_angle(self, velocity):
+        if self.angles is not None:
+            return self.angles.ideal[velocity]
+        return -math.degrees(math.atan(velocity / float(self.x_velocity))) * ANGLE_DAMPENING
+
+    def get_angle(self):
+        """
+        Returns the angle after the last tick: that of the velocity the tick
+        started with, but tilting up no faster than MAX_CHANGE_ANGLE a tick
+        since the flap.
+        """
+        return min(self.flap_angle + MAX_CHANGE_ANGLE * self.flap_ticks,
+                   self.get_ideal_angle(self.arc.velocity(self.flap_ticks - 1)))
+
+    def get_height(self):
+        return (self.flap_height + self.arc.drop(self.flap_ticks)) + self.lift
+
+    def get_obstacle_x(self, k):
+        return get_obstacle_x(k, self.scrolled, self.placed, self.pipe_spacing,
+                              self.x_velocity)
+
+    def place_obstacles(self):
+        # get_obstacle_x() of each, with the distance scrolled worked out once
+        count = self.obstacle_count
+        first = self.first
+        spacing = self.pipe_spacing
+        k = self.gap_index - count + FIRST_OBSTACLE
+        distance = (self.scrolled - 2 * self.placed) * self.x_velocity
+        for j in range(count):
+            self.obstacle_x[(first + j) % count] = spacing * (k + j) - distance
+
+    #--------------------------------------------------------------------------
+
+    def flap(self):
+        """
+        What a space bar press does: the player rises, and the first press
+        brings the obstacles on.
+        """
+        self.y_velocity = self.max_rise_speed
+        self.flap_height = self.height
+        self.flap_angle = self.current_angle
+        self.flap_ticks = 0
+        self.lift = 0
+        if not self.started:
+            self.started = True
+            self.placed = self.scrolled
+            self.place_obstacles()
+            for i in range(self.obstacle_count):
+                self.passed[i] = False
+            self.passed_count = 0
+
+    def clamp_to_ceiling(self):
+        # the player's rect may not overlap the area above the screen
+        while int(self.height) < 0:
+            self.lift += 1
+            self.height = self.get_height()
+
+    def tick(self, flap=False):
+        """
+        Advances one frame, flapping first if flap is set.  Returns whether
+        the player crashed.
+        """
+        if self.done:
+            return True
+        if flap:
+            self.flap()
+        return self.step()
+
+    def advance(self, ticks, flap=False):
+        """
+        Plays up to ticks ticks, flapping first if flap is set, and returns
+        whether the player crashed: the same as that many calls to tick(),
+        but the quiet ticks between events are jumped in one go, so the cost
+        goes with the events rather than the ticks.  A policy that knows
+        when it will next flap can play to there in one call.
+        """
+        if self.done:
+            return True
+        if flap:
+            self.flap()
+        while ticks > 0:
+            # a single tick is cheaper to play than to look ahead from
+            quiet = self.quiet_ticks(ticks) if ticks > 1 else 0
+            if quiet > 0:
+                self.skip(quiet)
+                ticks -= quiet
+            else:
+                if self.step():
+                    return True
+                ticks -= 1
+        return False
+
+    def step(self):
+        """
+        Plays one tick without flapping.  Returns whether the player crashed.
+        """
+        self.ticks += 1
+
+        obstacle_x = self.obstacle_x
+        count = self.obstacle_count
+
+        # move the leftmost obstacle behind the rightmost once offscreen
+        if self.started:
+            first = self.first
+            while obstacle_x[first] <= -self.obstacle_width:
+                self.number_above[first] = self.get_gap()
+                obstacle_x[first] = self.get_obstacle_x(self.gap_index - 1)
+                self.passed[first] = False
+                first = (first + 1) % count
+                self.passed_count = max(self.passed_count - 1, 0)
+            self.first = first
+
+        # score when the player's center reaches the next obstacle
+        if self.passed_count < count:
+            self.clamp_to_ceiling()
+            i = (self.first + self.passed_count) % count
+            if self.player_x + self.player_width // 2 >= obstacle_x[i]:
+                self.passed[i] = True
+                self.passed_count += 1
+                self.score += 1
+
+        if self.collides():
+            self.done = True
+            return True
+
+        # drawing moves the player and then the scenery
+        self.current_angle = min(self.flap_angle + MAX_CHANGE_ANGLE * (self.flap_ticks + 1),
+                                 self.get_ideal_angle(self.y_velocity))
+        self.prev_angle = self.current_angle
+        self.clamp_to_ceiling()
+
+        if self.started:
+            self.flap_ticks += 1
+            self.y_velocity = self.arc.velocity(self.flap_ticks)
+            self.height = self.get_height()
+
+        self.scrolled += 1
+        self.x_displacement = -self.scrolled * self.x_velocity
+        if self.started:
+            self.place_obstacles()
+        return False
+
+    def skip(self, ticks):
+        """
+        Jumps ticks ticks ahead, for ticks quiet_ticks() has cleared.
+        """
+        self.ticks += ticks
+        self.scrolled += ticks
+        self.x_displacement = -self.scrolled * self.x_velocity
+        if self.started:
+            self.flap_ticks += ticks
+            self.y_velocity = self.arc.velocity(self.flap_ticks)
+            self.height = self.get_height()
+            self.current_angle = self.prev_angle = self.get_angle()
+            self.place_obstacles()
+
+    #--------------------------------------------------------------------------
+
+    def quiet_ticks(self, limit):
+        """
+        Returns how many of the next limit ticks step() would play with
+        nothing happening but motion: no obstacle recycled or passed, no
+        clamping to the ceiling and no chance of a collision.  Each of those
+        is solved for from the closed forms (see MOTION), so the cost does
+        not grow with the ticks.  Collisions go by the player's widest
+        rotation and a px or two to spare, so ticks close to one are left to
+        step() to decide.
+        """
+        if not self.started:
+            # nothing moves before play starts
+            return 0 if self.collides() else limit
+
+        count = self.obstacle_count
+        leftmost = self.gap_index - count # course index of the leftmost obstacle
+        width = self.obstacle_width
+        quiet = self.reaches(leftmost, -width, limit)
+        if self.passed_count < count:
+            quiet = self.reaches(leftmost + self.passed_count,
+                                 self.player_x + self.player_width // 2, quiet)
+
+        # the ceiling clamps at height -1, the terrain is hit from below it
+        offset = -int(self.contraction / 2.)
+        extent = self.player_extent + self.contraction
+        px = self.player_x + offset
+        right = px + extent
+        quiet = self.first_above(0, quiet, 1)
+        quiet = self.first_below(0, quiet, self.terrain_rect[1] - offset - extent - 2)
+
+        # while the player could be over an obstacle's column, it has to stay
+        # inside the gap
+        row_height = self.row_height
+        for j in range(count):
+            start = self.reaches(leftmost + j, right + 1, quiet)
+            if start >= quiet:
+                break
+            end = self.reaches(leftmost + j, px - width - 1, quiet)
+            above = self.number_above[(self.first + j) % count]
+            if above > 0:
+                hit = self.first_above(start, end, row_height * above - offset + 2)
+                if hit < end:
+                    quiet = end = hit
+            if above + GAP_ROWS < OBSTACLE_ROWS:
+                level = row_height * (above + GAP_ROWS) - offset - extent - 2
+                hit = self.first_below(start, end, level)
+                if hit < end:
+                    quiet = hit
+        return quiet
+
+    def reaches(self, k, x, limit):
+        """
+        Returns in how many ticks obstacle k of the course gets to x or left
+        of it, or limit if that is later.
+        """
+        scrolled, placed = self.scrolled, self.placed
+        spacing, x_velocity = self.pipe_spacing, self.x_velocity
+        # the linear estimate, then settled on the exact floats
+        ticks = (spacing * (k + FIRST_OBSTACLE) - x) / x_velocity - (scrolled - 2 * placed)
+        ticks = min(max(int(math.ceil(ticks)), 0), limit)
+        while ticks > 0 and \
+            get_obstacle_x(k, scrolled + ticks - 1, placed, spacing, x_velocity) <= x:
+            ticks -= 1
+        while ticks < limit and \
+            get_obstacle_x(k, scrolled + ticks, placed, spacing, x_velocity) > x:
+            ticks += 1
+        return ticks
+
+    def height_after(self, ticks):
+        return (self.flap_height + self.arc.drop(self.flap_ticks + ticks)) + self.lift
+
+    def first_above(self, start, end, level):
+        """
+        Returns the first of ticks start to end - 1 from now that the player
+        is above level (height less than it) at, or end if none.  The player
+        only rises until the top of its arc.
+        """
+        if start >= end:
+            return end
+        if self.height_after(start) < level:
+            return start
+        last = min(self.arc.top - self.flap_ticks, end - 1)
+        if last <= start or self.height_after(last) >= level:
+            return end
+        while last - start > 1: # height_after(start) >= level > height_after(last)
+            middle = (start + last) // 2
+            if self.height_after(middle) < level:
+                last = middle
+            else:
+                start = middle
+        return last
+
+    def first_below(self, start, end, level):
+        """
+        Returns the first of ticks start to end - 1 from now that the player
+        is below level (height greater than it) at, or end if none.  The
+        player only falls after the top of its arc.
+        """
+        if start >= end:
+            return end
+        if self.height_after(start) > level:
+            return start
+        start = max(start, self.arc.top - self.flap_ticks)
+        last = end - 1
+        if last <= start or self.height_after(last) <= level:
+            return end
+        while last - start > 1: # height_after(start) <= level < height_after(last)
+            middle = (start + last) // 2
+            if self.height_after(middle) > level:
+                last = middle
+            else:
+                start = middle
+        return last
+
+    #--------------------------------------------------------------------------
+
+    def get_collision_rect(self):
+        """
+        Returns the player's contracted collision rect as (x, y, w, h).
+        """
+        if self.angles is not None:
+            width, height = self.angles.get_size(self.current_angle)
+        else:
+            angle = abs(math.radians(self.current_angle))
+            sin, cos = math.sin(angle), math.cos(angle)
+            width = int(self.player_height * sin + self.player_width * cos)
+            height = int(self.player_width * sin + self.player_height * cos)
+        contraction = self.contraction
+        return (self.player_x - int(contraction / 2.),
+                int(self.height) - int(contraction / 2.),
+                width + contraction, height + contraction)
+
+    def collides(self):
+        px, py, pw, ph = self.get_collision_rect()
+        if pw <= 0 or ph <= 0:
+            return False
+        right, bottom = px + pw, py + ph
+
+        tx, ty, tw, th = self.terrain_rect
+        if px < tx + tw and py < ty + th and right > tx and bottom > ty:
+            return True
+
+        # obstacles left to right, up to the first right of the player
+        width = self.obstacle_width
+        row_height = self.row_height
+        count = self.obstacle_count
+        for offset in range(count):
+            i = (self.first + offset) % count
+            x = int(self.obstacle_x[i])
+            if x >= right:
+                break
+            if x + width <= px:
+                continue
+            # the player overlaps the obstacle's column; hit unless inside
+            # the gap
+            above = self.number_above[i]
+            gap_top = row_height * above
+            gap_bottom = row_height * (above + GAP_ROWS)
+            if above > 0 and py < gap_top and bottom > 0:
+                return True
+            if above + GAP_ROWS < OBSTACLE_ROWS and \
+                py < row_height * OBSTACLE_ROWS and bottom > gap_bottom:
+                return True
+        return False
+
+    #--------------------------------------------------------------------------
+
+    def next_obstacle(self):
+        """
+        Returns the index of the nearest obstacle not yet behind the player.
+        """
+        count = self.obstacle_count
+        for offset in range(count):
+            i = (self.first + offset) % count
+            if self.obstacle_x[i] + self.obstacle_width > self.player_x:
+                return i
+        return None
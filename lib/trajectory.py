@@ -0,0 +1,312 @@
+##############################################################################
+# trajectory.py
+##############################################################################
+# Moves trajectories from headless games in worker processes to the parent
+# through shared memory instead of pipes.  Each worker owns a ring of
+# fixed-size rows in one shared block, writes a row per step and publishes
+# its write index; the parent reads rows as NumPy views of the block and
+# releases them.  A full ring makes its worker wait (backpressure), and a
+# worker that exits without marking its ring finished is reported crashed.
+# Uses multiprocessing.shared_memory where available (Python 3.8+), and a
+# sharedctypes RawArray inherited by forked workers otherwise.
+##############################################################################
+
+import os
+import time
+import multiprocessing
+import multiprocessing.sharedctypes
+from timeit import default_timer
+
+import numpy
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+ROW_DTYPE = numpy.dtype([('episode', numpy.int32),
+                         ('tick', numpy.int32),
+                         ('height', numpy.float64),
+                         ('velocity', numpy.float64),
+                         ('action', numpy.int8),
+                         ('distance', numpy.float64),
+                         ('gap_top', numpy.float32),
+                         ('gap_bottom', numpy.float32),
+                         ('reward', numpy.float32),
+                         ('done', numpy.bool_)])
+
+# per-ring header of int64s
+WRITE = 0 # rows written, ever
+READ = 1 # rows released by the parent, ever
+FINISHED = 2 # set by a worker that exits cleanly
+STALLS = 3 # times the worker waited for space
+EPISODES = 4 # episodes completed
+PID = 5
+HEADER_SIZE = 8
+
+##############################################################################
+# BUFFER
+##############################################################################
+
+class TrajectoryBuffer:
+    """
+    One shared block holding a header and a ring of rows per worker.
+    """
+
+    def __init__(self, workers, capacity=4096, handle=None):
+        """
+        capacity - rows per worker ring
+        handle - a handle() of an existing buffer, to attach to it
+        """
+        self.workers = workers
+        self.capacity = capacity
+        header_bytes = workers * HEADER_SIZE * 8
+        size = header_bytes + workers * capacity * ROW_DTYPE.itemsize
+
+        self.shm = None
+        self.raw = None
+        if handle is None:
+            if shared_memory is not None:
+                self.shm = shared_memory.SharedMemory(create=True, size=size)
+            else:
+                self.raw = multiprocessing.sharedctypes.RawArray('b', size)
+        elif isinstance(handle[2], str):
+            self.shm = shared_memory.SharedMemory(name=handle[2])
+        else:
+            self.raw = handle[2]
+        self.owner = handle is None
+
+        memory = self.shm.buf if self.shm is not None else self.raw
+        self.headers = numpy.frombuffer(memory, numpy.int64, workers * HEADER_SIZE,
+                                        0).reshape(workers, HEADER_SIZE)
+        self.rows = numpy.frombuffer(memory, ROW_DTYPE, workers * capacity,
+                                     header_bytes).reshape(workers, capacity)
+        if self.owner:
+            self.headers[:] = 0
+
+    def handle(self):
+        """
+        Returns what a worker process passes to TrajectoryBuffer() to attach.
+        """
+        if self.shm is not None:
+            return (self.workers, self.capacity, self.shm.name)
+        return (self.workers, self.capacity, self.raw)
+
+    @classmethod
+    def attach(cls, handle):
+        return cls(handle[0], handle[1], handle)
+
+    def ring(self, worker):
+        return TrajectoryRing(self.headers[worker], self.rows[worker])
+
+    def close(self):
+        """
+        Drops the views and, in the creating process, frees the block.  Views
+        handed out by consume() must be gone first.
+        """
+        self.headers = self.rows = None
+        if self.shm is not None:
+            self.shm.close()
+            if self.owner:
+                self.shm.unlink()
+            self.shm = None
+        self.raw = None
+
+##############################################################################
+# RING
+##############################################################################
+
+class TrajectoryRing:
+    """
+    A single worker's ring: written by that worker, read by the parent.
+    """
+
+    def __init__(self, header, rows):
+        self.header = header
+        self.rows = rows
+        self.capacity = len(rows)
+        self.written = int(header[WRITE]) # the writer's unpublished index
+
+    #--------------------------------------------------------------------------
+
+    def append(self, row, parent_alive=None):
+        """
+        Writes row, a tuple in ROW_DTYPE order, waiting while the ring is
+        full.  Published in batches by publish(); a full ring publishes
+        first so the reader can make room.  parent_alive, if given, is
+        called while waiting and the wait gives up if it returns False.
+        """
+        header = self.header
+        if self.written - header[READ] >= self.capacity:
+            self.publish()
+            header[STALLS] += 1
+            while self.written - header[READ] >= self.capacity:
+                if parent_alive is not None and not parent_alive():
+                    raise EOFError('Trajectory reader went away')
+                time.sleep(0.0005)
+        self.rows[self.written % self.capacity] = row
+        self.written += 1
+
+    def publish(self):
+        self.header[WRITE] = self.written
+
+    def finish(self):
+        self.publish()
+        self.header[FINISHED] = 1
+
+    #--------------------------------------------------------------------------
+
+    def available(self):
+        return int(self.header[WRITE] - self.header[READ])
+
+    def consume(self, limit=None):
+        """
+        Returns a view of the oldest unread rows, stopping at the end of the
+        ring, without copying.  Call release() when done with them.
+        """
+        read = int(self.header[READ])
+        count = int(self.header[WRITE]) - read
+        if limit is not None:
+            count = min(count, limit)
+        start = read % self.capacity
+        return self.rows[start:start + min(count, self.capacity - start)]
+
+    def release(self, count):
+        self.header[READ] += count
+
+##############################################################################
+# WORKERS
+##############################################################################
+
+def gap_policy(observation):
+    """
+    Flaps when the player is below the middle of the next gap.
+    """
+    if observation[1] > 0 and observation[0] > (observation[3] + observation[4]) / 2:
+        return 1
+    return 0
+
+def run_worker(handle, worker, episodes, seed, frameskip=1, max_ticks=None,
+               policy=gap_policy, publish_every=64, deterministic=False):
+    """
+    Plays episodes headless games and writes every step to the worker's
+    ring.  Runs in a worker process.
+    """
+    from environment import FlappyEnv # only workers need the game
+
+    buffer = TrajectoryBuffer.attach(handle)
+    ring = buffer.ring(worker)
+    ring.header[PID] = os.getpid()
+    parent = os.getppid()
+    def parent_alive():
+        return os.getppid() == parent
+
+    env = FlappyEnv(frameskip, max_ticks=max_ticks, deterministic=deterministic)
+    for episode in range(episodes):
+        observation = env.reset(seed + episode)
+        done = False
+        while not done:
+            action = policy(observation)
+            observation, reward, done, info = env.step(action) # @UnusedVariable
+            ring.append((episode, info['ticks'], observation[0], observation[1],
+                         action, observation[2], observation[3], observation[4],
+                         reward, done), parent_alive)
+            if ring.written % publish_every == 0:
+                ring.publish()
+        ring.header[EPISODES] += 1
+    ring.finish()
+    ring = None
+    buffer.close()
+
+class TrajectoryPool:
+    """
+    Starts workers writing into a shared TrajectoryBuffer and reads it.
+    """
+
+    def __init__(self, workers, episodes, capacity=4096, seed=0, frameskip=1,
+                 max_ticks=None, policy=gap_policy, deterministic=False):
+        """
+        episodes - games each worker plays
+        seed - worker n seeds its games from seed + n * episodes
+        max_ticks - ticks after which a game is cut short, if given
+        policy - picklable function from observation to action
+        deterministic - play in Simulation's deterministic mode
+        """
+        self.buffer = TrajectoryBuffer(workers, capacity)
+        self.rings = [self.buffer.ring(i) for i in range(workers)]
+        self.processes = []
+        for i in range(workers):
+            process = multiprocessing.Process(target=run_worker,
+                                              args=(self.buffer.handle(), i,
+                                                    episodes, seed + i * episodes,
+                                                    frameskip, max_ticks, policy),
+                                              kwargs={'deterministic': deterministic})
+            process.daemon = True
+            self.processes.append(process)
+
+        # counters
+        self.consumed = [0] * workers
+        self.start_time = None
+
+    #--------------------------------------------------------------------------
+
+    def start(self):
+        self.start_time = default_timer()
+        for process in self.processes:
+            process.start()
+
+    def poll(self, limit=None):
+        """
+        Returns a list of (worker, rows) for every ring with unread rows;
+        rows are views to be handed back with release().
+        """
+        batches = []
+        for i, ring in enumerate(self.rings):
+            rows = ring.consume(limit)
+            if len(rows):
+                batches.append((i, rows))
+        return batches
+
+    def release(self, worker, count):
+        self.rings[worker].release(count)
+        self.consumed[worker] += count
+
+    def is_finished(self, worker):
+        return self.rings[worker].header[FINISHED] == 1
+
+    def crashed(self):
+        """
+        Returns the workers that exited without finishing their ring.
+        """
+        return [i for i, process in enumerate(self.processes)
+                if process.exitcode is not None and not self.is_finished(i)]
+
+    def done(self):
+        """
+        Returns whether every worker has exited and every row been read.
+        """
+        for i, process in enumerate(self.processes):
+            if process.exitcode is None or self.rings[i].available():
+                return False
+        return True
+
+    def get_stats(self):
+        """
+        Returns a dict of rows consumed, rows per second since start(), and
+        the backpressure stalls and episodes of all workers.
+        """
+        elapsed = default_timer() - self.start_time if self.start_time else 0.
+        consumed = sum(self.consumed)
+        return {'rows': consumed,
+                'rows_per_s': consumed / elapsed if elapsed else 0.,
+                'stalls': int(self.buffer.headers[:, STALLS].sum()),
+                'episodes': int(self.buffer.headers[:, EPISODES].sum()),
+                'crashed': self.crashed()}
+
+    def close(self):
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        self.rings = []
+        self.buffer.close()
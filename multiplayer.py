@@ -0,0 +1,162 @@
+##############################################################################
+# multiplayer.py
+##############################################################################
+# Local-network races (see lib/netplay.py).  Serve matches, reporting the
+# tick rate and traffic every few seconds:
+#     python multiplayer.py serve [port] [players per match]
+# and join one from each player's machine:
+#     python multiplayer.py play host [port]
+# Space flaps, R joins a new match once crashed, escape quits.  The other
+# players of the match are drawn translucent where they are on the course.
+##############################################################################
+
+import sys
+
+import pygame
+
+from lib.netplay import MAX_PLAYERS, PORT, TICK_RATE, MatchClient, MatchServer
+
+##############################################################################
+# CONSTANTS
+##############################################################################
+
+OTHER_ALPHA = 110
+TEXT_COLOR = (255, 255, 255)
+JOIN_TIMEOUT = 5. # seconds
+
+##############################################################################
+# CLIENT WINDOW
+##############################################################################
+
+class MultiplayerWindow:
+
+    def __init__(self, host, port=PORT):
+        pygame.init()
+        self.host = host
+        self.port = port
+        self.client = None
+        self.renderer = None
+        self.screen = None
+        self.font = pygame.font.Font(None, 20)
+        self.others = {} # rounded angle -> translucent player sprite
+
+    def join(self):
+        """
+        Joins a match, returning False if the server does not answer.
+        """
+        if self.client is not None:
+            self.client.leave()
+        client = self.client = MatchClient(self.host, self.port)
+        clock = pygame.time.Clock()
+        waited = 0.
+        while not client.joined():
+            if waited > JOIN_TIMEOUT:
+                return False
+            client.poll()
+            client.tick()
+            waited += clock.tick(TICK_RATE) / 1000.
+            pygame.event.pump()
+
+        simulation = client.simulation
+        if self.screen is None:
+            self.screen = pygame.display.set_mode(simulation.screensize)
+        pygame.display.set_caption('Match %d - player %d' % (client.match, client.player))
+        # the renderer needs the display open
+        from lib.pixels import SimulationRenderer
+        self.renderer = SimulationRenderer(simulation, 1)
+        return True
+
+    #--------------------------------------------------------------------------
+
+    def handle(self, event):
+        """
+        Returns (keep running, flap).
+        """
+        if event.type == pygame.QUIT:
+            return False, False
+        if event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_ESCAPE:
+                return False, False
+            elif event.key == pygame.K_SPACE:
+                return True, True
+            elif event.key == pygame.K_r and self.client.simulation.done:
+                return self.join(), False
+        return True, False
+
+    def get_other(self, angle):
+        angle = int(round(angle))
+        sprite = self.others.get(angle)
+        if sprite is None:
+            sprite = self.others[angle] = self.renderer.sprite(
+                'player', ('rotate', angle), ('convert_alpha',), ('alpha', OTHER_ALPHA))
+        return sprite
+
+    def draw(self):
+        client = self.client
+        simulation = client.simulation
+        self.renderer.render()
+        self.screen.blit(self.renderer.surface, (0, 0))
+
+        # an other player is as far ahead on screen as on the course
+        distance = (simulation.scrolled - 2 * simulation.placed) * simulation.x_velocity
+        for other in client.others.values():
+            x = simulation.player_x
+            if simulation.started and other.started:
+                x += (other.scrolled - 2 * other.placed) * other.x_velocity - distance
+            self.screen.blit(self.get_other(other.current_angle), (int(x), int(other.height)))
+
+        stats = client.get_stats()
+        text = 'score %d   players %d   ahead %d ticks   corrections %d   in %.1f kB/s%s' % (
+            simulation.score, len(client.others) + 1, stats['lead'],
+            stats['corrections'], stats['bytes_in_per_s'] / 1024.,
+            '   R to race again' if simulation.done else '')
+        self.screen.blit(self.font.render(text, True, TEXT_COLOR), (4, 4))
+        pygame.display.flip()
+
+    def run(self):
+        if not self.join():
+            print('No answer from %s:%d' % (self.host, self.port))
+            return
+        clock = pygame.time.Clock()
+        running = True
+        while running:
+            flap = False
+            for event in pygame.event.get():
+                keep, pressed = self.handle(event)
+                running = keep and running
+                flap = flap or pressed
+            if not running:
+                break
+            self.client.poll()
+            self.client.tick(flap)
+            self.draw()
+            clock.tick(TICK_RATE)
+        self.client.leave()
+
+##############################################################################
+# MAIN EXECUTION
+##############################################################################
+
+def print_stats(stats):
+    print('%(matches)d matches, %(players)d players   %(ticks_per_s).1f ticks/s, '
+          '%(step_ms).2f ms a step   out %(bytes_out_per_s).0f B/s, '
+          'in %(bytes_in_per_s).0f B/s   snapshots %(snapshot_bytes).0f B, '
+          '%(delta_share).2f delta   late flaps %(late_flaps)d' % stats)
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else PORT
+        players = int(sys.argv[3]) if len(sys.argv) > 3 else MAX_PLAYERS
+        server = MatchServer('', port, players)
+        print('Serving on port %d' % (server.port,))
+        try:
+            server.run(report=print_stats)
+        except KeyboardInterrupt:
+            pass
+    elif len(sys.argv) > 2 and sys.argv[1] == 'play':
+        port = int(sys.argv[3]) if len(sys.argv) > 3 else PORT
+        MultiplayerWindow(sys.argv[2], port).run()
+        pygame.quit()
+    else:
+        print('usage: python multiplayer.py serve [port] [players per match]\n'
+              '       python multiplayer.py play host [port]')
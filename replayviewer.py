@@ -0,0 +1,149 @@
+##############################################################################
+# replayviewer.py
+##############################################################################
+# Plays back a replay file, with scrubbing:
+#     python replayviewer.py game.replay
+# Space pauses, left and right step a tick (a second with shift), page up
+# and page down jump a minute, home and end go to either end, and clicking
+# or dragging on the timeline seeks.  To record a headless run to view:
+#     python replayviewer.py --record run.replay [seed] [max ticks]
+##############################################################################
+
+import sys
+from timeit import default_timer
+
+import pygame
+
+from lib.replay import ReplayPlayer, ReplayReader, record_run
+
+##############################################################################
+# CONSTANTS
+##############################################################################
+
+FPS = 60
+TIMELINE_HEIGHT = 24
+TIMELINE_COLOR = (40, 40, 40)
+PROGRESS_COLOR = (230, 180, 40)
+KEYFRAME_COLOR = (90, 90, 90)
+TEXT_COLOR = (255, 255, 255)
+RECORD_TICKS = FPS * 60 * 30 # the default bot does not crash on its own
+
+##############################################################################
+# VIEWER CLASS
+##############################################################################
+
+class ReplayViewer:
+
+    def __init__(self, path):
+        pygame.init()
+        self.reader = ReplayReader(path)
+        self.player = ReplayPlayer(self.reader)
+        width, height = self.reader.screensize
+        self.screen = pygame.display.set_mode((width, height + TIMELINE_HEIGHT))
+        pygame.display.set_caption('Replay - %s' % (path,))
+        pygame.key.set_repeat(250, 30)
+
+        # the renderer needs the display open
+        from lib.pixels import SimulationRenderer
+        self.renderer = SimulationRenderer(self.player.simulation, 1)
+        self.font = pygame.font.Font(None, 20)
+        self.timeline = pygame.Rect(0, height, width, TIMELINE_HEIGHT)
+
+        self.paused = False
+        self.scrubbing = False
+        self.seek_time = 0. # seconds taken by the last seek
+
+    #--------------------------------------------------------------------------
+
+    def seek(self, tick):
+        start = default_timer()
+        self.player.seek(tick)
+        self.seek_time = default_timer() - start
+
+    def tick_at(self, x):
+        return int(len(self.reader) * min(max(x, 0), self.timeline.width) /
+                   float(self.timeline.width))
+
+    def handle(self, event):
+        """
+        Returns False when the viewer should close.
+        """
+        if event.type == pygame.QUIT:
+            return False
+        if event.type == pygame.KEYDOWN:
+            second = FPS if event.mod & pygame.KMOD_SHIFT else 1
+            if event.key == pygame.K_ESCAPE:
+                return False
+            elif event.key == pygame.K_SPACE:
+                self.paused = not self.paused
+            elif event.key == pygame.K_LEFT:
+                self.seek(self.player.tick - second)
+            elif event.key == pygame.K_RIGHT:
+                self.seek(self.player.tick + second)
+            elif event.key == pygame.K_PAGEUP:
+                self.seek(self.player.tick - FPS * 60)
+            elif event.key == pygame.K_PAGEDOWN:
+                self.seek(self.player.tick + FPS * 60)
+            elif event.key == pygame.K_HOME:
+                self.seek(0)
+            elif event.key == pygame.K_END:
+                self.seek(len(self.reader))
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and \
+            self.timeline.collidepoint(event.pos):
+            self.scrubbing = True
+            self.seek(self.tick_at(event.pos[0]))
+        elif event.type == pygame.MOUSEMOTION and self.scrubbing:
+            self.seek(self.tick_at(event.pos[0]))
+        elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+            self.scrubbing = False
+        return True
+
+    def draw(self):
+        self.renderer.render()
+        self.screen.blit(self.renderer.surface, (0, 0))
+
+        # timeline, with a mark per keyframe when they are far enough apart
+        timeline = self.timeline
+        total = float(max(len(self.reader), 1))
+        self.screen.fill(TIMELINE_COLOR, timeline)
+        if len(self.reader.keyframe_ticks) < timeline.width // 4:
+            for tick in self.reader.keyframe_ticks:
+                x = int(timeline.width * tick / total)
+                self.screen.fill(KEYFRAME_COLOR, (x, timeline.top, 1, timeline.height))
+        progress = int(timeline.width * self.player.tick / total)
+        self.screen.fill(PROGRESS_COLOR, (0, timeline.top, progress, 4))
+
+        simulation = self.player.simulation
+        text = 'tick %d / %d   score %d   seek %.1f ms (%d ticks)%s' % (
+            self.player.tick, len(self.reader), simulation.score,
+            self.seek_time * 1000, self.player.resimulated,
+            '   paused' if self.paused else '')
+        self.screen.blit(self.font.render(text, True, TEXT_COLOR),
+                         (4, timeline.top + 6))
+        pygame.display.flip()
+
+    def run(self):
+        clock = pygame.time.Clock()
+        running = True
+        while running:
+            for event in pygame.event.get():
+                running = self.handle(event) and running
+            if not self.paused and not self.scrubbing and not self.player.at_end():
+                self.player.step()
+            self.draw()
+            clock.tick(FPS)
+
+##############################################################################
+# MAIN EXECUTION
+##############################################################################
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == '--record':
+        seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+        max_ticks = int(sys.argv[4]) if len(sys.argv) > 4 else RECORD_TICKS
+        print('score: %d' % record_run(sys.argv[2], seed, max_ticks=max_ticks))
+    elif len(sys.argv) == 2:
+        ReplayViewer(sys.argv[1]).run()
+        pygame.quit()
+    else:
+        print('usage: python replayviewer.py [--record] file [seed] [max ticks]')
@@ -12,6 +12,12 @@ from lib.engine.systemevents import SystemEventManager  # @UnusedImport
 
 # controllers
 from lib.engine.cpuspinner import CPUSpinner
+from lib.engine.gcpolicy import GCPolicy
+from lib.engine.latency import LatencyProbe
+from lib.engine.pacing import FramePacer
+from lib.engine.scenetracker import SceneTracker
+from lib.engine.tracer import EventTracer
+from lib.engine.transition import TransitionManager
 from lib.engine.pygameeventsmanager import PygameEventsManager
 
 # model
@@ -19,9 +25,11 @@ from lib.engine.model import Model
 
 # views
 from lib.engine.pygameview import PygameView
+from lib.engine.threadedloop import EventQueue, ThreadedLoop
 
 # initial state
 from lib.gamestate import IntroState
+from lib.graphics.assets import Assets
 
 ##############################################################################
 # CONSTANTS
@@ -31,6 +39,21 @@ GAME_NAME = "Flappy Pipes"
 FPS = 60
 SCREEN_SIZE = (576, 512)
 BG_COLOR = (0, 0, 0)
+GC_POLICY = False # collect garbage in idle frame time instead of automatically
+THREADED_PRELOAD = False # build the next state on a worker thread during fades
+ATLAS = False # draw sprites as areas of one scaled sprite sheet
+NATIVE_SIZE = (288, 256) # size of the sprite sheet art
+NATIVE_RENDER = False # draw at NATIVE_SIZE offscreen, upscale once per frame
+IDLE_FPS = 10 # tick rate while nothing on screen is changing
+LATENCY_MODE = False # read input late and sleep after presenting
+PRECISE_PACING = False # sleep then spin to each frame deadline
+THREADED_RENDER = False # simulate on a worker thread, present on this one
+SNAPSHOT_SLOTS = 3 # frames buffered between the threads (2 or 3)
+ASYNC_LOOP = False # tick from an asyncio event loop (needs Python 3.7+)
+LEADERBOARD = False # upload final scores to a local stand-in leaderboard (needs ASYNC_LOOP)
+RECORD_DATASET = None # directory to record played games into (needs numpy)
+RECORD_REPLAYS = None # directory to write a replay file of each game into (needs numpy)
+GHOST_REPLAYS = None # directory of replays to race the longest of as ghosts (needs numpy)
 
 ##############################################################################
 # GAME ENGINE CLASS
@@ -43,15 +66,73 @@ class GameEngine:
         # initialize pygame environment
         pygame.init()
         
+        # skips redrawing static scenes
+        self.scene_tracker = SceneTracker()
+        
         # create controllers
-        self.cpu_spinner = CPUSpinner(FPS) # regulate frame speed
-        self.pygame_events_manager = PygameEventsManager() # translate keyboard inputs to Events
+        gc_policy = GCPolicy() if GC_POLICY else None
+        pacer = FramePacer(FPS) if PRECISE_PACING else None
+        self.event_queue = EventQueue() if THREADED_RENDER else None
+        if ASYNC_LOOP:
+            from lib.engine.asyncspinner import AsyncSpinner
+            self.cpu_spinner = AsyncSpinner(FPS, gc_policy) # regulate frame speed
+        else:
+            self.cpu_spinner = CPUSpinner(FPS, gc_policy, self.scene_tracker, IDLE_FPS,
+                                          LATENCY_MODE, pacer, self.event_queue) # regulate frame speed
+        self.pygame_events_manager = PygameEventsManager(self.event_queue) # translate keyboard inputs to Events
         
         # create views
-        self.pygame_view = PygameView(GAME_NAME, SCREEN_SIZE, BG_COLOR) # create screen
+        render_size = NATIVE_SIZE if NATIVE_RENDER else None
+        snapshot_slots = SNAPSHOT_SLOTS if THREADED_RENDER else None
+        self.pygame_view = PygameView(GAME_NAME, SCREEN_SIZE, BG_COLOR, render_size,
+                                      'scale2x', self.scene_tracker,
+                                      snapshot_slots) # create screen
+        
+        # histogram of space bar press to display flip times
+        self.latency_probe = LatencyProbe((pygame.K_SPACE,))
+        
+        # F9 starts and stops a Chrome trace of event dispatch, as does
+        # launching with FLAPPY_TRACE set to a file name
+        self.event_tracer = EventTracer()
+        
+        # uploads scores from the asyncio loop once it is running
+        if LEADERBOARD:
+            from lib.engine.asyncspinner import AsyncSpinner
+            from lib.leaderboard import LeaderboardServer, ScoreUploader
+            self.leaderboard_server = LeaderboardServer()
+            AsyncSpinner.schedule(self.leaderboard_server.start())
+            self.score_uploader = ScoreUploader()
+        
+        # appends every frame of play to a trajectory dataset
+        self.dataset_writer = None
+        if RECORD_DATASET:
+            from lib.dataset import DatasetWriter
+            from lib.recorder import GameRecorder
+            self.dataset_writer = DatasetWriter(RECORD_DATASET)
+            self.game_recorder = GameRecorder(self.dataset_writer)
+        
+        # writes a seekable replay of every game
+        self.replay_recorder = None
+        if RECORD_REPLAYS:
+            from lib.recorder import ReplayRecorder
+            self.replay_recorder = ReplayRecorder(RECORD_REPLAYS)
+        
+        # draws recorded games as ghosts behind the player
+        self.ghost_race = None
+        if GHOST_REPLAYS:
+            from lib.ghosts import GhostRace
+            self.ghost_race = GhostRace(GHOST_REPLAYS)
+        
+        # builds the next state while the current one fades out
+        TransitionManager.instance = TransitionManager(THREADED_PRELOAD)
+        
+        # sprite registry
+        Assets.use_atlas = ATLAS
+        if NATIVE_RENDER:
+            Assets.base_chain = () # sprites stay at sheet size
         
         # init model
-        Model.change_state(IntroState(SCREEN_SIZE)) # establish GameState, which is a derived class of State, as the current state
+        Model.change_state(IntroState(self.pygame_view.screen.get_size())) # establish GameState, which is a derived class of State, as the current state
         
         
     #--------------------------------------------------------------------------
@@ -59,7 +140,17 @@ class GameEngine:
     def start(self):
         # print 'self.cpu_spinner.run()' # DEBUG
         # start the cpu spinner
-        self.cpu_spinner.run()
+        try:
+            if THREADED_RENDER:
+                ThreadedLoop(self.cpu_spinner, self.pygame_view, self.event_queue).run()
+            else:
+                self.cpu_spinner.run()
+        finally:
+            self.event_tracer.stop() # write a trace still running
+            if self.dataset_writer is not None:
+                self.dataset_writer.close() # save the last, partial chunk
+            if self.replay_recorder is not None:
+                self.replay_recorder.close()
         
     
     
@@ -0,0 +1,60 @@
+##############################################################################
+# test_listeners.py
+##############################################################################
+# Listener counts must not grow as games are played, lost and restarted.
+#     python -m unittest discover tests
+##############################################################################
+
+import os
+import unittest
+
+# the game draws offscreen unless a real video driver is asked for
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from lib.engine.events import EventManager
+from lib.engine.model import Model
+from lib.engine.pygameview import PygameView
+from lib.engine.systemevents import SystemEventManager
+from lib.graphics.assets import Assets
+from lib.gui import ButtonClickedEvent, FadeIntoGameEvent, GUIEventManager
+
+SCREEN_SIZE = (576, 512)
+RESTARTS = 2000
+
+class RestartTest(unittest.TestCase):
+
+    def setUp(self):
+        pygame.init()
+        self.view = PygameView('test', SCREEN_SIZE, (0, 0, 0))
+        Assets.load()
+        Assets.preload()
+
+    def test_restarts_keep_listener_counts(self):
+        from lib.gamestate import GameOverEvent, GameState
+
+        game = GameState(None, SCREEN_SIZE, 0)
+        Model.change_state(game)
+        counts = None
+        # finished states are kept alive, so only unsubscribing them keeps
+        # them out of the counts
+        finished = []
+        for restart in range(RESTARTS):
+            # lose, then click restart and reach the fade peak
+            SystemEventManager.post(GameOverEvent(game.score))
+            over = Model.state
+            finished.append(over)
+            over.fade.set_alpha(0)
+            GUIEventManager.post(ButtonClickedEvent(over.restart_button))
+            SystemEventManager.post(FadeIntoGameEvent())
+            self.assertTrue(Model.state is game)
+
+            if counts is None: # after one round, everything lazy exists
+                counts = EventManager.listener_counts()
+            self.assertEqual(EventManager.listener_counts(), counts,
+                             'listeners grew by restart %d' % (restart,))
+            self.assertEqual(Model.listener_report, counts)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+##############################################################################
+# test_transition.py
+##############################################################################
+# The next state is built in idle frame time within the budget, and restarts
+# go through the transition manager so their frames are timed.
+##############################################################################
+
+import os
+import unittest
+
+# the game draws offscreen unless a real video driver is asked for
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from lib.engine.model import Model
+from lib.engine.pygameview import PygameView
+from lib.engine.systemevents import IdleEvent, SystemEventManager, TickEvent
+from lib.engine.transition import TransitionManager
+from lib.graphics.assets import Assets
+from lib.gui import ButtonClickedEvent, FadeIntoGameEvent, GUIEventManager
+
+SCREEN_SIZE = (576, 512)
+
+class TransitionTest(unittest.TestCase):
+
+    def setUp(self):
+        pygame.init()
+        self.view = PygameView('test', SCREEN_SIZE, (0, 0, 0))
+        Assets.load()
+        Assets.preload()
+        self.manager = TransitionManager.instance = TransitionManager()
+
+    def test_build_stays_in_budget(self):
+        from lib.gamestate import GameState, build_game_state
+
+        manager = self.manager
+        manager.prepare(lambda: build_game_state(None, SCREEN_SIZE))
+        SystemEventManager.post(IdleEvent(-0.001)) # an overrun frame
+        self.assertTrue(manager.steps is None and manager.build_time == 0.)
+
+        # with next to no time left, a step per frame once one has been timed
+        steps = len(GameState(None, SCREEN_SIZE, build=False).build_steps())
+        frames = 0
+        while manager.next_state is None:
+            SystemEventManager.post(IdleEvent(1e-9))
+            frames += 1
+        self.assertEqual(frames, steps + 1)
+
+        manager.swap()
+        game = Model.state
+        self.assertTrue(isinstance(game, GameState))
+        self.assertEqual(len(game.game_objects), len(game.initial_objects))
+
+        # and all of it in one frame with time to spare
+        manager.prepare(lambda: build_game_state(None, SCREEN_SIZE))
+        SystemEventManager.post(IdleEvent(1.))
+        self.assertTrue(manager.next_state is not None)
+
+    def test_restart_is_timed(self):
+        from lib.gamestate import GameOverEvent, GameState
+
+        manager = self.manager
+        game = GameState(None, SCREEN_SIZE, 0)
+        Model.change_state(game)
+        SystemEventManager.post(GameOverEvent(game.score))
+        over = Model.state
+        over.fade.set_alpha(0)
+        GUIEventManager.post(ButtonClickedEvent(over.restart_button))
+        self.assertTrue(manager.active)
+
+        # the reset objects are on screen until the peak
+        SystemEventManager.post(TickEvent())
+        SystemEventManager.post(IdleEvent(1.))
+        self.assertEqual(game.reset_time, 0.)
+
+        SystemEventManager.post(FadeIntoGameEvent())
+        SystemEventManager.post(TickEvent())
+        self.assertTrue(Model.state is game)
+        self.assertTrue(game.reset_time > 0.)
+        self.assertTrue(manager.last_worst_frame_time > 0.)
+        self.assertFalse(manager.active)
+
+if __name__ == '__main__':
+    unittest.main()